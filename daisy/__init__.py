@@ -1,10 +1,25 @@
 from __future__ import absolute_import
 from .array import Array
-from .blocks import create_dependency_graph
+from .block import Block
+from .block_grid import BlockGrid
+from .block_table import BlockTable
+from .blocks import create_dependency_graph, create_block_table
+from .chunk_cache import ChunkCache, get_chunk_cache
+from .completion import CompletionBitmap
 from .coordinate import Coordinate
+from .cost_model import CostModel
 from .dask_scheduler import run_blockwise
 from .datasets import open_ds, prepare_ds
+from .executor import Executor
 from .graph import Graph
+from .memory import MemoryEstimator
+from .pipeline import Pipeline
+from .planner import plan, Plan
+from .priority import Priority
 from .processes import call
+from .progress import Progress
+from .reduction import Reduction
+from .region import Region
 from .roi import Roi
+from .run_report import RunReport
 from . import persistence
@@ -17,7 +17,9 @@ class Block(Freezable):
         block_id (``int``):
 
             A unique ID for this block (within all blocks tiling the total ROI
-            to process).
+            to process). The ID is the row-major index of the block in the grid
+            of all blocks, with a spacing of the write shape starting at the
+            begin of the total ROI.
 
         requested_write_roi (`class:Roi`):
 
@@ -39,18 +41,47 @@ class Block(Freezable):
         write_roi (`class:Roi`):
 
             The region of interest (ROI) to write to.
+
+        block_id (``int``, optional):
+
+            The ID of this block, if already known. Otherwise, it will be
+            computed from ``total_roi``, ``read_roi``, and ``write_roi``.
     '''
 
-    def __init__(self, total_roi, read_roi, write_roi):
+    def __init__(self, total_roi, read_roi, write_roi, block_id=None):
 
         self.read_roi = read_roi
         self.write_roi = write_roi
         self.requested_write_roi = write_roi.copy()
 
-        self.__compute_block_id(total_roi, write_roi)
+        if block_id is None:
+            self.__compute_block_id(total_roi, read_roi, write_roi)
+        else:
+            self.block_id = block_id
         self.freeze()
 
-    def __compute_block_id(self, total_roi, write_roi):
+    @staticmethod
+    def from_id(
+            total_roi,
+            block_read_roi,
+            block_write_roi,
+            fit,
+            block_id):
+        '''Create the block with the given ID, as it would appear in the
+        dependency graph for the given arguments (see
+        :func:`daisy.create_dependency_graph`).'''
+
+        from .block_grid import BlockGrid
+
+        grid = BlockGrid(
+            total_roi,
+            block_read_roi,
+            block_write_roi,
+            fit=fit)
+
+        return grid.get_block(block_id)
+
+    def __compute_block_id(self, total_roi, read_roi, write_roi):
 
         one = (1,)*total_roi.dims()
         # this is an upper bound on the number of blocks per dimension, the
@@ -58,8 +89,13 @@ class Block(Freezable):
         num_blocks = (
             total_roi.get_shape() +
             write_roi.get_shape() - one
-            )/write_roi.get_shape()
-        block_index = write_roi.get_offset()/write_roi.get_shape()
+            )//write_roi.get_shape()
+        # blocks are placed on a grid with a spacing of the write shape,
+        # starting at the begin of the total ROI
+        block_index = (
+            read_roi.get_begin() -
+            total_roi.get_begin()
+            )//write_roi.get_shape()
 
         f = 1
         self.block_id = 0
@@ -0,0 +1,243 @@
+from __future__ import absolute_import
+from .blocks import (
+    compute_levels,
+    fit_block_rois)
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class BlockGrid(object):
+    '''Closed-form indexing of the blocks in a dependency graph.
+
+    All blocks of a dependency graph (see
+    :func:`daisy.create_dependency_graph`) lie on a regular grid with a
+    spacing of the write shape, starting at the begin of the total ROI. The
+    level of a block and its conflicts to upstream and downstream blocks
+    follow directly from its position in this grid. This class computes the level,
+    the upstream, and the downstream block IDs of a block from its ID
+    arithmetically, without storing the dependency graph::
+
+        grid = BlockGrid(total_roi, read_roi, write_roi)
+
+        for block_id in grid.get_upstream_ids(42):
+            ...
+
+    Args:
+
+        total_roi (`class:daisy.Roi`):
+        block_read_roi (`class:daisy.Roi`):
+        block_write_roi (`class:daisy.Roi`):
+        read_write_conflict (``bool``, optional):
+        fit (``string``, optional):
+        level_strategy (``string``, optional):
+
+            See :func:`daisy.create_dependency_graph`.
+    '''
+
+    def __init__(
+            self,
+            total_roi,
+            block_read_roi,
+            block_write_roi,
+            read_write_conflict=True,
+            fit='valid',
+            level_strategy='stride'):
+
+        self.total_roi = total_roi
+        self.block_read_roi = block_read_roi
+        self.block_write_roi = block_write_roi
+        self.read_write_conflict = read_write_conflict
+        self.fit = fit
+        self.level_strategy = level_strategy
+
+        write_shape = block_write_roi.get_shape()
+
+        self.level_stride, self.levels = compute_levels(
+            block_read_roi,
+            block_write_roi,
+            read_write_conflict,
+            level_strategy)
+
+        self.write_shape = np.array(write_shape, dtype=np.int64)
+
+        # number of blocks per dimension in the grid
+        self.grid_shape = tuple(
+            (s + w - 1)//w
+            for s, w in zip(total_roi.get_shape(), write_shape))
+
+        # the level and the upstream conflicts of a block are determined by
+        # its grid position modulo the level stride (in grid units)
+        self.level_grid_stride = np.array(
+            self.level_stride//write_shape,
+            dtype=np.int64)
+        self.__level_index = {}
+        self.__conflicts = {}
+        for level, level_offsets in enumerate(self.levels):
+            for level_offset, conflict_offsets in level_offsets:
+                residue = tuple(level_offset//write_shape)
+                self.__level_index[residue] = level
+                self.__conflicts[residue] = np.array(
+                    [o//write_shape for o in conflict_offsets],
+                    dtype=np.int64).reshape((-1, total_roi.dims()))
+
+        # all offsets to upstream blocks of any block, and the pairs of
+        # residue and offset that are dependencies, to search for downstream
+        # blocks
+        self.__all_conflicts = np.unique(
+            np.concatenate(list(self.__conflicts.values())),
+            axis=0)
+        self.__dependencies = set(
+            residue + tuple(c)
+            for residue, conflicts in self.__conflicts.items()
+            for c in conflicts)
+
+        # offset to convert grid positions into global shifts of the block
+        # ROIs
+        self.global_offset = np.array(
+            total_roi.get_begin() - block_read_roi.get_begin(),
+            dtype=np.int64)
+
+    def num_levels(self):
+        '''The number of levels in the dependency graph.'''
+
+        return len(self.levels)
+
+    def num_block_ids(self):
+        '''The number of possible block IDs, i.e., the largest block ID in the
+        dependency graph plus one.'''
+
+        return int(np.prod(self.grid_shape))
+
+    def get_grid_positions(self, block_ids):
+        '''Get the grid positions of the given block IDs, as an integer array
+        of shape ``(n, dims)``.'''
+
+        return np.stack(
+            np.unravel_index(
+                np.asarray(block_ids, dtype=np.int64).reshape((-1,)),
+                self.grid_shape),
+            axis=1).astype(np.int64)
+
+    def get_block_ids(self, grid_positions):
+        '''Get the block IDs for the given grid positions (an integer array of
+        shape ``(n, dims)``). Positions outside the grid are not allowed.'''
+
+        return np.ravel_multi_index(
+            tuple(np.asarray(grid_positions, dtype=np.int64).T),
+            self.grid_shape).astype(np.int64)
+
+    def get_level(self, block_id):
+        '''Get the level of the block with the given ID.'''
+
+        position = self.get_grid_positions(block_id)[0]
+        return self.__level_index[tuple(position%self.level_grid_stride)]
+
+    def exists(self, block_ids):
+        '''Test which of the given block IDs are part of the dependency graph.
+        Returns a boolean array.'''
+
+        block_ids = np.asarray(block_ids, dtype=np.int64).reshape((-1,))
+        in_range = (block_ids >= 0) & (block_ids < self.num_block_ids())
+
+        exists = np.zeros(block_ids.shape, dtype=bool)
+        if in_range.any():
+            positions = self.get_grid_positions(block_ids[in_range])
+            exists[in_range] = self.__included(positions)
+
+        return exists
+
+    def get_upstream_ids(self, block_id):
+        '''Get the IDs of all blocks that have to finish before the block
+        with the given ID can start.'''
+
+        position = self.get_grid_positions(block_id)[0]
+        residue = tuple(position%self.level_grid_stride)
+
+        return self.__existing_ids(position + self.__conflicts[residue])
+
+    def get_downstream_ids(self, block_id):
+        '''Get the IDs of all blocks that depend on the block with the given
+        ID.'''
+
+        position = self.get_grid_positions(block_id)[0]
+
+        # candidates are blocks that have the given block at one of their
+        # conflict offsets
+        candidates = position - self.__all_conflicts
+        residues = candidates%self.level_grid_stride
+        is_downstream = np.array([
+            tuple(r) + tuple(c) in self.__dependencies
+            for r, c in zip(residues, self.__all_conflicts)
+        ], dtype=bool)
+
+        return self.__existing_ids(candidates[is_downstream])
+
+    def get_ids_writing_to(self, roi):
+        '''Get the IDs of all blocks whose write ROI intersects ``roi``.'''
+
+        dims = self.total_roi.dims()
+
+        # begin of the write ROI of the block at grid position 0
+        write_begin = self.global_offset + np.array(
+            self.block_write_roi.get_begin(),
+            dtype=np.int64)
+        begin = np.array(roi.get_begin(), dtype=np.int64) - write_begin
+        end = np.array(roi.get_end(), dtype=np.int64) - write_begin
+
+        # range of grid positions with write ROIs intersecting roi
+        lower = np.maximum(begin//self.write_shape, 0)
+        upper = np.minimum(-(-end//self.write_shape), self.grid_shape)
+
+        if np.any(upper <= lower):
+            return np.zeros((0,), dtype=np.int64)
+
+        positions = np.stack(
+            np.meshgrid(
+                *[ np.arange(l, u) for l, u in zip(lower, upper) ],
+                indexing='ij'),
+            axis=-1).reshape((-1, dims)).astype(np.int64)
+
+        # fitting might have shrunk or excluded some of them
+        blocks, included = self.__fit(positions)
+        intersecting = included & np.all(
+            (blocks.write_begin < np.array(roi.get_end())) &
+            (blocks.write_end > np.array(roi.get_begin())),
+            axis=1)
+
+        return self.get_block_ids(positions[intersecting])
+
+    def get_block(self, block_id):
+        '''Get the `class:Block` with the given ID.'''
+
+        return self.get_blocks([block_id])[0]
+
+    def get_blocks(self, block_ids):
+        '''Get a `class:BlockTable` of the blocks with the given IDs.'''
+
+        blocks, _ = self.__fit(self.get_grid_positions(block_ids))
+        return blocks
+
+    def __existing_ids(self, positions):
+
+        in_grid = np.all(
+            (positions >= 0) & (positions < self.grid_shape),
+            axis=1)
+        positions = positions[in_grid]
+        positions = positions[self.__included(positions)]
+
+        return self.get_block_ids(positions)
+
+    def __included(self, positions):
+
+        _, included = self.__fit(positions)
+        return included
+
+    def __fit(self, positions):
+
+        return fit_block_rois(
+            self.total_roi,
+            self.block_read_roi,
+            self.block_write_roi,
+            self.global_offset + positions*self.write_shape,
+            self.fit)
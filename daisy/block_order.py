@@ -0,0 +1,98 @@
+from __future__ import absolute_import
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+def get_block_order(block_order):
+    '''Get a key function for the given ``block_order``, or ``None`` for
+    row-major order.
+
+    Args:
+
+        block_order (``string`` or function):
+
+            One of "row-major", "morton", or "hilbert", or a function that
+            will be called with an integer array of shape ``(n, dims)`` of
+            grid positions and returns an array of ``n`` keys to sort the
+            positions by.
+    '''
+
+    if block_order is None or block_order == 'row-major':
+        return None
+    if block_order == 'morton':
+        return morton_keys
+    if block_order == 'hilbert':
+        return hilbert_keys
+    if callable(block_order):
+        return block_order
+
+    raise RuntimeError("Unknown block order %s"%(block_order,))
+
+def morton_keys(positions):
+    '''Get the index of each grid position (an integer array of shape ``(n,
+    dims)``) along a Morton (Z-order) curve.'''
+
+    positions = np.asarray(positions, dtype=np.int64)
+    return interleave_bits(positions, num_bits(positions))
+
+def hilbert_keys(positions):
+    '''Get the index of each grid position (an integer array of shape ``(n,
+    dims)``) along a Hilbert curve.'''
+
+    positions = np.array(positions, dtype=np.int64)
+    bits = num_bits(positions)
+    dims = positions.shape[1]
+
+    # convert positions into the "transposed" Hilbert index (J. Skilling,
+    # "Programming the Hilbert curve", 2004), vectorized over all positions
+    x = [ positions[:, d].copy() for d in range(dims) ]
+
+    q = 1 << (bits - 1)
+    while q > 1:
+        p = q - 1
+        for d in range(dims):
+            set_bit = (x[d] & q) != 0
+            # invert low bits of x[0] where the bit is set, otherwise exchange
+            # low bits of x[0] and x[d]
+            t = np.where(set_bit, 0, (x[0] ^ x[d]) & p)
+            x[0] = np.where(set_bit, x[0] ^ p, x[0] ^ t)
+            if d != 0:
+                x[d] = x[d] ^ t
+        q >>= 1
+
+    # Gray encode
+    for d in range(1, dims):
+        x[d] = x[d] ^ x[d - 1]
+    t = np.zeros_like(x[0])
+    q = 1 << (bits - 1)
+    while q > 1:
+        t = np.where((x[dims - 1] & q) != 0, t ^ (q - 1), t)
+        q >>= 1
+    for d in range(dims):
+        x[d] = x[d] ^ t
+
+    return interleave_bits(np.stack(x, axis=1), bits)
+
+def num_bits(positions):
+
+    max_position = int(positions.max()) if positions.size > 0 else 0
+    bits = max(1, max_position.bit_length())
+
+    if bits*positions.shape[1] > 63:
+        raise RuntimeError(
+            "Grid of %d dimensions with %d bits per dimension is too large "
+            "for space-filling curve keys"%(positions.shape[1], bits))
+
+    return bits
+
+def interleave_bits(positions, bits):
+
+    dims = positions.shape[1]
+    keys = np.zeros((positions.shape[0],), dtype=np.int64)
+
+    for bit in reversed(range(bits)):
+        for d in range(dims):
+            keys = (keys << 1) | ((positions[:, d] >> bit) & 1)
+
+    return keys
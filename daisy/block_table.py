@@ -0,0 +1,202 @@
+from __future__ import absolute_import
+from .block import Block
+from .roi import Roi
+import numpy as np
+
+class BlockTable(object):
+    '''A compact, array-backed table of blocks.
+
+    Instead of holding a `class:Block` object per block, all block IDs and
+    ROIs are stored in a single contiguous ``int64`` buffer, with one row per
+    field and one column per block. This makes it cheap to hold, filter, and
+    send millions of blocks to other processes. `class:Block` objects are only
+    created on access::
+
+        table = BlockTable.from_blocks(total_roi, blocks)
+
+        block = table[0]           # a Block
+        sub_table = table[10:20]   # a BlockTable (view)
+        done = table[mask]         # a BlockTable (copy)
+
+        for block in table:        # lazily creates Blocks
+            ...
+
+    Args:
+
+        total_roi (`class:Roi`):
+
+            The total ROI that the blocks are tiling.
+
+        block_ids (``ndarray``):
+
+            The IDs of the blocks, shape ``(n,)``.
+
+        read_begin, read_end, write_begin, write_end (``ndarray``):
+
+            The begin and end of the read and write ROIs, each of shape
+            ``(n, dims)``.
+
+        requested_write_begin, requested_write_end (``ndarray``, optional):
+
+            The begin and end of the requested write ROIs (see
+            `class:Block`), if different from the write ROIs.
+    '''
+
+    def __init__(
+            self,
+            total_roi,
+            block_ids,
+            read_begin,
+            read_end,
+            write_begin,
+            write_end,
+            requested_write_begin=None,
+            requested_write_end=None):
+
+        if requested_write_begin is None:
+            requested_write_begin = write_begin
+        if requested_write_end is None:
+            requested_write_end = write_end
+
+        dims = total_roi.dims()
+        num_blocks = len(block_ids)
+
+        fields = [
+            read_begin,
+            read_end,
+            write_begin,
+            write_end,
+            requested_write_begin,
+            requested_write_end
+        ]
+
+        data = np.empty((1 + len(fields)*dims, num_blocks), dtype=np.int64)
+        data[0] = block_ids
+        for i, field in enumerate(fields):
+            data[1 + i*dims:1 + (i + 1)*dims] = np.reshape(
+                field,
+                (num_blocks, dims)).T
+
+        self.total_roi = total_roi
+        self.data = data
+
+    @staticmethod
+    def from_data(total_roi, data):
+        '''Create a table directly from its buffer, as stored in ``data``. No
+        copy of ``data`` is made.'''
+
+        table = BlockTable.__new__(BlockTable)
+        table.total_roi = total_roi
+        table.data = data
+
+        return table
+
+    @staticmethod
+    def from_blocks(total_roi, blocks):
+        '''Create a table from an iterable of `class:Block`.'''
+
+        blocks = list(blocks)
+        dims = total_roi.dims()
+
+        def get(f):
+            return np.array(
+                [f(b) for b in blocks],
+                dtype=np.int64).reshape((-1, dims))
+
+        return BlockTable(
+            total_roi,
+            np.array([b.block_id for b in blocks], dtype=np.int64),
+            get(lambda b: b.read_roi.get_begin()),
+            get(lambda b: b.read_roi.get_end()),
+            get(lambda b: b.write_roi.get_begin()),
+            get(lambda b: b.write_roi.get_end()),
+            get(lambda b: b.requested_write_roi.get_begin()),
+            get(lambda b: b.requested_write_roi.get_end()))
+
+    @staticmethod
+    def concatenate(tables):
+        '''Concatenate a non-empty list of tables over the same total ROI.'''
+
+        return BlockTable.from_data(
+            tables[0].total_roi,
+            np.concatenate([t.data for t in tables], axis=1))
+
+    def dims(self):
+        '''The number of spatial dimensions of the blocks in this table.'''
+
+        return self.total_roi.dims()
+
+    @property
+    def block_ids(self):
+        return self.data[0]
+
+    @property
+    def read_begin(self):
+        return self.__field(0)
+
+    @property
+    def read_end(self):
+        return self.__field(1)
+
+    @property
+    def write_begin(self):
+        return self.__field(2)
+
+    @property
+    def write_end(self):
+        return self.__field(3)
+
+    @property
+    def requested_write_begin(self):
+        return self.__field(4)
+
+    @property
+    def requested_write_end(self):
+        return self.__field(5)
+
+    def __len__(self):
+
+        return self.data.shape[1]
+
+    def __getitem__(self, key):
+        '''Get a single `class:Block` (if ``key`` is an integer), or a
+        sub-table (if ``key`` is a slice, a boolean mask, or an array of
+        indices).'''
+
+        if isinstance(key, (int, np.integer)):
+            return self.__to_block(key)
+
+        return BlockTable.from_data(self.total_roi, self.data[:, key])
+
+    def __iter__(self):
+
+        for i in range(len(self)):
+            yield self.__to_block(i)
+
+    def __repr__(self):
+
+        return "BlockTable with %d blocks in %s"%(len(self), self.total_roi)
+
+    def __field(self, i):
+
+        dims = self.dims()
+        return self.data[1 + i*dims:1 + (i + 1)*dims].T
+
+    def __to_block(self, i):
+
+        column = self.data[:, i].tolist()
+        dims = self.dims()
+
+        def roi(i):
+            begin = column[1 + i*dims:1 + (i + 1)*dims]
+            end = column[1 + (i + 1)*dims:1 + (i + 2)*dims]
+            return Roi(begin, [e - b for b, e in zip(begin, end)])
+
+        block = Block(
+            self.total_roi,
+            roi(0),
+            roi(4),
+            block_id=column[0])
+        block.write_roi = roi(2)
+
+        return block
@@ -1,8 +1,16 @@
 from __future__ import absolute_import
-from .block import Block
+from .block_order import get_block_order
+from .block_table import BlockTable
+from .coloring import (
+    get_conflict_set,
+    find_lattice_coloring,
+    get_colors,
+    get_period)
 from .coordinate import Coordinate
+from .region import Region
 from itertools import product
 import logging
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
@@ -11,7 +19,11 @@ def create_dependency_graph(
     block_read_roi,
     block_write_roi,
     read_write_conflict=True,
-    fit='valid'):
+    fit='valid',
+    lazy=False,
+    block_order='row-major',
+    region=None,
+    level_strategy='stride'):
     '''Create a dependency graph as a list with elements::
 
         (block, [upstream_blocks])
@@ -80,73 +92,306 @@ def create_dependency_graph(
                 |rrrr|wwwwww|rrrr|                block 1
                        |rrrr|wwwwww|rrrr|         block 2
                               |rrrr|www|rrrr|     block 3 (shrunk)
+
+        lazy (``bool``, optional):
+
+            If ``True``, return a generator over ``(block, upstream_blocks)``
+            instead of a list. Blocks are created level by level while the
+            generator is consumed, such that the whole graph never has to be
+            held in memory. Upstream blocks are guaranteed to be yielded
+            before their downstream blocks.
+
+        block_order (``string`` or function, optional):
+
+            The order of the blocks within each level. Possible options are:
+
+            "row-major": Order blocks by their position in the volume, with
+            the last dimension changing fastest. This is the default.
+
+            "morton": Order blocks along a Morton (Z-order) curve.
+
+            "hilbert": Order blocks along a Hilbert curve.
+
+            Space-filling curves keep blocks that are processed close in time
+            also close in space, which improves the reuse of chunk caches
+            between blocks with overlapping read ROIs.
+
+            If a function is given, it will be called with an integer array of
+            shape ``(n, dims)`` of the grid positions of all blocks in a level,
+            and should return an array of ``n`` keys to sort the blocks by.
+
+        region (list of `class:daisy.Roi` or `class:daisy.Array`, optional):
+
+            If given, only create blocks whose write ROIs intersect this
+            region, given as a list of ROIs or a boolean mask (see
+            `class:daisy.Region`). Dependencies between the remaining blocks
+            are preserved, i.e., if two blocks depended on each other through
+            a block outside of the region, they still do.
+
+        level_strategy (``string``, optional):
+
+            How to assign blocks to levels of independent blocks. Possible
+            options are:
+
+            "stride": Start the blocks of each level with a fixed stride that
+            is at least the write shape plus the largest context per
+            dimension. Blocks only depend on blocks of the previous level.
+            This is the default.
+
+            "coloring": Use a periodic coloring of the blocks with the fewest
+            colors, such that no two blocks of the same color are in conflict.
+            This needs fewer levels than "stride" if the context is not
+            symmetric (e.g., only at the end of the write ROI) or small
+            compared to the write shape in more than one dimension. Blocks
+            depend on all conflicting blocks in previous levels.
     '''
 
-    level_stride = compute_level_stride(block_read_roi, block_write_roi)
-    level_offsets = compute_level_offsets(block_write_roi, level_stride)
+    levels = iterate_dependency_levels(
+        total_roi,
+        block_read_roi,
+        block_write_roi,
+        read_write_conflict,
+        fit,
+        Region(region).skip_outside if region is not None else None,
+        block_order,
+        level_strategy)
+
+    graph = (
+        block
+        for _, level_blocks in levels
+        for block in level_blocks
+    )
 
-    total_shape = total_roi.get_shape()
-    read_shape = block_read_roi.get_shape()
+    if lazy:
+        return graph
 
-    block_tasks = []
+    return list(graph)
 
-    # create a list of conflict offsets for each level, that span the total
-    # ROI
+def iterate_dependency_levels(
+    total_roi,
+    block_read_roi,
+    block_write_roi,
+    read_write_conflict=True,
+    fit='valid',
+    skip_function=None,
+    block_order='row-major',
+    level_strategy='stride'):
+    '''Iterate over the levels of the dependency graph.
 
-    level_conflict_offsets = []
-    prev_level_offset = None
+    Yields tuples ``(level, blocks)``, where ``blocks`` is a generator over
+    ``(block, upstream_blocks)`` for all blocks of this level. All upstream
+    blocks of a level are part of previous levels, i.e., blocks of the
+    current level only depend on blocks that were yielded before.
 
-    for level, level_offset in enumerate(level_offsets):
+    The ``blocks`` generator of a level has to be consumed before advancing to
+    the next level.
 
-        # get conflicts to previous level
-        if prev_level_offset is not None and read_write_conflict:
-            conflict_offsets = get_conflict_offsets(
-                level_offset,
-                prev_level_offset,
-                level_stride)
-        else:
-            conflict_offsets = []
-        prev_level_offset = level_offset
+    Args:
+
+        skip_function (function, optional):
+
+            A function that will be called with a `class:BlockTable` and
+            returns a boolean array, indicating which of the blocks should be
+            skipped (e.g., because they are already completed). Skipped blocks
+            are not part of the graph, and blocks that depended on them depend
+            on their (not skipped) upstream blocks instead.
+
+    See :func:`create_dependency_graph` for a description of the other
+    arguments.
+    '''
 
-        level_conflict_offsets.append(conflict_offsets)
+    level_stride, levels = compute_levels(
+        block_read_roi,
+        block_write_roi,
+        read_write_conflict,
+        level_strategy)
+    order_keys = get_block_order(block_order)
 
-    blocks = []
+    total_shape = total_roi.get_shape()
+
+    # offset to convert block offsets relative to the total ROI start into
+    # global shifts of the block ROIs
+    global_offset = total_roi.get_begin() - block_read_roi.get_begin()
 
-    for level in range(len(level_offsets)):
+    # upstream blocks of skipped blocks in the previous level (or all previous
+    # levels, if blocks depend on more than the previous level)
+    skipped_upstream = {}
 
-        level_offset = level_offsets[level]
+    for level, level_offsets in enumerate(levels):
 
-        # all block offsets of the current level (relative to total ROI start)
-        block_dim_offsets = [
-            range(lo, e, s)
-            for lo, e, s in zip(
+        logger.debug(
+            "enumerating blocks for level %d with offsets %s",
+            level, [ o for o, _ in level_offsets ])
+
+        if level_strategy == 'stride':
+            level_skipped_upstream = {}
+        else:
+            level_skipped_upstream = skipped_upstream
+
+        yield level, (
+            block
+            for level_offset, conflict_offsets in level_offsets
+            for block_offsets in enumerate_level_offsets(
                 level_offset,
+                level_stride,
                 total_shape,
-                level_stride)
-        ]
-        block_offsets = [
-            Coordinate(o)
-            for o in product(*block_dim_offsets)
-        ]
-
-        # convert to global coordinates
-        block_offsets = [
-            o + (total_roi.get_begin() - block_read_roi.get_begin())
-            for o in block_offsets
-        ]
+                global_offset,
+                order_keys=order_keys)
+            for block in enumerate_blocks(
+                total_roi,
+                block_read_roi,
+                block_write_roi,
+                conflict_offsets,
+                block_offsets,
+                fit,
+                skip_function,
+                skipped_upstream,
+                level_skipped_upstream)
+        )
+
+        skipped_upstream = level_skipped_upstream
+
+def compute_levels(
+        block_read_roi,
+        block_write_roi,
+        read_write_conflict=True,
+        level_strategy='stride'):
+    '''Assign the blocks tiling a volume to levels of mutually independent
+    blocks.
+
+    Returns a tuple ``(level_stride, levels)``. Each level is a list of
+    ``(offset, conflict_offsets)``: the level contains all blocks shifted by
+    ``offset`` plus a multiple of ``level_stride``, and each of these blocks
+    depends on the blocks shifted by ``conflict_offsets`` relative to it.
+
+    See :func:`create_dependency_graph` for a description of
+    ``level_strategy``.
+    '''
 
-        logger.debug(
-            "absolute block offsets for level %d: %s", level, block_offsets)
+    if level_strategy == 'stride':
 
-        blocks += enumerate_blocks(
-            total_roi,
+        level_stride = compute_level_stride(block_read_roi, block_write_roi)
+        level_offsets = compute_level_offsets(block_write_roi, level_stride)
+
+        # blocks only depend on the previous level, the other levels are
+        # covered by transitivity
+        levels = []
+        for level, level_offset in enumerate(level_offsets):
+            if level > 0 and read_write_conflict:
+                conflict_offsets = get_conflict_offsets(
+                    level_offset,
+                    level_offsets[level - 1],
+                    level_stride)
+            else:
+                conflict_offsets = []
+            levels.append([(level_offset, conflict_offsets)])
+
+        return level_stride, levels
+
+    if level_strategy == 'coloring':
+
+        return compute_coloring_levels(
             block_read_roi,
             block_write_roi,
-            level_conflict_offsets[level],
-            block_offsets,
-            fit)
+            read_write_conflict)
+
+    raise RuntimeError("Unknown level strategy %s"%level_strategy)
+
+def compute_coloring_levels(
+        block_read_roi,
+        block_write_roi,
+        read_write_conflict):
+    '''Assign blocks to levels by a periodic coloring of the block conflict
+    graph with the fewest colors. Blocks depend on all conflicting blocks in
+    previous levels. See :func:`compute_levels`.'''
+
+    dims = block_write_roi.dims()
+    write_shape = block_write_roi.get_shape()
+
+    if not read_write_conflict:
+        return write_shape, [[(Coordinate((0,)*dims), [])]]
+
+    conflicts = np.array(
+        get_conflict_set(block_read_roi, block_write_roi),
+        dtype=np.int64).reshape((-1, dims))
+
+    # the levels of the stride strategy are a valid coloring, too
+    max_colors = len(compute_level_offsets(
+        block_write_roi,
+        compute_level_stride(block_read_roi, block_write_roi)))
+
+    hnf = find_lattice_coloring(conflicts, dims, max_colors)
+    period = get_period(hnf)
+    num_colors = int(np.prod(np.diag(hnf)))
+
+    logger.debug(
+        "coloring needs %d levels, stride strategy %d",
+        num_colors, max_colors)
+
+    # all grid positions within one period
+    positions = np.stack(
+        np.unravel_index(np.arange(int(np.prod(period))), period),
+        axis=1).astype(np.int64)
+    colors = get_colors(hnf, positions)
+
+    levels = [ [] for _ in range(num_colors) ]
+    for position, color in zip(positions, colors):
+
+        upstream = conflicts[get_colors(hnf, position + conflicts) < color]
+
+        levels[color].append((
+            Coordinate(position*write_shape),
+            [ Coordinate(u*write_shape) for u in upstream ]))
+
+    return Coordinate(np.array(period)*write_shape), levels
+
+def enumerate_level_offsets(
+        level_offset,
+        level_stride,
+        total_shape,
+        global_offset,
+        chunk_size=65536,
+        order_keys=None):
+    '''Generator over all block offsets of one level as integer arrays of
+    shape ``(n, dims)``, with at most ``chunk_size`` offsets per array. The
+    offsets are in row-major order, unless a key function ``order_keys`` is
+    given (see :func:`daisy.block_order.get_block_order`), which will be
+    called with the grid positions of all blocks in the level.'''
+
+    # number of blocks per dimension in this level
+    level_shape = tuple(
+        len(range(lo, e, s))
+        for lo, e, s in zip(level_offset, total_shape, level_stride)
+    )
+    num_blocks = int(np.prod(level_shape))
+
+    level_offset = np.array(level_offset, dtype=np.int64)
+    level_stride = np.array(level_stride, dtype=np.int64)
+    global_offset = np.array(global_offset, dtype=np.int64)
+
+    if order_keys is not None:
+        keys = order_keys(
+            np.stack(
+                np.unravel_index(
+                    np.arange(num_blocks, dtype=np.int64),
+                    level_shape),
+                axis=1).reshape((-1, len(level_shape))))
+        order = np.argsort(keys, kind='stable').astype(np.int64)
+    else:
+        order = None
+
+    for start in range(0, num_blocks, chunk_size):
+
+        end = min(start + chunk_size, num_blocks)
+        if order is None:
+            indices = np.arange(start, end, dtype=np.int64)
+        else:
+            indices = order[start:end]
+        grid_positions = np.stack(
+            np.unravel_index(indices, level_shape),
+            axis=1)
 
-    return blocks
+        yield global_offset + level_offset + grid_positions*level_stride
 
 def compute_level_stride(block_read_roi, block_write_roi):
     '''Get the stride that separates independent blocks in one level.'''
@@ -244,56 +489,276 @@ def enumerate_blocks(
     block_write_roi,
     conflict_offsets,
     block_offsets,
-    fit):
+    fit,
+    skip_function=None,
+    skipped_upstream=None,
+    level_skipped_upstream=None):
+    '''Generator over ``(block, upstream_blocks)`` for all blocks shifted by
+    ``block_offsets`` that pass the inclusion criteria of ``fit``.
+
+    Inclusion and fitting are computed for all blocks and conflicts at once on
+    integer arrays, `class:Block` objects are only created while the
+    generator is consumed.
+
+    If ``skip_function`` is given, blocks for which it returns ``True`` are
+    not yielded. Downstream blocks of a skipped block inherit its unfinished
+    upstream blocks, which are looked up in ``skipped_upstream`` (a
+    dictionary from the IDs of skipped blocks of the previous level to their
+    upstream blocks). Skipped blocks of this level with upstream blocks are
+    stored in ``level_skipped_upstream``.'''
+
+    block_offsets = np.array(block_offsets, dtype=np.int64).reshape(
+        (-1, total_roi.dims()))
+
+    if skipped_upstream is None:
+        skipped_upstream = {}
+
+    blocks, included = fit_block_rois(
+        total_roi,
+        block_read_roi,
+        block_write_roi,
+        block_offsets,
+        fit)
+    skipped = evaluate_skip_function(skip_function, blocks, included)
+
+    # for each conflict offset, the fitted conflicting blocks of all blocks
+    conflicts = []
+    for conflict_offset in conflict_offsets:
+        conflict_blocks, conflict_included = fit_block_rois(
+            total_roi,
+            block_read_roi,
+            block_write_roi,
+            block_offsets + np.array(conflict_offset, dtype=np.int64),
+            fit)
+        conflict_skipped = evaluate_skip_function(
+            skip_function,
+            conflict_blocks,
+            conflict_included)
+        conflicts.append(
+            (conflict_blocks, conflict_included, conflict_skipped))
+
+    if skip_function is None:
+        considered = included
+    else:
+        # skipped blocks are only of interest if they have upstream blocks
+        # that their downstream blocks have to inherit
+        has_upstream = np.zeros(included.shape, dtype=bool)
+        inherited_ids = np.array(list(skipped_upstream.keys()), dtype=np.int64)
+        for conflict_blocks, conflict_included, conflict_skipped in conflicts:
+            has_upstream |= conflict_included & (
+                ~conflict_skipped |
+                np.isin(conflict_blocks.block_ids, inherited_ids))
+        considered = included & (~skipped | has_upstream)
+
+    for i in np.flatnonzero(considered):
 
-    inclusion_criteria = {
-        'valid': lambda b: total_roi.contains(b.read_roi),
-        'overhang': lambda b: total_roi.contains(b.write_roi.get_begin()),
-        'shrink': lambda b: shrink_possible(total_roi, b)
-    }[fit]
+        # get all blocks in conflict with the current block
+        upstream_blocks = []
+        for conflict_blocks, conflict_included, conflict_skipped in conflicts:
 
-    fit_block = {
-        'valid': lambda b: b, # noop
-        'overhang': lambda b: b, # noop
-        'shrink': lambda b: shrink(total_roi, b)
-    }[fit]
+            if not conflict_included[i]:
+                continue
 
-    blocks = []
+            if conflict_skipped[i]:
+                upstream_blocks += skipped_upstream.get(
+                    conflict_blocks.block_ids[i], [])
+            else:
+                upstream_blocks.append(conflict_blocks[i])
 
-    for block_offset in block_offsets:
+        if skip_function is not None:
+            upstream_blocks = list(
+                dict((b.block_id, b) for b in upstream_blocks).values())
 
-        # create a block shifted by the current offset
-        block = Block(
-            total_roi,
-            block_read_roi + block_offset,
-            block_write_roi + block_offset)
+        if skipped[i]:
+            if upstream_blocks:
+                level_skipped_upstream[blocks.block_ids[i]] = upstream_blocks
+            continue
+
+        block = blocks[i]
 
         logger.debug("considering block: %s", block)
 
-        if not inclusion_criteria(block):
-            continue
+        yield block, upstream_blocks
 
-        # get all blocks in conflict with the current block
-        conflicts = []
-        for conflict_offset in conflict_offsets:
+def evaluate_skip_function(skip_function, blocks, included):
+    '''Evaluate ``skip_function`` on all included blocks of the
+    `class:BlockTable` ``blocks``. Returns a boolean mask.'''
 
-            conflict = Block(
-                total_roi,
-                block.read_roi + conflict_offset,
-                block.write_roi + conflict_offset
-            )
+    skipped = np.zeros(included.shape, dtype=bool)
 
-            if not inclusion_criteria(conflict):
-                continue
+    if skip_function is not None and included.any():
+        skipped[included] = skip_function(blocks[included])
 
-            logger.debug("in conflict with block: %s", conflict)
-            conflicts.append(fit_block(conflict))
+    return skipped
 
-        blocks.append((fit_block(block), conflicts))
+def create_block_table(
+        total_roi,
+        block_read_roi,
+        block_write_roi,
+        fit='valid',
+        block_order='row-major',
+        level_strategy='stride'):
+    '''Create a `class:BlockTable` of all blocks tiling ``total_roi``, in the
+    same order as they appear in the dependency graph.
 
-    logger.debug("found blocks: %s", blocks)
+    See :func:`create_dependency_graph` for a description of the arguments.
+    '''
 
-    return blocks
+    tables = list(iterate_block_tables(
+        total_roi,
+        block_read_roi,
+        block_write_roi,
+        fit,
+        block_order=block_order,
+        level_strategy=level_strategy))
+
+    if not tables:
+        return BlockTable.from_blocks(total_roi, [])
+
+    return BlockTable.concatenate(tables)
+
+def iterate_block_tables(
+        total_roi,
+        block_read_roi,
+        block_write_roi,
+        fit='valid',
+        chunk_size=65536,
+        block_order='row-major',
+        level_strategy='stride'):
+    '''Generator over non-empty `class:BlockTable` s of at most
+    ``chunk_size`` blocks, covering all blocks tiling ``total_roi``. See
+    :func:`create_block_table`.'''
+
+    level_stride, levels = compute_levels(
+        block_read_roi,
+        block_write_roi,
+        level_strategy=level_strategy)
+    order_keys = get_block_order(block_order)
+    global_offset = total_roi.get_begin() - block_read_roi.get_begin()
+
+    level_offsets = [
+        level_offset
+        for level in levels
+        for level_offset, _ in level
+    ]
+
+    for level_offset in level_offsets:
+        for block_offsets in enumerate_level_offsets(
+                level_offset,
+                level_stride,
+                total_roi.get_shape(),
+                global_offset,
+                chunk_size,
+                order_keys):
+            blocks, included = fit_block_rois(
+                total_roi,
+                block_read_roi,
+                block_write_roi,
+                block_offsets,
+                fit)
+            if included.any():
+                yield blocks[included]
+
+def fit_block_rois(
+        total_roi,
+        block_read_roi,
+        block_write_roi,
+        block_offsets,
+        fit):
+    '''Compute the read and write ROIs of blocks shifted by ``block_offsets``
+    (an integer array of shape ``(n, dims)``), and whether they are included
+    given the ``fit`` strategy.
+
+    Returns a tuple ``(blocks, included)`` of a `class:BlockTable` with all
+    shifted (and fitted) blocks and a boolean mask of the included blocks.'''
+
+    if fit not in ['valid', 'overhang', 'shrink']:
+        raise RuntimeError("Unknown fit strategy %s"%fit)
+
+    total_begin = np.array(total_roi.get_begin(), dtype=np.int64)
+    total_end = np.array(total_roi.get_end(), dtype=np.int64)
+
+    read_begin = block_offsets + np.array(
+        block_read_roi.get_begin(), dtype=np.int64)
+    read_end = read_begin + np.array(
+        block_read_roi.get_shape(), dtype=np.int64)
+    write_begin = block_offsets + np.array(
+        block_write_roi.get_begin(), dtype=np.int64)
+    write_end = write_begin + np.array(
+        block_write_roi.get_shape(), dtype=np.int64)
+
+    # block IDs are derived from the requested ROIs
+    block_ids = compute_block_ids(
+        total_roi,
+        read_begin,
+        block_write_roi.get_shape())
+    requested_write_begin = write_begin
+    requested_write_end = write_end
+
+    if fit == 'valid':
+
+        # total ROI contains read ROI
+        included = np.all(
+            (read_begin >= total_begin) & (read_end <= total_end),
+            axis=1)
+
+    else:
+
+        # total ROI contains begin of write ROI, and the block does not start
+        # before the total ROI (i.e., is part of the block grid)
+        included = np.all(
+            (write_begin >= total_begin) & (write_begin < total_end) &
+            (read_begin >= total_begin),
+            axis=1)
+
+    if fit == 'shrink':
+
+        # intersect read ROI with total ROI and shrink write ROI by the same
+        # amount, to preserve the context
+        shrunk_read_begin = np.maximum(read_begin, total_begin)
+        shrunk_read_end = np.minimum(read_end, total_end)
+        write_begin = write_begin + (shrunk_read_begin - read_begin)
+        write_end = write_end + (shrunk_read_end - read_end)
+        read_begin = shrunk_read_begin
+        read_end = shrunk_read_end
+
+        # shrunk write ROI has to be non-empty
+        included &= np.all(write_end > write_begin, axis=1)
+
+    blocks = BlockTable(
+        total_roi,
+        block_ids,
+        read_begin,
+        read_end,
+        write_begin,
+        write_end,
+        requested_write_begin,
+        requested_write_end)
+
+    return blocks, included
+
+def compute_block_ids(total_roi, read_begin, write_shape):
+    '''Vectorized version of the block ID computation in `class:Block` for
+    requested read ROIs starting at ``read_begin`` (an integer array of shape
+    ``(n, dims)``) and a write ROI shape ``write_shape``.'''
+
+    write_shape = np.array(write_shape, dtype=np.int64)
+    total_begin = np.array(total_roi.get_begin(), dtype=np.int64)
+    total_shape = np.array(total_roi.get_shape(), dtype=np.int64)
+
+    # upper bound on the number of blocks per dimension
+    num_blocks = (total_shape + write_shape - 1)//write_shape
+
+    # position of the block in the grid of blocks
+    block_index = (read_begin - total_begin)//write_shape
+
+    block_ids = np.zeros((len(read_begin),), dtype=np.int64)
+    f = 1
+    for d in range(total_roi.dims())[::-1]:
+        block_ids += block_index[:, d]*f
+        f *= num_blocks[d]
+
+    return block_ids
 
 def shrink_possible(total_roi, block):
 
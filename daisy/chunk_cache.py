@@ -0,0 +1,275 @@
+from __future__ import absolute_import
+from collections import OrderedDict
+import itertools
+import logging
+import numpy as np
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# the default size of the chunk cache of each process in bytes
+default_max_bytes = 1024**3
+
+class ChunkCache(object):
+    '''A size-bounded cache of decoded chunks of datasets, which evicts the
+    least recently used chunks first.
+
+    Each process has its own cache (see :func:`get_chunk_cache`), which is
+    shared by all datasets opened with ``cache=True`` (see
+    :func:`daisy.open_ds`). Chunks are stored by the key of their dataset and
+    their index in the chunk grid of the dataset.
+
+    Args:
+
+        max_bytes (``int``, optional):
+
+            The maximal size of all cached chunks in bytes.
+
+    Attributes:
+
+        hits (``int``):
+        misses (``int``):
+
+            The number of chunk reads that were served from the cache, or had
+            to be read from the dataset.
+
+        evictions (``int``):
+
+            The number of chunks removed to stay within ``max_bytes``.
+    '''
+
+    def __init__(self, max_bytes=default_max_bytes):
+
+        self.max_bytes = max_bytes
+        self.num_bytes = 0
+        self.chunks = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        '''Get the chunk stored under ``key``, or ``None``.'''
+
+        with self.lock:
+
+            chunk = self.chunks.get(key)
+
+            if chunk is None:
+                self.misses += 1
+                return None
+
+            self.chunks.move_to_end(key)
+            self.hits += 1
+            return chunk
+
+    def put(self, key, chunk):
+        '''Store a chunk under ``key``. Chunks larger than the cache are not
+        stored.'''
+
+        if chunk.nbytes > self.max_bytes:
+            return
+
+        with self.lock:
+
+            previous = self.chunks.pop(key, None)
+            if previous is not None:
+                self.num_bytes -= previous.nbytes
+
+            self.chunks[key] = chunk
+            self.num_bytes += chunk.nbytes
+
+            while self.num_bytes > self.max_bytes:
+                _, evicted = self.chunks.popitem(last=False)
+                self.num_bytes -= evicted.nbytes
+                self.evictions += 1
+
+    def invalidate(self, dataset_key, chunk_indices=None):
+        '''Remove the chunks with the given indices (or all chunks) of a
+        dataset.'''
+
+        with self.lock:
+
+            if chunk_indices is None:
+                keys = [ k for k in self.chunks if k[0] == dataset_key ]
+            else:
+                keys = [ (dataset_key, i) for i in chunk_indices ]
+
+            for key in keys:
+                chunk = self.chunks.pop(key, None)
+                if chunk is not None:
+                    self.num_bytes -= chunk.nbytes
+
+    def clear(self):
+        '''Remove all chunks and reset the counters.'''
+
+        with self.lock:
+
+            self.chunks.clear()
+            self.num_bytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def hit_rate(self):
+        '''The fraction of chunk reads that were served from the cache.'''
+
+        total = self.hits + self.misses
+        return self.hits/total if total > 0 else 0.0
+
+chunk_cache = None
+
+def get_chunk_cache(max_bytes=None):
+    '''Get the chunk cache of this process. If ``max_bytes`` is given, set
+    the maximal size of the cache, e.g., in the ``init_function`` of
+    :func:`daisy.run_blockwise`::
+
+        def init():
+            daisy.get_chunk_cache(max_bytes=4*1024**3)
+
+    The cache is empty in new worker processes.'''
+
+    global chunk_cache
+
+    if chunk_cache is None:
+        chunk_cache = ChunkCache()
+
+    if max_bytes is not None:
+        chunk_cache.max_bytes = max_bytes
+
+    return chunk_cache
+
+def reset_chunk_cache():
+
+    global chunk_cache
+    chunk_cache = None
+
+# forked worker processes start with an empty cache (and an unlocked lock)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=reset_chunk_cache)
+
+class CachedDataset(object):
+    '''Wraps a chunked dataset (e.g., a zarr or HDF5 dataset), such that
+    reads are assembled from whole chunks in the chunk cache of this process
+    (see :func:`get_chunk_cache`). Chunks that are not cached are read from
+    the dataset and added to the cache.
+
+    Writes go to the dataset, and remove the chunks they overlap with from
+    the cache. Chunks written by other processes are not removed, so only
+    data that does not change during a run should be cached.
+
+    Args:
+
+        data (``ndarray``-like):
+
+            The dataset to read from. Should have a ``chunks`` attribute.
+            Datasets without chunks are read directly.
+
+        key (hashable):
+
+            A key identifying the dataset, e.g., its filename and name.
+            Datasets with the same key share their cached chunks.
+    '''
+
+    def __init__(self, data, key):
+
+        self.data = data
+        self.key = key
+
+    def __getattr__(self, name):
+
+        # shape, dtype, chunks, attrs, ... of the dataset
+        if name == 'data':
+            raise AttributeError(name)
+        return getattr(self.data, name)
+
+    def __getitem__(self, key):
+
+        bounds = self.__get_bounds(key)
+        if bounds is None:
+            return self.data[key]
+
+        cache = get_chunk_cache()
+        chunk_shape = self.data.chunks
+
+        begin = [ b for b, _ in bounds ]
+        end = [ e for _, e in bounds ]
+        result = np.empty(
+            tuple(e - b for b, e in bounds),
+            dtype=self.data.dtype)
+
+        for index in self.__get_chunk_indices(bounds):
+
+            chunk_begin = [ i*c for i, c in zip(index, chunk_shape) ]
+            chunk_end = [
+                min((i + 1)*c, s)
+                for i, c, s in zip(index, chunk_shape, self.data.shape)
+            ]
+
+            chunk = cache.get((self.key, index))
+            if chunk is None:
+                chunk = np.asarray(self.data[tuple(
+                    slice(b, e) for b, e in zip(chunk_begin, chunk_end))])
+                cache.put((self.key, index), chunk)
+
+            # the part of the chunk that was requested
+            shared_begin = [ max(b, c) for b, c in zip(begin, chunk_begin) ]
+            shared_end = [ min(e, c) for e, c in zip(end, chunk_end) ]
+
+            result[tuple(
+                slice(sb - b, se - b)
+                for sb, se, b in zip(shared_begin, shared_end, begin)
+            )] = chunk[tuple(
+                slice(sb - c, se - c)
+                for sb, se, c in zip(shared_begin, shared_end, chunk_begin)
+            )]
+
+        return result
+
+    def __setitem__(self, key, value):
+
+        self.data[key] = value
+
+        bounds = self.__get_bounds(key)
+        if bounds is None:
+            get_chunk_cache().invalidate(self.key)
+        else:
+            get_chunk_cache().invalidate(
+                self.key,
+                list(self.__get_chunk_indices(bounds)))
+
+    def __get_bounds(self, key):
+        '''Get the begin and end of each dimension for a key of slices, or
+        ``None`` if the key can not be read chunk-wise.'''
+
+        if getattr(self.data, 'chunks', None) is None:
+            return None
+
+        if not isinstance(key, tuple):
+            key = (key,)
+
+        dims = len(self.data.shape)
+        if len(key) > dims or not all(
+                isinstance(k, slice) and k.step in (None, 1)
+                for k in key):
+            return None
+
+        key = key + (slice(None),)*(dims - len(key))
+
+        bounds = []
+        for k, s in zip(key, self.data.shape):
+            begin, end, _ = k.indices(s)
+            if end <= begin:
+                return None
+            bounds.append((begin, end))
+
+        return bounds
+
+    def __get_chunk_indices(self, bounds):
+
+        return itertools.product(*[
+            range(b//c, (e - 1)//c + 1)
+            for (b, e), c in zip(bounds, self.data.chunks)
+        ])
@@ -0,0 +1,139 @@
+from __future__ import absolute_import
+from itertools import product
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+def get_conflict_set(block_read_roi, block_write_roi):
+    '''Get all non-zero grid offsets (in units of the write shape) between
+    blocks that are in conflict, i.e., where the read ROI of one block
+    intersects with the write ROI of the other.'''
+
+    write_shape = block_write_roi.get_shape()
+    context_begin = block_write_roi.get_begin() - block_read_roi.get_begin()
+    context_end = block_read_roi.get_end() - block_write_roi.get_end()
+
+    # offsets of blocks writing into the read ROI of a block at offset 0
+    # from -ceil(cb/w) to ceil(ce/w)
+    dim_ranges = [
+        range((-cb)//w, -(-ce//w) + 1)
+        for cb, ce, w in zip(context_begin, context_end, write_shape)
+    ]
+
+    conflicts = set()
+    for offset in product(*dim_ranges):
+        if any(o != 0 for o in offset):
+            conflicts.add(offset)
+            conflicts.add(tuple(-o for o in offset))
+
+    return sorted(conflicts)
+
+def find_lattice_coloring(conflicts, dims, max_colors):
+    '''Find a coloring of the integer grid with the fewest colors, such that
+    grid positions that differ by one of the ``conflicts`` have different
+    colors.
+
+    The search considers all colorings by the cosets of a sublattice, which
+    are periodic and can therefore be evaluated for any grid position in
+    closed form. Sublattices are enumerated by their Hermite normal form, for
+    an increasing number of colors up to ``max_colors``.
+
+    Returns the Hermite normal form of the sublattice as an upper triangular
+    integer matrix, or ``None`` if no coloring with at most ``max_colors``
+    colors was found.
+    '''
+
+    conflicts = np.array(conflicts, dtype=np.int64).reshape((-1, dims))
+
+    for num_colors in range(1, max_colors + 1):
+        for hnf in enumerate_hermite_normal_forms(num_colors, dims):
+            if not np.any(in_lattice(hnf, conflicts)):
+                logger.debug(
+                    "found coloring with %d colors: %s",
+                    num_colors, hnf.tolist())
+                return hnf
+
+    return None
+
+def enumerate_hermite_normal_forms(determinant, dims):
+    '''Generator over all upper triangular integer matrices in Hermite normal
+    form with the given determinant.'''
+
+    for diagonal in enumerate_factorizations(determinant, dims):
+
+        # entries above the diagonal are reduced modulo the diagonal entry
+        # below them
+        free_entries = [
+            (i, j)
+            for j in range(dims)
+            for i in range(j)
+        ]
+
+        for values in product(*[range(diagonal[j]) for _, j in free_entries]):
+
+            hnf = np.diag(np.array(diagonal, dtype=np.int64))
+            for (i, j), v in zip(free_entries, values):
+                hnf[i, j] = v
+
+            yield hnf
+
+def enumerate_factorizations(n, k):
+    '''Generator over all ordered factorizations of ``n`` into ``k``
+    positive integers.'''
+
+    if k == 1:
+        yield (n,)
+        return
+
+    for f in range(1, n + 1):
+        if n%f == 0:
+            for rest in enumerate_factorizations(n//f, k - 1):
+                yield (f,) + rest
+
+def reduce_positions(hnf, positions):
+    '''Reduce grid positions (an integer array of shape ``(n, dims)``) to the
+    canonical representatives of their cosets of the lattice spanned by the
+    rows of ``hnf``. After reduction, ``0 <= position[i] < hnf[i, i]``.'''
+
+    positions = np.array(positions, dtype=np.int64).reshape(
+        (-1, hnf.shape[0]))
+
+    for i in range(hnf.shape[0]):
+        q = positions[:, i]//hnf[i, i]
+        positions -= q[:, np.newaxis]*hnf[i][np.newaxis, :]
+
+    return positions
+
+def in_lattice(hnf, positions):
+    '''Test which grid positions are part of the lattice spanned by the rows
+    of ``hnf``.'''
+
+    return np.all(reduce_positions(hnf, positions) == 0, axis=1)
+
+def get_colors(hnf, positions):
+    '''Get the color (the index of the coset of the lattice spanned by the
+    rows of ``hnf``) of each grid position.'''
+
+    reduced = reduce_positions(hnf, positions)
+    return np.ravel_multi_index(
+        tuple(reduced.T),
+        tuple(np.diag(hnf)))
+
+def get_period(hnf):
+    '''Get the smallest multiple of each unit vector that is part of the
+    lattice spanned by the rows of ``hnf``. The coloring repeats with this
+    period along each dimension.'''
+
+    dims = hnf.shape[0]
+    period = []
+
+    for d in range(dims):
+        unit = np.zeros((1, dims), dtype=np.int64)
+        unit[0, d] = 1
+        p = 1
+        while not in_lattice(hnf, p*unit)[0]:
+            p += 1
+        period.append(p)
+
+    return tuple(period)
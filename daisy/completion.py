@@ -0,0 +1,194 @@
+from __future__ import absolute_import
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import numpy as np
+import os
+
+logger = logging.getLogger(__name__)
+
+class CompletionBitmap(object):
+    '''A memory-mapped bitmap file that stores which blocks are completed,
+    indexed by block ID.
+
+    Looking up the completion of many blocks is a vectorized operation on the
+    bitmap, which makes it cheap to resume a run with millions of blocks
+    without calling a check function for each of them::
+
+        bitmap = CompletionBitmap('completed.bitmap', num_blocks)
+
+        done = bitmap.is_completed(block_ids)  # boolean array
+        bitmap.mark_completed(42)
+
+    The bitmap is only meant to be written by a single process (the one
+    scheduling the blocks). Since it is memory-mapped, updates survive a crash
+    of this process.
+
+    Args:
+
+        filename (``string``):
+
+            The file to store the bitmap in. Will be created if it does not
+            exist. If ``None``, the bitmap is only kept in memory.
+
+        num_blocks (``int``):
+
+            The number of block IDs to store, i.e., the largest block ID plus
+            one.
+
+        flush_every (``int``, optional):
+
+            Write changes to disk after this many blocks were marked as
+            completed.
+    '''
+
+    def __init__(self, filename, num_blocks, flush_every=1000):
+
+        self.filename = filename
+        self.num_blocks = num_blocks
+        self.flush_every = flush_every
+        self.num_unflushed = 0
+
+        num_bytes = max(1, (num_blocks + 7)//8)
+
+        if filename is None:
+
+            self.bitmap = np.zeros((num_bytes,), dtype=np.uint8)
+            return
+
+        if os.path.exists(filename):
+
+            if os.path.getsize(filename) != num_bytes:
+                raise RuntimeError(
+                    "Completion bitmap %s has %d bytes, but %d blocks need %d "
+                    "bytes. Was it created for a different volume?"%(
+                        filename,
+                        os.path.getsize(filename),
+                        num_blocks,
+                        num_bytes))
+
+            logger.info("Opening completion bitmap %s", filename)
+            mode = 'r+'
+
+        else:
+
+            logger.info("Creating completion bitmap %s", filename)
+            mode = 'w+'
+
+        self.bitmap = np.memmap(
+            filename,
+            dtype=np.uint8,
+            mode=mode,
+            shape=(num_bytes,))
+
+    def is_completed(self, block_ids):
+        '''Test which of the given block IDs are marked as completed. Returns
+        a boolean array.'''
+
+        block_ids = np.asarray(block_ids, dtype=np.int64)
+        return (self.bitmap[block_ids >> 3] >> (block_ids & 7)) & 1 == 1
+
+    def skip_completed(self, blocks):
+        '''Test which blocks in the `class:BlockTable` ``blocks`` are marked as
+        completed. Can be used as ``skip_function`` for
+        :func:`daisy.blocks.iterate_dependency_levels`.'''
+
+        return self.is_completed(blocks.block_ids)
+
+    def mark_completed(self, block_id):
+        '''Mark the block with the given ID as completed.'''
+
+        self.bitmap[block_id >> 3] |= np.uint8(1 << (block_id & 7))
+
+        self.num_unflushed += 1
+        if self.num_unflushed >= self.flush_every:
+            self.flush()
+
+    def num_completed(self):
+        '''Get the number of blocks marked as completed.'''
+
+        return int(np.unpackbits(self.bitmap).sum())
+
+    def flush(self):
+        '''Write all changes to disk.'''
+
+        if self.filename is not None:
+            self.bitmap.flush()
+        self.num_unflushed = 0
+
+def check_completed(
+        blocks,
+        batch_check_function,
+        bitmap,
+        num_workers=1,
+        batch_size=1000):
+    '''Evaluate a batched check function on blocks in parallel, and mark the
+    completed blocks in a `class:CompletionBitmap`.
+
+    Args:
+
+        blocks (iterable of `class:BlockTable`):
+
+            The blocks to check. Blocks that are already marked as completed
+            in ``bitmap`` will not be checked again.
+
+        batch_check_function (function):
+
+            A function that will be called with a `class:BlockTable` of at
+            most ``batch_size`` blocks and returns a boolean array, indicating
+            which of the blocks are completed.
+
+        bitmap (`class:CompletionBitmap`):
+
+            The bitmap to mark completed blocks in.
+
+        num_workers (``int``, optional):
+
+            The number of threads to evaluate ``batch_check_function`` with.
+
+        batch_size (``int``, optional):
+
+            The maximal number of blocks to pass to ``batch_check_function``
+            at once.
+    '''
+
+    def batches():
+        for table in blocks:
+            table = table[~bitmap.is_completed(table.block_ids)]
+            for i in range(0, len(table), batch_size):
+                yield table[i:i + batch_size]
+
+    def check(batch):
+        completed = np.asarray(batch_check_function(batch), dtype=bool)
+        assert completed.shape == (len(batch),), (
+            "batch check function should return a boolean array with one "
+            "entry per block")
+        return batch.block_ids[completed]
+
+    num_checked = 0
+    num_completed = 0
+
+    with ThreadPoolExecutor(max_workers=num_workers) as pool:
+
+        pending = deque()
+
+        def collect():
+            completed_ids = pending.popleft().result()
+            for block_id in completed_ids.tolist():
+                bitmap.mark_completed(block_id)
+            return len(completed_ids)
+
+        for batch in batches():
+            num_checked += len(batch)
+            pending.append(pool.submit(check, batch))
+            if len(pending) >= 2*num_workers:
+                num_completed += collect()
+
+        while pending:
+            num_completed += collect()
+
+    bitmap.flush()
+
+    logger.info(
+        "Checked %d blocks, %d are completed",
+        num_checked, num_completed)
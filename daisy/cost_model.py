@@ -0,0 +1,243 @@
+from __future__ import absolute_import
+from .priority import Priority
+import heapq
+import logging
+import numpy as np
+import os
+
+logger = logging.getLogger(__name__)
+
+# the maximal number of blocks of a level to pack into tasks at once
+max_packed_blocks = 100000
+
+class CostModel(object):
+    '''Estimates how long each block takes to process, from the durations of
+    the blocks in previous runs on the same volume, or from a cheap proxy for
+    blocks that were not processed before::
+
+        costs = daisy.CostModel('costs.npz', proxy=density)
+
+        daisy.run_blockwise(..., cost_model=costs)
+
+    When passed to :func:`daisy.run_blockwise`, blocks with the highest
+    estimated cost are started first within each level, and blocks fused into
+    tasks (see ``blocks_per_task``) are packed such that tasks take about
+    equally long. The durations of all processed blocks are recorded, and
+    saved to ``filename`` after the run, to be used in the next run.
+
+    Durations are stored by block ID, and are therefore only meaningful for
+    runs with the same ROIs.
+
+    Args:
+
+        filename (``string``, optional):
+
+            The file to load durations of previous runs from, and to save
+            the durations to. If ``None``, the durations are only kept in
+            memory.
+
+        proxy (function, ``dict``, or `class:Array`, optional):
+
+            The cost of blocks without recorded duration, as a function of a
+            `class:Block`, a dictionary from block IDs to costs, or a
+            (typically low-resolution) density map (see `class:Priority`).
+            Defaults to the number of voxels in the write ROI. Proxy costs
+            are converted into seconds using the ratio of recorded durations
+            to proxy costs of the blocks processed so far.
+    '''
+
+    def __init__(self, filename=None, proxy=None):
+
+        self.filename = filename
+
+        if proxy is None:
+            proxy = lambda block: block.write_roi.size()
+        self.proxy = Priority(proxy)
+
+        # durations of previous runs, sorted by block ID, and of this run
+        self.block_ids = np.zeros((0,), dtype=np.int64)
+        self.durations = np.zeros((0,), dtype=np.float64)
+        self.new_durations = {}
+
+        # sums of durations and proxy costs of processed blocks, to convert
+        # proxy costs into seconds
+        self.duration_sum = 0.0
+        self.proxy_sum = 0.0
+
+        # proxy costs of blocks that did not finish yet, by block ID
+        self.pending = {}
+
+        if filename is not None and os.path.exists(filename):
+
+            logger.info("Loading block durations from %s", filename)
+
+            with np.load(filename) as data:
+                self.block_ids = data['block_ids']
+                self.durations = data['durations']
+                self.duration_sum = float(data['duration_sum'])
+                self.proxy_sum = float(data['proxy_sum'])
+
+    def __call__(self, block):
+        '''Get the estimated duration of a block in seconds.'''
+
+        duration = self.get_duration(block.block_id)
+        if duration is not None:
+            return duration
+
+        return self.proxy(block)*self.scale()
+
+    def get_duration(self, block_id):
+        '''Get the recorded duration of a block, or ``None``.'''
+
+        if block_id in self.new_durations:
+            return self.new_durations[block_id]
+
+        i = np.searchsorted(self.block_ids, block_id)
+        if i < len(self.block_ids) and self.block_ids[i] == block_id:
+            return float(self.durations[i])
+
+        return None
+
+    def scale(self):
+        '''Get the factor to convert proxy costs into seconds.'''
+
+        if self.proxy_sum > 0:
+            return self.duration_sum/self.proxy_sum
+
+        return 1.0
+
+    def add_block(self, block):
+        '''Remember the proxy cost of a block that is about to be run.'''
+
+        self.pending[block.block_id] = self.proxy(block)
+
+    def finish_block(self, block_id, status, timing=None):
+        '''Record the duration of a finished block from its ``timing`` (see
+        :func:`daisy.tasks.check_and_run_timed`). Only blocks that were
+        processed successfully are recorded.'''
+
+        proxy = self.pending.pop(block_id, None)
+
+        if status != 1 or not timing:
+            return
+
+        duration = timing['end'] - timing['start']
+        self.new_durations[block_id] = duration
+
+        if proxy is not None:
+            self.duration_sum += duration
+            self.proxy_sum += proxy
+
+    def save(self, filename=None):
+        '''Save the durations of all processed blocks to ``filename``
+        (defaults to the filename this cost model was created with).'''
+
+        if filename is None:
+            filename = self.filename
+        if filename is None:
+            return
+
+        self.merge()
+
+        logger.info(
+            "Saving durations of %d blocks to %s",
+            len(self.block_ids), filename)
+
+        # np.savez appends .npz to filenames without it
+        with open(filename, 'wb') as f:
+            np.savez(
+                f,
+                block_ids=self.block_ids,
+                durations=self.durations,
+                duration_sum=self.duration_sum,
+                proxy_sum=self.proxy_sum)
+
+    def merge(self):
+        '''Merge the durations of this run into the sorted durations of
+        previous runs.'''
+
+        if not self.new_durations:
+            return
+
+        new_ids = np.fromiter(
+            self.new_durations.keys(),
+            dtype=np.int64,
+            count=len(self.new_durations))
+        new_durations = np.fromiter(
+            self.new_durations.values(),
+            dtype=np.float64,
+            count=len(self.new_durations))
+
+        keep = ~np.isin(self.block_ids, new_ids)
+        block_ids = np.concatenate([self.block_ids[keep], new_ids])
+        durations = np.concatenate([self.durations[keep], new_durations])
+
+        order = np.argsort(block_ids)
+        self.block_ids = block_ids[order]
+        self.durations = durations[order]
+        self.new_durations = {}
+
+def pack_tasks(blocks, blocks_per_task, cost_model):
+    '''Pack mutually independent blocks into tasks of up to
+    ``blocks_per_task`` blocks, such that the estimated costs of the tasks
+    are about equal.
+
+    Blocks are assigned in order of decreasing cost to the task with the
+    lowest total cost so far (longest processing time first), in windows of
+    at most ``max_packed_blocks`` blocks.
+
+    Args:
+
+        blocks (iterable of ``(block, upstream_blocks)``):
+
+            The blocks to pack.
+
+        blocks_per_task (``int``):
+
+            The maximal number of blocks per task.
+
+        cost_model (function):
+
+            A function that will be called with a block and returns its
+            estimated cost.
+
+    Returns:
+
+        A generator over tasks, lists of ``(block, upstream_blocks)``, in
+        order of decreasing total cost.
+    '''
+
+    window = []
+
+    for block in blocks:
+        window.append(block)
+        if len(window) == max_packed_blocks:
+            for task in pack_window(window, blocks_per_task, cost_model):
+                yield task
+            window = []
+
+    if window:
+        for task in pack_window(window, blocks_per_task, cost_model):
+            yield task
+
+def pack_window(blocks, blocks_per_task, cost_model):
+
+    costs = [ cost_model(block) for block, _ in blocks ]
+    order = sorted(range(len(blocks)), key=lambda i: -costs[i])
+
+    num_tasks = -(-len(blocks)//blocks_per_task)
+    tasks = [ [] for _ in range(num_tasks) ]
+    task_costs = [0.0]*num_tasks
+
+    # tasks that are not full yet, by total cost
+    open_tasks = [ (0.0, t) for t in range(num_tasks) ]
+
+    for i in order:
+        cost, t = heapq.heappop(open_tasks)
+        tasks[t].append(blocks[i])
+        task_costs[t] = cost + costs[i]
+        if len(tasks[t]) < blocks_per_task:
+            heapq.heappush(open_tasks, (task_costs[t], t))
+
+    for t in sorted(range(num_tasks), key=lambda t: -task_costs[t]):
+        yield tasks[t]
@@ -1,11 +1,41 @@
 from __future__ import absolute_import
-from .blocks import create_dependency_graph
-from dask.distributed import Client, LocalCluster
-import traceback
+from .block_grid import BlockGrid
+from .blocks import iterate_dependency_levels, iterate_block_tables
+from .completion import CompletionBitmap, check_completed
+from .cost_model import pack_tasks
+from .local_scheduler import run_local
+from .memory import MemoryEstimator
+from .planner import plan
+from .priority import Priority
+from .reduction import (
+    get_task_results,
+    get_task_statuses,
+    reduce_partial_results)
+from .region import Region
+from .tasks import (
+    check_and_run_blocks,
+    check_and_run_blocks_reduce,
+    is_coroutine_function,
+    ProcessWithState,
+    teardown_worker_states)
+from collections import deque
+from dask.distributed import Client, LocalCluster, as_completed
 import logging
+import numpy as np
+import os
+import uuid
 
 logger = logging.getLogger(__name__)
 
+# maximal number of tasks that are submitted to the scheduler but did not
+# finish yet, to keep the memory footprint of the scheduler and the driver
+# bounded for very large volumes
+max_pending_tasks = 100000
+
+# the number of partial results folded by each task of the tree reduction
+# on the workers
+reduction_fan_in = 8
+
 def run_blockwise(
     total_roi,
     read_roi,
@@ -16,8 +46,31 @@ def run_blockwise(
     fit='valid',
     num_workers=None,
     processes=True,
-    client=None):
-    '''Run block-wise tasks with dask.
+    client=None,
+    scheduler='dask',
+    completion_file=None,
+    batch_check_function=None,
+    batch_size=1000,
+    block_order='row-major',
+    blocks_per_task=1,
+    init_function=None,
+    teardown_function=None,
+    report=None,
+    executor=None,
+    region=None,
+    level_strategy='stride',
+    memory_budget=None,
+    memory_estimator=None,
+    reduction=None,
+    async_concurrency=16,
+    progress=None,
+    priority_function=None,
+    speculation_factor=None,
+    speculation_fraction=0.9,
+    block_timeout=None,
+    timeout_retries=0,
+    cost_model=None):
+    '''Run block-wise tasks with dask or a local pool of workers.
 
     Args:
 
@@ -125,18 +178,369 @@ def run_blockwise(
             created from ``dask.distributed.Client`` with ``num_workers``
             workers.
 
+        scheduler (``string``, optional):
+
+            Which scheduler to use to run the blocks. Possible options are:
+
+            "dask": Submit the blocks to a dask cluster (see ``client``). This
+            is the default.
+
+            "local": Run the blocks on ``num_workers`` local processes (or
+            threads, see ``processes``), without dask. A block is handed to
+            the next idle worker as soon as all of its upstream blocks
+            finished. This avoids the startup time and per-task overhead of
+            dask for jobs that run on a single machine.
+
+        completion_file (``string``, optional):
+
+            If given, keep track of completed blocks in a memory-mapped bitmap
+            in this file (see `class:daisy.CompletionBitmap`). Blocks are
+            marked as completed after they passed ``check_function``. When
+            resuming a run with the same file, completed blocks are removed
+            from the dependency graph before scheduling, without calling
+            ``check_function`` for them.
+
+        batch_check_function (function, optional):
+
+            A function that will be called as::
+
+                batch_check_function(blocks)
+
+            with a `class:daisy.BlockTable` of at most ``batch_size`` blocks,
+            and should return a boolean array indicating which of the blocks
+            were completed. If given, all blocks are checked in parallel
+            batches before scheduling, and completed blocks are removed from
+            the dependency graph (see ``completion_file``). ``check_function``
+            will then only be used to check if a block was processed
+            correctly.
+
+        batch_size (``int``, optional):
+
+            The maximal number of blocks to pass to ``batch_check_function``
+            at once.
+
+        block_order (``string`` or function, optional):
+
+            The order in which blocks of the same level are scheduled, e.g.,
+            "hilbert" to process neighbouring blocks close together in time.
+            See :func:`daisy.create_dependency_graph` for possible options.
+
+        blocks_per_task (``int``, optional):
+
+            The number of blocks to run in a single task. Blocks of a task are
+            mutually independent and processed one after the other by the
+            same worker, while their status is still reported per block.
+            Fusing blocks amortizes the scheduling overhead per task for small
+            blocks. With the "dask" scheduler, blocks of the same level are
+            fused in the order they are enumerated (see ``block_order``). The
+            "local" scheduler hands up to ``blocks_per_task`` ready blocks to
+            each idle worker.
+
+        init_function (function, optional):
+
+            A function that will be called without arguments once per worker
+            (i.e., per process or thread that runs blocks), before it processes
+            its first block. Use this to load models or open datasets only
+            once per worker. If given, ``process_function`` will be called as::
+
+                process_function(block, state)
+
+            where ``state`` is the return value of ``init_function`` on this
+            worker.
+
+        teardown_function (function, optional):
+
+            A function that will be called with the ``state`` of each worker
+            after all blocks were processed. With the "dask" scheduler, it
+            will be called by the dask worker process holding the state, but
+            not necessarily by the same thread that created it.
+
+        report (`class:daisy.RunReport`, optional):
+
+            If given, record per-block telemetry (timestamps, worker, time
+            spent in the check and process functions, queue wait, and status)
+            in this report.
+
+        executor (`class:daisy.Executor`, optional):
+
+            Run the blocks on the workers of this executor, which can be
+            reused between successive calls. If given, ``scheduler``,
+            ``num_workers``, ``processes``, and ``client`` are taken from the
+            executor.
+
+        region (list of `class:daisy.Roi` or `class:daisy.Array`, optional):
+
+            Only process blocks whose write ROIs intersect this region, given
+            as a list of ROIs or a low-resolution boolean mask. Blocks outside
+            of the region are not created, and no check function is called
+            for them. See :func:`daisy.create_dependency_graph`.
+
+        level_strategy (``string``, optional):
+
+            How to assign blocks to levels of independent blocks, "stride"
+            (the default) or "coloring". "coloring" needs fewer levels for
+            asymmetric contexts. See :func:`daisy.create_dependency_graph`.
+
+        memory_budget (``int``, optional):
+
+            If given, only run blocks at the same time while the sum of their
+            estimated memory (see ``memory_estimator``) fits into this many
+            bytes. With the "local" scheduler, the budget is shared by all
+            workers. With the "dask" scheduler, the budget applies to each
+            dask worker: tasks request their estimated memory as the dask
+            resource ``memory``, which each worker of the local cluster
+            provides ``memory_budget`` of. Workers of an existing cluster (see
+            ``client``) have to be started with this resource, e.g., with
+            ``dask-worker --resources memory=<bytes>``. Blocks that exceed
+            the budget still run, but only while no other block runs.
+
+        memory_estimator (function, optional):
+
+            A function that will be called with a `class:daisy.Block` and
+            returns its estimated memory in bytes. Defaults to a
+            `class:daisy.MemoryEstimator`, i.e., the number of voxels in the
+            read ROI. Use a `class:daisy.MemoryEstimator` with the data type,
+            number of channels, and voxel size of the data to read for better
+            estimates.
+
+        reduction (`class:daisy.Reduction`, optional):
+
+            If given, collect the return values of ``process_function`` of
+            successful blocks in this reduction. With a ``reduce_function``,
+            results are folded per task on the workers and streamed into a
+            single value in the driver as tasks complete::
+
+                histogram = daisy.Reduction(lambda a, b: a + b)
+                daisy.run_blockwise(..., reduction=histogram)
+                print(histogram.value)
+
+        async_concurrency (``int``, optional):
+
+            If ``process_function`` or one of the check functions is an
+            ``async def`` function, each worker runs up to this many blocks
+            concurrently on an event loop, which keeps workers busy while
+            blocks wait for I/O. Dependencies between blocks are respected as
+            before. With the "local" scheduler, a worker is handed new ready
+            blocks as soon as one of its blocks finished. With the "dask"
+            scheduler, up to ``async_concurrency`` blocks (or
+            ``blocks_per_task``, if larger) of the same level are fused into a
+            task, and run concurrently.
+
+        progress (`class:daisy.Progress`, optional):
+
+            If given, report the live progress of the run (finished blocks
+            per level, throughput, and ETA) to it, and call its callbacks as
+            blocks are submitted and finish. The run can be stopped by
+            cancelling the progress, in which case this function returns
+            ``False``.
+
+        priority_function (function, optional):
+
+            The priority of each block, given as a function that will be
+            called with a `class:daisy.Block`, a dictionary from block IDs to
+            priorities, or a cost map (see `class:daisy.Priority`). Of the
+            blocks whose upstream blocks finished, the ones with the highest
+            priority run first. With the "local" scheduler, ready blocks are
+            handed to idle workers by priority. With the "dask" scheduler,
+            each task is submitted with the highest priority of its blocks,
+            which dask uses to order ready tasks.
+
+        speculation_factor (``float``, optional):
+
+            If given, run slow blocks speculatively a second time: once at
+            least ``speculation_fraction`` of the blocks of a level finished,
+            a block of this level that runs for longer than
+            ``speculation_factor`` times the median duration of the finished
+            blocks of the level is started again on an idle worker. The first
+            copy that passes the check function wins, and the other copy is
+            cancelled. Use this only if ``process_function`` can safely be
+            run more than once at the same time on the same block, i.e., if
+            writes to the write ROI are idempotent. Needs worker processes
+            (see ``processes``), since the worker thread of a cancelled copy
+            can not be stopped. Only supported by the "local" scheduler.
+
+        speculation_fraction (``float``, optional):
+
+            See ``speculation_factor``.
+
+        block_timeout (``float``, optional):
+
+            If given, the maximal time in seconds a block is allowed to run
+            (including the check functions). A block that runs longer is
+            marked as errored (or run again, see ``timeout_retries``), and its
+            worker process is killed and replaced, such that a hanging
+            ``process_function`` does not block the worker, or the blocks
+            downstream of it, forever. Other blocks handed to this worker are
+            run again. Needs worker processes (see ``processes``), since
+            worker threads can not be killed. Only supported by the "local"
+            scheduler.
+
+        timeout_retries (``int``, optional):
+
+            How many times to run a block again after it timed out, before it
+            is marked as errored.
+
+        cost_model (`class:daisy.CostModel`, optional):
+
+            If given, estimate the duration of each block with this cost
+            model, from the durations of a previous run on the same volume or
+            from a proxy. Unless a ``priority_function`` is given, blocks
+            with the longest estimated duration are run first within each
+            level. With the "dask" scheduler, blocks fused into tasks (see
+            ``blocks_per_task``) are packed such that tasks take about equally
+            long. The durations of all processed blocks are recorded in the
+            cost model, and saved to its file after the run.
+
     Returns:
 
         True, if all tasks succeeded (or were skipped because they were already
         completed in an earlier run).
     '''
 
-    blocks = create_dependency_graph(
+    if report is not None:
+        report.start()
+
+    if region is not None:
+        region = Region(region)
+
+    if completion_file is not None or batch_check_function is not None:
+
+        grid = BlockGrid(
+            total_roi,
+            read_roi,
+            write_roi,
+            read_write_conflict,
+            fit,
+            level_strategy)
+        completion = CompletionBitmap(completion_file, grid.num_block_ids())
+
+        if batch_check_function is not None:
+
+            tables = iterate_block_tables(
+                total_roi,
+                read_roi,
+                write_roi,
+                fit,
+                level_strategy=level_strategy)
+
+            # blocks outside the region are skipped anyway
+            if region is not None:
+                tables = (
+                    table[~region.skip_outside(table)]
+                    for table in tables)
+
+            check_completed(
+                tables,
+                batch_check_function,
+                completion,
+                get_num_check_threads(num_workers, client, executor),
+                batch_size)
+
+        skip_function = completion.skip_completed
+        logger.info(
+            "%d blocks are already completed",
+            completion.num_completed())
+
+        def callback(block_id, status):
+            if status >= 0:
+                completion.mark_completed(block_id)
+
+    else:
+
+        completion = None
+        skip_function = None
+        callback = None
+
+    if region is not None:
+
+        if skip_function is None:
+            skip_function = region.skip_outside
+        else:
+            skip_completed = skip_function
+            skip_function = lambda blocks: (
+                region.skip_outside(blocks) | skip_completed(blocks))
+
+    if progress is not None:
+
+        if skip_function is None:
+            expected_blocks = plan(
+                total_roi,
+                read_roi,
+                write_roi,
+                fit,
+                read_write_conflict,
+                suggest=False,
+                level_strategy=level_strategy).num_blocks
+        else:
+            # blocks outside the region or completed earlier are not run
+            expected_blocks = sum(
+                len(table) - int(np.count_nonzero(skip_function(table)))
+                for table in iterate_block_tables(
+                    total_roi,
+                    read_roi,
+                    write_roi,
+                    fit,
+                    level_strategy=level_strategy))
+
+        progress.start(expected_blocks, num_workers)
+
+    levels = iterate_dependency_levels(
         total_roi,
         read_roi,
         write_roi,
         read_write_conflict,
-        fit)
+        fit,
+        skip_function,
+        block_order,
+        level_strategy)
+
+    pre_check, post_check = split_check_function(check_function)
+
+    if batch_check_function is not None:
+
+        # completed blocks were removed from the graph already
+        pre_check = lambda _: False
+
+    results = run_levels(
+        levels,
+        process_function,
+        pre_check,
+        post_check,
+        scheduler,
+        num_workers,
+        processes,
+        client,
+        executor,
+        callback,
+        blocks_per_task,
+        init_function,
+        teardown_function,
+        report,
+        memory_budget=memory_budget,
+        memory_estimator=memory_estimator,
+        reduction=reduction,
+        async_concurrency=get_async_concurrency(
+            [ process_function, pre_check, post_check ],
+            async_concurrency),
+        progress=progress,
+        priority=priority_function,
+        speculation_factor=speculation_factor,
+        speculation_fraction=speculation_fraction,
+        block_timeout=block_timeout,
+        timeout_retries=timeout_retries,
+        cost_model=cost_model)
+
+    if completion is not None:
+        completion.flush()
+
+    if cost_model is not None:
+        cost_model.save()
+
+    return log_results(results, report, progress)
+
+def split_check_function(check_function):
+    '''Get the pre- and post-check functions ``(pre_check, post_check)`` for
+    the ``check_function`` argument of :func:`run_blockwise`.'''
 
     if check_function is not None:
 
@@ -151,51 +555,273 @@ def run_blockwise(
         pre_check = lambda _: False
         post_check = lambda _: True
 
-    # dask requires strings for task names, string representation of
-    # `class:Roi` is assumed to be unique.
-    tasks = {
-        block_to_dask_name(block): (
-            check_and_run,
-            block,
+    return pre_check, post_check
+
+def get_num_check_threads(num_workers, client=None, executor=None):
+    '''Get the number of threads to evaluate a batched check function with:
+    ``num_workers`` if given, otherwise the number of workers of the
+    executor or the number of threads of the dask client, and the number of
+    CPUs if neither is known.'''
+
+    if num_workers is not None:
+        return num_workers
+
+    if executor is not None:
+        if executor.num_workers is not None:
+            return executor.num_workers
+        if executor.pool is not None:
+            return executor.pool.num_workers
+        client = executor.client
+
+    if client is not None:
+        num_threads = sum(client.nthreads().values())
+        if num_threads > 0:
+            return num_threads
+
+    return os.cpu_count() or 1
+
+def get_async_concurrency(functions, async_concurrency):
+    '''Get the ``async_concurrency`` to run the given functions with, or
+    ``None`` if none of them is an ``async def`` function.'''
+
+    if any(is_coroutine_function(f) for f in functions):
+        return async_concurrency
+
+    return None
+
+def run_levels(
+        levels,
+        process_function,
+        pre_check,
+        post_check,
+        scheduler='dask',
+        num_workers=None,
+        processes=True,
+        client=None,
+        executor=None,
+        callback=None,
+        blocks_per_task=1,
+        init_function=None,
+        teardown_function=None,
+        report=None,
+        read_ahead=0,
+        memory_budget=None,
+        memory_estimator=None,
+        reduction=None,
+        async_concurrency=None,
+        progress=None,
+        priority=None,
+        speculation_factor=None,
+        speculation_fraction=0.9,
+        block_timeout=None,
+        timeout_retries=0,
+        cost_model=None):
+    '''Run the blocks of all ``levels`` with the given ``scheduler``. See
+    :func:`run_blockwise` for a description of the arguments (``priority``
+    is the ``priority_function`` of :func:`run_blockwise`). ``read_ahead``
+    is passed on to :func:`daisy.local_scheduler.run_local`. Blocks are run
+    with ``async_concurrency`` only if it is not ``None`` (see
+    :func:`get_async_concurrency`).
+
+    Returns a dictionary with the number of blocks per status code in
+    ``counts``, and a list of the IDs of failed blocks in ``failed``.
+    '''
+
+    if priority is None and cost_model is not None:
+        priority = cost_model
+
+    if priority is not None:
+        priority = Priority(priority)
+
+    pool = None
+    if executor is not None:
+        executor.start()
+        scheduler = executor.scheduler
+        client = executor.client
+        pool = executor.pool
+
+    if scheduler == 'local':
+
+        results = run_local(
+            levels,
             process_function,
             pre_check,
             post_check,
-            [ block_to_dask_name(ups) for ups in upstream_blocks ]
-        )
-        for block, upstream_blocks in blocks
-    }
+            num_workers,
+            processes,
+            callback,
+            blocks_per_task,
+            init_function,
+            teardown_function,
+            report,
+            pool,
+            read_ahead,
+            memory_budget,
+            memory_estimator,
+            reduction,
+            async_concurrency,
+            progress,
+            priority,
+            speculation_factor,
+            speculation_fraction,
+            block_timeout,
+            timeout_retries,
+            cost_model)
+
+    elif scheduler == 'dask':
+
+        if speculation_factor is not None:
+            raise RuntimeError(
+                "Speculative execution is only supported by the 'local' "
+                "scheduler")
+
+        if block_timeout is not None:
+            raise RuntimeError(
+                "Block timeouts are only supported by the 'local' scheduler")
+
+        results = run_dask(
+            levels,
+            process_function,
+            pre_check,
+            post_check,
+            num_workers,
+            processes,
+            client,
+            callback,
+            blocks_per_task,
+            init_function,
+            teardown_function,
+            report,
+            memory_budget,
+            memory_estimator,
+            reduction,
+            async_concurrency,
+            progress,
+            priority,
+            cost_model)
+
+    else:
+
+        raise RuntimeError("Unknown scheduler %s"%scheduler)
+
+    return results
+
+def log_results(results, report=None, progress=None):
+    '''Log the results of a run, and return ``True`` if no block failed and
+    the run was not cancelled.'''
+
+    if progress is not None:
+        progress.stop()
+
+    if report is not None:
+        report.stop()
+        critical_path_length, _ = report.critical_path()
+        logger.info(
+            "Processed %.2f blocks/s (%.2f voxels/s), critical path took "
+            "%.2fs of %.2fs",
+            report.throughput(), report.voxel_throughput(),
+            critical_path_length, report.duration())
+
+    num_tasks = sum(results['counts'].values())
+    num_failed = results['counts'][-1]
+    num_errored = results['counts'][-2]
+
+    logger.info(
+        "Ran %d tasks, of which %d succeeded, %d were skipped, %d failed (%d "
+        "failed check, %d errored)",
+        num_tasks, results['counts'][1], results['counts'][0],
+        num_failed + num_errored, num_failed, num_errored)
+
+    if len(results['failed']) > 0:
+        logger.info(
+            "Failed blocks: %s",
+            " ".join([str(b) for b in results['failed']]))
+
+    if progress is not None and progress.cancelled:
+        logger.info("Run was cancelled")
+        return False
+
+    return num_failed + num_errored == 0
+
+def run_dask(
+        levels,
+        process_function,
+        pre_check,
+        post_check,
+        num_workers,
+        processes,
+        client,
+        callback=None,
+        blocks_per_task=1,
+        init_function=None,
+        teardown_function=None,
+        report=None,
+        memory_budget=None,
+        memory_estimator=None,
+        reduction=None,
+        async_concurrency=None,
+        progress=None,
+        priority=None,
+        cost_model=None):
+    '''Run the blocks of all ``levels`` on a dask cluster. Creates a local
+    cluster if ``client`` is ``None``. If given, ``callback`` will be called
+    with ``(block_id, status)`` for every finished block. Up to
+    ``blocks_per_task`` blocks of the same level are run in one task. See
+    :func:`run_blockwise` for ``init_function``, ``teardown_function``,
+    ``report``, ``memory_budget``, ``memory_estimator``, ``reduction``,
+    ``async_concurrency``, ``progress``, ``priority``, and
+    ``cost_model``.'''
 
     own_client = client is None
 
     if own_client:
+        client = create_local_client(num_workers, processes, memory_budget)
 
-        if num_workers is not None:
-            print("Creating local cluster with %d workers..."%num_workers)
+    if memory_budget is not None:
+        check_memory_resources(client)
 
-        if processes:
-            cluster = LocalCluster(
-                n_workers=num_workers,
-                threads_per_worker=1,
-                memory_limit=0,
-                diagnostics_port=None)
-        else:
-            cluster = LocalCluster(
-                n_workers=1,
-                threads_per_worker=num_workers,
-                processes=False,
-                memory_limit=0,
-                diagnostics_port=None)
+    if memory_budget is not None and memory_estimator is None:
+        memory_estimator = MemoryEstimator()
 
-        client = Client(cluster)
+    if async_concurrency is not None:
+        blocks_per_task = max(blocks_per_task, async_concurrency)
 
-    logger.info("Scheduling %d tasks...", len(tasks))
+    logger.info("Scheduling tasks...")
 
     # don't show dask performance warnings (too verbose, probably not
     # applicable to our use-case)
     logging.getLogger('distributed.utils_perf').setLevel(logging.ERROR)
 
-    # run all tasks
-    results = client.get(tasks, list(tasks.keys()))
+    if init_function is not None:
+
+        # keep the state of each worker thread in the worker process, under a
+        # token unique to this run
+        token = uuid.uuid4().hex
+        process_function = ProcessWithState(
+            process_function,
+            init_function,
+            token)
+
+    # run all tasks, consuming the dependency graph level by level
+    results = submit_levels(
+        client,
+        levels,
+        process_function,
+        pre_check,
+        post_check,
+        callback,
+        blocks_per_task,
+        report,
+        memory_budget,
+        memory_estimator,
+        reduction,
+        async_concurrency,
+        progress,
+        priority,
+        cost_model)
+
+    if init_function is not None:
+        client.run(teardown_worker_states, token, teardown_function)
 
     if own_client:
 
@@ -210,46 +836,311 @@ def run_blockwise(
         except Exception:
             pass
 
-    succeeded = [ t for t, r in zip(tasks, results) if r == 1 ]
-    skipped = [ t for t, r in zip(tasks, results) if r == 0 ]
-    failed = [ t for t, r in zip(tasks, results) if r == -1 ]
-    errored = [ t for t, r in zip(tasks, results) if r == -2 ]
+    return results
 
-    logger.info(
-        "Ran %d tasks, of which %d succeeded, %d were skipped, %d failed (%d "
-        "failed check, %d errored)",
-        len(tasks), len(succeeded), len(skipped),
-        len(failed) + len(errored), len(failed), len(errored))
+def create_local_client(num_workers, processes, memory_budget=None):
+    '''Create a dask client for a local cluster with ``num_workers``
+    processes (or threads, if ``processes`` is ``False``). If
+    ``memory_budget`` is given, each worker provides this many bytes of the
+    resource ``memory``.'''
 
-    if len(failed) > 0:
-        logger.info(
-            "Failed blocks: %s", " ".join([str(t[1]) for _, t in failed]))
+    if num_workers is not None:
+        print("Creating local cluster with %d workers..."%num_workers)
 
-    return len(failed) + len(errored) == 0
+    if memory_budget is not None:
+        resources = { 'memory': memory_budget }
+    else:
+        resources = None
+
+    if processes:
+        cluster = LocalCluster(
+            n_workers=num_workers,
+            threads_per_worker=1,
+            memory_limit=0,
+            diagnostics_port=None,
+            resources=resources)
+    else:
+        cluster = LocalCluster(
+            n_workers=1,
+            threads_per_worker=num_workers,
+            processes=False,
+            memory_limit=0,
+            diagnostics_port=None,
+            resources=resources)
+
+    return Client(cluster)
+
+def check_memory_resources(client):
+    '''Ensure that the workers of ``client`` provide the resource
+    ``memory``, which tasks request if a memory budget is given.'''
+
+    workers = client.scheduler_info()['workers'].values()
+    if not any('memory' in w.get('resources', {}) for w in workers):
+        raise RuntimeError(
+            "A memory budget was given, but no dask worker provides the "
+            "resource 'memory'. Start the workers with "
+            "'--resources memory=<bytes>'.")
+
+def submit_levels(
+        client,
+        levels,
+        process_function,
+        pre_check,
+        post_check,
+        callback=None,
+        blocks_per_task=1,
+        report=None,
+        memory_budget=None,
+        memory_estimator=None,
+        reduction=None,
+        async_concurrency=None,
+        progress=None,
+        priority=None,
+        cost_model=None):
+    '''Submit the blocks of all ``levels`` to ``client`` and collect the
+    results. Consecutive blocks of a level are fused into tasks of up to
+    ``blocks_per_task`` blocks. Only futures of unfinished tasks are kept to
+    express dependencies, and at most ``max_pending_tasks`` are submitted at
+    the same time.
+
+    If ``memory_budget`` is given, each task requests the largest estimated
+    memory of its blocks (but at most ``memory_budget``) as the dask resource
+    ``memory``.
+
+    If ``reduction`` is given, each task folds the results of its blocks.
+    With a ``reduce_function``, the partial results of the tasks are folded
+    in a tree of tasks on the workers, such that only the final value is sent
+    back. Otherwise, the results of a task are added to ``reduction`` as soon
+    as the task finished. Downstream tasks depend on the statuses of their
+    upstream tasks only, such that results are not sent to them.
+
+    If ``async_concurrency`` is given, the blocks of a task run concurrently
+    (see :func:`daisy.tasks.run_blocks`).
+
+    If ``progress`` is given, report the progress to it, and stop submitting
+    (and cancel all waiting tasks) if it is cancelled.
+
+    If ``priority`` is given, each task is submitted with the highest
+    priority of its blocks as its dask priority.
+
+    If ``cost_model`` is given, the blocks of a level are packed into tasks
+    of about equal estimated duration (see
+    :func:`daisy.cost_model.pack_tasks`), and the durations of finished
+    blocks are recorded in the cost model.'''
+
+    results = {
+        'counts': { 1: 0, 0: 0, -1: 0, -2: 0 },
+        'failed': []
+    }
 
-def block_to_dask_name(block):
+    pending = as_completed(with_results=True)
+
+    # tasks of successive runs on the same client need distinct keys, since
+    # dask might not have released the tasks of the previous run yet
+    run_token = uuid.uuid4().hex
+
+    # futures of the tasks of all submitted blocks that did not finish yet,
+    # by block name
+    futures = {}
+
+    # the blocks of each submitted task that did not finish yet, by the key
+    # of the future that reports their statuses
+    task_blocks = {}
+
+    # futures of partial reductions that were not folded yet
+    tree_reduce = (
+        reduction is not None and reduction.reduce_function is not None)
+    partial_results = deque()
+
+    def fold(final=False):
+        while (
+                len(partial_results) >= reduction_fan_in or
+                (final and len(partial_results) > 1)):
+            group = [
+                partial_results.popleft()
+                for _ in range(min(reduction_fan_in, len(partial_results)))
+            ]
+            partial_results.append(client.submit(
+                reduce_partial_results,
+                reduction.reduce_function,
+                *group,
+                pure=False))
+
+    def collect(future, statuses):
+        if reduction is not None and not tree_reduce:
+            statuses, block_results = statuses
+            reduction.add(block_results)
+        for block, (status, timing) in zip(
+                task_blocks.pop(future.key),
+                statuses):
+            del futures[block_to_dask_name(block)]
+            if report is not None:
+                report.finish_block(block.block_id, status, timing)
+            if progress is not None:
+                progress.finish_block(block.block_id, status, timing)
+            if cost_model is not None:
+                cost_model.finish_block(block.block_id, status, timing)
+            results['counts'][status] += 1
+            if status < 0:
+                results['failed'].append(block.block_id)
+            if callback is not None:
+                callback(block.block_id, status)
+
+    def cancelled():
+        return progress is not None and progress.cancelled
+
+    def submit(blocks, level):
+
+        # upstream blocks without a future finished already
+        upstream_futures = {}
+        for block, upstream_blocks in blocks:
+            if report is not None:
+                report.add_block(block, upstream_blocks)
+            if progress is not None:
+                progress.add_block(block, level)
+            if cost_model is not None:
+                cost_model.add_block(block)
+            for ups in upstream_blocks:
+                name = block_to_dask_name(ups)
+                if name in futures:
+                    upstream_futures[futures[name].key] = futures[name]
+
+        blocks = [ block for block, _ in blocks ]
+
+        # dask requires strings for task names, block IDs are assumed to be
+        # unique
+        name = '%s-%s'%(block_to_dask_name(blocks[0]), run_token)
+
+        # blocks of a task run one after the other, or all at once if they
+        # are asynchronous
+        if memory_budget is not None:
+            estimates = [ memory_estimator(block) for block in blocks ]
+            resources = {
+                'memory': min(
+                    memory_budget,
+                    sum(estimates) if async_concurrency else max(estimates))
+            }
+        else:
+            resources = None
 
-    return '%d'%block.block_id
+        if priority is not None:
+            task_priority = max(priority(block) for block in blocks)
+        else:
+            task_priority = 0
+
+        if reduction is not None:
+            function = check_and_run_blocks_reduce
+            args = [reduction.reduce_function]
+        else:
+            function = check_and_run_blocks
+            args = []
+
+        future = client.submit(
+            function,
+            blocks,
+            process_function,
+            pre_check,
+            post_check,
+            *(args + list(upstream_futures.values())),
+            key=name,
+            pure=False,
+            resources=resources,
+            priority=task_priority,
+            async_concurrency=async_concurrency)
+
+        if reduction is not None:
+
+            # downstream tasks (and, for tree reductions, the driver) only
+            # get the statuses
+            status_future = client.submit(
+                get_task_statuses,
+                future,
+                key='statuses-' + name,
+                pure=False,
+                priority=task_priority)
+
+            if tree_reduce:
+                partial_results.append(client.submit(
+                    get_task_results,
+                    future,
+                    key='results-' + name,
+                    pure=False))
+                fold()
+                collected_future = status_future
+            else:
+                collected_future = future
+
+        else:
+
+            status_future = future
+            collected_future = future
+
+        for block in blocks:
+            futures[block_to_dask_name(block)] = status_future
+            if progress is not None:
+                progress.submit_block(block.block_id)
+        task_blocks[collected_future.key] = blocks
+        pending.add(collected_future)
+
+        while pending.has_ready() or pending.count() >= max_pending_tasks:
+            collect(*next(pending))
+
+    for level, level_blocks in levels:
+
+        if cancelled():
+            break
 
-def check_and_run(block, process_function, pre_check, post_check, *args):
+        logger.debug("Submitting tasks of level %d", level)
 
-    if pre_check(block):
-        logger.info("Skipping task for block %s; already processed.", block)
-        return 0
+        # blocks of the same level are independent and can be fused
+        if cost_model is not None:
+            tasks = pack_tasks(level_blocks, blocks_per_task, cost_model)
+        else:
+            tasks = fuse_blocks(level_blocks, blocks_per_task)
+
+        for task in tasks:
+            submit(task, level)
+            if cancelled():
+                break
+
+    else:
+
+        if progress is not None:
+            progress.finish_reading()
+
+    for future, statuses in pending:
+        if cancelled():
+            break
+        collect(future, statuses)
+
+    if cancelled():
 
-    try:
-        process_function(block)
-    except:
-        logger.error(
-            "Task for block %s failed:\n%s",
-            block, traceback.format_exc())
-        return -2
+        # tasks that are running already will finish, but their results are
+        # ignored
+        client.cancel(list(set(futures.values())) + list(partial_results))
+        pending.clear()
 
-    if not post_check(block):
-        logger.error(
-            "Completion check failed for task for block %s.",
-            block)
-        return -1
+    elif partial_results:
 
-    return 1
+        fold(final=True)
+        reduction.add(partial_results.pop().result())
 
+    return results
+
+def fuse_blocks(blocks, blocks_per_task):
+    '''Fuse consecutive ``(block, upstream_blocks)`` into tasks of up to
+    ``blocks_per_task`` blocks. Returns a generator over tasks.'''
+
+    task = []
+    for block in blocks:
+        task.append(block)
+        if len(task) == blocks_per_task:
+            yield task
+            task = []
+
+    if task:
+        yield task
+
+def block_to_dask_name(block):
+
+    return '%d'%block.block_id
@@ -1,5 +1,6 @@
 from __future__ import absolute_import, division
 from .array import Array
+from .chunk_cache import CachedDataset
 from .coordinate import Coordinate
 from .ext import zarr, h5py
 from .roi import Roi
@@ -47,7 +48,44 @@ def _read_voxel_size_offset(ds, order='C'):
 
     return Coordinate(voxel_size), Coordinate(offset)
 
-def open_ds(filename, ds_name, mode='r'):
+def open_ds(filename, ds_name, mode='r', cache=False):
+    '''Open a dataset in a zarr, N5, or HDF5 container as an `class:Array`.
+
+    Args:
+
+        filename (``string``):
+
+            The container to open, or a JSON file with the keys
+            ``container``, ``offset``, and ``size`` to open a sub-ROI of a
+            dataset in a container.
+
+        ds_name (``string``):
+
+            The name of the dataset in the container.
+
+        mode (``string``, optional):
+
+            The mode to open the container with.
+
+        cache (``bool``, optional):
+
+            If ``True``, read the dataset through the chunk cache of this
+            process (see :func:`daisy.get_chunk_cache`): reads are assembled
+            from decoded chunks, which are kept in memory and shared by all
+            arrays of the same dataset opened with ``cache=True``. This avoids
+            decompressing the same chunks again for overlapping reads, e.g.,
+            of the read ROIs of neighbouring blocks.
+    '''
+
+    if cache and not filename.endswith('.json'):
+
+        array = open_ds(filename, ds_name, mode)
+        return Array(
+            CachedDataset(
+                array.data,
+                (os.path.abspath(filename), ds_name.strip('/'))),
+            array.roi,
+            array.voxel_size)
 
     if filename.endswith('.zarr'):
 
@@ -88,7 +126,7 @@ def open_ds(filename, ds_name, mode='r'):
         with open(filename, 'r') as f:
             spec = json.load(f)
 
-        array = open_ds(spec['container'], ds_name, mode)
+        array = open_ds(spec['container'], ds_name, mode, cache)
         return Array(
             array.data,
             Roi(spec['offset'], spec['size']),
@@ -0,0 +1,116 @@
+from __future__ import absolute_import
+from .dask_scheduler import create_local_client
+from .local_scheduler import LocalPool
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Executor(object):
+    '''Owns a pool of workers that can be shared by successive calls of
+    :func:`daisy.run_blockwise` (and functions built on it, like
+    :func:`daisy.persistence.SharedGraphProvider.read_blockwise`), such that
+    workers are only started once::
+
+        with daisy.Executor(scheduler='local', num_workers=8) as executor:
+
+            daisy.run_blockwise(..., executor=executor)
+            daisy.run_blockwise(..., executor=executor)
+
+    Workers are started on first use (or by calling :func:`start`), and
+    stopped when leaving the ``with`` block (or by calling
+    :func:`shutdown`).
+
+    Args:
+
+        scheduler (``string``, optional):
+
+            Which scheduler to use, "dask" (default) or "local". See
+            :func:`daisy.run_blockwise`.
+
+        num_workers (int, optional):
+
+            The number of worker processes or threads to start.
+
+        processes (bool, optional):
+
+            If ``True`` (default), spawns a process per worker, otherwise a
+            thread.
+
+        client (optional):
+
+            For the "dask" scheduler, an existing dask client to use instead
+            of starting a local cluster. The client will not be closed by
+            :func:`shutdown`.
+
+        memory_budget (``int``, optional):
+
+            For the "dask" scheduler, the number of bytes of the resource
+            ``memory`` each worker of the local cluster provides. Needed to
+            pass ``memory_budget`` to :func:`daisy.run_blockwise`, see there.
+            The "local" scheduler takes the budget per run.
+    '''
+
+    def __init__(
+            self,
+            scheduler='dask',
+            num_workers=None,
+            processes=True,
+            client=None,
+            memory_budget=None):
+
+        if scheduler not in ['dask', 'local']:
+            raise RuntimeError("Unknown scheduler %s"%scheduler)
+
+        self.scheduler = scheduler
+        self.num_workers = num_workers
+        self.processes = processes
+        self.client = client
+        self.own_client = client is None
+        self.memory_budget = memory_budget
+        self.pool = None
+
+    def start(self):
+        '''Start the workers, if they are not running yet.'''
+
+        if self.scheduler == 'local':
+
+            if self.pool is None:
+                self.pool = LocalPool(self.num_workers, self.processes)
+
+        elif self.client is None:
+
+            self.client = create_local_client(
+                self.num_workers,
+                self.processes,
+                self.memory_budget)
+
+    def shutdown(self):
+        '''Stop the workers.'''
+
+        if self.pool is not None:
+            self.pool.stop()
+            self.pool = None
+
+        if self.own_client and self.client is not None:
+
+            try:
+
+                # don't show dask distributes warning during shutdown
+                logging.getLogger('distributed').setLevel(logging.ERROR)
+
+                self.client.close()
+
+            # ignore exceptions during shutdown
+            except Exception:
+                pass
+
+            self.client = None
+
+    def __enter__(self):
+
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        self.shutdown()
@@ -0,0 +1,1155 @@
+from __future__ import absolute_import
+from .memory import MemoryBudget
+from .speculation import Speculation
+from .tasks import check_and_run_result, check_and_run_result_async
+from collections import deque
+import asyncio
+import cloudpickle
+import concurrent.futures
+import heapq
+import itertools
+import logging
+import multiprocessing
+import multiprocessing.connection
+import threading
+import time
+import traceback
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+logger = logging.getLogger(__name__)
+
+# maximal number of blocks that are read from the dependency graph but did
+# not finish yet, to keep the memory footprint bounded for very large volumes
+max_pending_blocks = 100000
+
+def run_local(
+        levels,
+        process_function,
+        pre_check,
+        post_check,
+        num_workers=None,
+        processes=True,
+        callback=None,
+        blocks_per_task=1,
+        init_function=None,
+        teardown_function=None,
+        report=None,
+        pool=None,
+        read_ahead=0,
+        memory_budget=None,
+        memory_estimator=None,
+        reduction=None,
+        async_concurrency=None,
+        progress=None,
+        priority=None,
+        speculation_factor=None,
+        speculation_fraction=0.9,
+        block_timeout=None,
+        timeout_retries=0,
+        cost_model=None):
+    '''Run the blocks of a dependency graph on a pool of local worker
+    processes or threads.
+
+    Blocks are read incrementally from ``levels`` (see
+    :func:`daisy.blocks.iterate_dependency_levels`). A block is released to
+    the next idle worker as soon as all of its upstream blocks finished.
+
+    Args:
+
+        levels (generator):
+
+            Generator over ``(level, blocks)``, as returned by
+            :func:`daisy.blocks.iterate_dependency_levels`.
+
+        process_function (function):
+        pre_check (function):
+        post_check (function):
+
+            See :func:`daisy.tasks.check_and_run`.
+
+        num_workers (int, optional):
+        processes (bool, optional):
+
+            See `class:LocalPool`. Ignored if ``pool`` is given.
+
+        callback (function, optional):
+
+            If given, will be called with ``(block_id, status)`` for every
+            finished block.
+
+        blocks_per_task (int, optional):
+
+            The maximal number of ready blocks to hand to a worker at once.
+            The worker processes them one after the other and reports the
+            status of each block as soon as it finished.
+
+        init_function (function, optional):
+
+            If given, will be called once by each worker before it processes
+            its first block. The return value will be passed as second
+            argument to every call of ``process_function`` on this worker.
+
+        teardown_function (function, optional):
+
+            If given, will be called with the return value of
+            ``init_function`` when a worker shuts down.
+
+        report (`class:daisy.RunReport`, optional):
+
+            If given, record the timing of each block in this report.
+
+        pool (`class:LocalPool`, optional):
+
+            The pool of workers to run the blocks on. If not given, a pool
+            with ``num_workers`` workers will be started for this run, and
+            stopped afterwards.
+
+        read_ahead (int, optional):
+
+            The number of blocks to read from ``levels`` whenever a block
+            finished, in addition to the blocks needed to keep the workers
+            busy (up to ``max_pending_blocks``). Reading ahead makes blocks
+            known to the scheduler early, which is needed if blocks become
+            ready long before they are read otherwise (e.g., for
+            :class:`daisy.Pipeline`).
+
+        memory_budget (int, optional):
+
+            If given, the maximal estimated memory in bytes of all blocks
+            running at the same time. Ready blocks are only handed to idle
+            workers while their estimated memory fits into the budget, in the
+            order they became ready.
+
+        memory_estimator (function, optional):
+
+            A function that will be called with a block and returns its
+            estimated memory in bytes. Defaults to
+            `class:daisy.MemoryEstimator`.
+
+        reduction (`class:daisy.Reduction`, optional):
+
+            If given, the return values of ``process_function`` of successful
+            blocks are sent back with their status and added to this
+            reduction.
+
+        async_concurrency (int, optional):
+
+            If given, ``process_function`` and the check functions may be
+            ``async def`` functions, and each worker runs up to
+            ``async_concurrency`` blocks concurrently on its event loop. Ready
+            blocks are handed to a worker as long as it runs fewer blocks
+            (``blocks_per_task`` is ignored).
+
+        progress (`class:daisy.Progress`, optional):
+
+            If given, report the progress of the run to it. If the progress
+            is cancelled, no further blocks are handed to workers.
+
+        priority (function, optional):
+
+            If given, a function that will be called with a block and returns
+            its priority (see `class:daisy.Priority`). Ready blocks with a
+            higher priority are handed to workers first. To order as many
+            blocks as possible, the graph is read ahead up to
+            ``max_pending_blocks``.
+
+        speculation_factor (float, optional):
+        speculation_fraction (float, optional):
+
+            If ``speculation_factor`` is given, start a copy of a running
+            block on an idle worker if at least ``speculation_fraction`` of
+            the blocks of its level finished, and it runs for longer than
+            ``speculation_factor`` times the median duration of the finished
+            blocks of its level (see `class:daisy.speculation.Speculation`).
+            The first copy that succeeds wins, the other copy is cancelled:
+            its worker is stopped and replaced, and other blocks handed to it
+            are run again. Blocks fail only if all of their copies failed.
+            Needs worker processes, since worker threads can not be stopped.
+
+        block_timeout (float, optional):
+
+            If given, the maximal time in seconds a block is allowed to run.
+            The worker of a block that runs longer is stopped and replaced,
+            and other blocks handed to it are run again. Needs worker
+            processes, since worker threads can not be stopped.
+
+        timeout_retries (int, optional):
+
+            How many times to run a block again after it timed out, before it
+            is marked as errored (status -2).
+
+        cost_model (`class:daisy.CostModel`, optional):
+
+            If given, record the durations of all blocks in this cost model.
+
+    Returns:
+
+        A dictionary with the number of blocks per status code in
+        ``counts``, and a list of the IDs of failed blocks in ``failed``.
+    '''
+
+    if block_timeout is not None and not processes_of(pool, processes):
+        raise RuntimeError(
+            "Block timeouts need worker processes, since worker threads of "
+            "blocks that timed out can not be stopped")
+
+    if speculation_factor is not None and not processes_of(pool, processes):
+        raise RuntimeError(
+            "Speculation needs worker processes, since worker threads of "
+            "cancelled copies can not be stopped")
+
+    own_pool = pool is None
+    if own_pool:
+        pool = LocalPool(num_workers, processes)
+
+    pool.start_run((
+        process_function,
+        pre_check,
+        post_check,
+        init_function,
+        teardown_function,
+        reduction is not None,
+        async_concurrency))
+
+    workers = pool.workers
+    if progress is not None:
+        progress.set_num_workers(len(workers))
+
+    if speculation_factor is not None:
+        speculation = Speculation(speculation_factor, speculation_fraction)
+    else:
+        speculation = None
+
+    scheduler = DependencyScheduler(
+        levels,
+        callback,
+        report,
+        progress,
+        priority,
+        speculation,
+        cost_model)
+
+    if priority is not None:
+        read_ahead = max_pending_blocks
+
+    if memory_budget is not None:
+        budget = MemoryBudget(memory_budget, memory_estimator)
+    else:
+        budget = None
+
+    def finish(block_id, status, timing=None):
+        if budget is not None:
+            budget.release(block_id)
+        scheduler.finish(block_id, status, timing)
+
+    # the IDs of the workers running a copy of a block, for blocks that were
+    # started speculatively on more than one worker
+    copies = {}
+
+    def finish_copy(worker_id, block_id, status, timing=None, result=None):
+
+        others = set(
+            i
+            for i in copies.pop(block_id, [])
+            if i != worker_id and block_id in workers[i].blocks)
+
+        if others and status < 0:
+            # another copy might still succeed
+            if budget is not None:
+                budget.release_copy(block_id)
+            copies[block_id] = others
+            return
+
+        for i in others:
+            logger.info(
+                "Cancelling copy of block %d on worker %d",
+                block_id, i)
+            cancel_copy(i, block_id)
+
+        if reduction is not None and status == 1:
+            reduction.add([(block_id, result)])
+        finish(block_id, status, timing)
+
+    def cancel_copy(worker_id, block_id):
+
+        # stop the worker, such that the cancelled copy does not keep
+        # writing after downstream blocks started
+        workers[worker_id].cancel(block_id)
+        restart_worker(worker_id)
+
+    def restart_worker(worker_id):
+
+        # blocks handed to the old worker have to run again
+        for block_id, block in workers[worker_id].blocks.items():
+            if budget is not None:
+                budget.release_copy(block_id)
+            if block_id in copies:
+                copies[block_id].discard(worker_id)
+                if copies[block_id]:
+                    continue
+                del copies[block_id]
+            scheduler.requeue(block)
+
+        pool.restart_worker(worker_id)
+
+    # the number of times each block timed out, by block ID
+    num_timeouts = {}
+
+    def check_timeouts():
+
+        now = time.time()
+
+        for i, worker in enumerate(workers):
+
+            timed_out = [
+                block_id
+                for block_id, started in worker.running()
+                if now - started > block_timeout
+            ]
+            if not timed_out:
+                continue
+
+            for block_id in timed_out:
+
+                block = worker.blocks[block_id]
+                worker.cancel(block_id)
+                num_timeouts[block_id] = num_timeouts.get(block_id, 0) + 1
+
+                if (
+                        block_id not in copies and
+                        num_timeouts[block_id] <= timeout_retries):
+                    logger.warning(
+                        "Block %d timed out after %.2fs on worker %d, "
+                        "retrying",
+                        block_id, block_timeout, i)
+                    if budget is not None:
+                        budget.release(block_id)
+                    scheduler.requeue(block)
+                else:
+                    logger.error(
+                        "Block %d timed out after %.2fs on worker %d",
+                        block_id, block_timeout, i)
+                    finish_copy(i, block_id, -2)
+
+            logger.info("Restarting worker %d", i)
+            restart_worker(i)
+
+    def speculate():
+
+        idle_workers = [ i for i, w in enumerate(workers) if not w.blocks ]
+        if not idle_workers or scheduler.num_ready() > 0:
+            return
+
+        # the longest running blocks first
+        now = time.time()
+        running = sorted(
+            (
+                (now - started, block_id, i)
+                for i, worker in enumerate(workers)
+                for block_id, started in worker.running()
+                if block_id not in copies
+            ),
+            reverse=True)
+
+        for running_time, block_id, i in running:
+
+            if not idle_workers:
+                break
+            if not speculation.is_slow(block_id, running_time):
+                continue
+
+            block = workers[i].blocks[block_id]
+            if budget is not None:
+                if not budget.fits(block):
+                    break
+                budget.admit(block)
+
+            j = idle_workers.pop(0)
+            logger.info(
+                "Block %d is running for %.2fs on worker %d, starting a "
+                "speculative copy on worker %d",
+                block_id, running_time, i, j)
+
+            workers[j].run([block], async_concurrency is not None)
+            copies[block_id] = set([i, j])
+
+    def check_dead_workers():
+
+        for i, worker in enumerate(workers):
+            if not worker.is_alive():
+                for block in list(worker.blocks.values()):
+                    logger.error(
+                        "Worker %d died while processing block %s",
+                        i, block)
+                    worker.finish(block.block_id)
+                    finish_copy(i, block.block_id, -2)
+                pool.restart_worker(i)
+
+    # the number of blocks a worker can be handed at once
+    if async_concurrency is not None:
+        capacity = async_concurrency
+    else:
+        capacity = blocks_per_task
+
+    try:
+
+        while True:
+
+            scheduler.read_graph(2*len(workers)*capacity, read_ahead)
+
+            if async_concurrency is not None:
+                idle_workers = [
+                    w for w in workers if len(w.blocks) < capacity ]
+            else:
+                idle_workers = [ w for w in workers if not w.blocks ]
+
+            if progress is not None and progress.cancelled:
+                idle_workers = []
+
+            for i, worker in enumerate(idle_workers):
+
+                # share the ready blocks evenly between idle workers
+                num_blocks = max(1, min(
+                    capacity - len(worker.blocks),
+                    scheduler.num_ready()//(len(idle_workers) - i)))
+
+                blocks = []
+                while len(blocks) < num_blocks:
+                    block = scheduler.peek_ready()
+                    if block is None:
+                        break
+                    if budget is not None:
+                        if not budget.fits(block):
+                            break
+                        budget.admit(block)
+                    blocks.append(scheduler.next_ready())
+
+                if not blocks:
+                    break
+                worker.run(blocks, async_concurrency is not None)
+
+                if progress is not None:
+                    for block in blocks:
+                        progress.submit_block(block.block_id)
+
+            cancelled = progress is not None and progress.cancelled
+
+            if speculation is not None and not cancelled:
+                speculate()
+
+            if block_timeout is not None:
+                check_timeouts()
+
+            # restart workers that died without reporting back, even if other
+            # workers keep reporting results
+            check_dead_workers()
+
+            if all(not w.blocks for w in workers):
+                if scheduler.done():
+                    break
+                if progress is not None and progress.cancelled:
+                    break
+                continue
+
+            try:
+                (
+                    run_id,
+                    worker_id,
+                    generation,
+                    block_id,
+                    status,
+                    timing,
+                    result
+                ) = pool.get_result(timeout=1)
+            except queue.Empty:
+                continue
+
+            if run_id != pool.run_id:
+                # late result of a previous run on the same pool
+                continue
+
+            if generation != workers[worker_id].generation:
+                # late result of a worker that was replaced
+                continue
+
+            if not workers[worker_id].finish(block_id):
+                # block was already marked as failed, or cancelled
+                continue
+
+            finish_copy(worker_id, block_id, status, timing, result)
+
+    finally:
+
+        if own_pool:
+            pool.stop()
+        else:
+            pool.end_run()
+
+    return scheduler.results
+
+def processes_of(pool, processes):
+    '''Test if the workers of ``pool`` (or of a new pool, if ``None``) are
+    processes.'''
+
+    if pool is not None:
+        return pool.processes
+
+    return processes
+
+class DependencyScheduler(object):
+    '''Keeps track of the blocks of a dependency graph that are waiting for
+    upstream blocks, ready to run, or running.
+
+    Blocks are read incrementally from ``levels``. Only blocks that did not
+    finish yet are remembered, such that the memory footprint is bounded by
+    the number of pending blocks.
+
+    If given, ``callback`` will be called with ``(block_id, status)`` for
+    every finished block, and all blocks will be recorded in the
+    `class:daisy.RunReport` ``report``, the `class:daisy.Progress`
+    ``progress``, the `class:daisy.speculation.Speculation`
+    ``speculation``, and the `class:daisy.CostModel` ``cost_model``.
+
+    Ready blocks are returned in the order they became ready, unless a
+    ``priority`` function is given, in which case ready blocks with the
+    highest priority are returned first.
+    '''
+
+    def __init__(
+            self,
+            levels,
+            callback=None,
+            report=None,
+            progress=None,
+            priority=None,
+            speculation=None,
+            cost_model=None):
+
+        self.graph = (
+            (level, block)
+            for level, level_blocks in levels
+            for block in level_blocks
+        )
+        self.exhausted = False
+        self.callback = callback
+        self.report = report
+        self.progress = progress
+        self.speculation = speculation
+        self.cost_model = cost_model
+
+        # for each waiting block, the number of unfinished upstream blocks
+        self.num_waiting_for = {}
+        self.waiting_blocks = {}
+
+        # for each unfinished block, the IDs of blocks waiting for it
+        self.downstream = {}
+
+        # ready blocks, either in a FIFO queue or in a heap of ``(-priority,
+        # counter, block)``, where the counter keeps the order of blocks with
+        # equal priority
+        self.priority = priority
+        if priority is None:
+            self.ready = deque()
+        else:
+            self.ready = []
+            self.counter = itertools.count()
+        self.num_running = 0
+
+        self.results = {
+            'counts': { 1: 0, 0: 0, -1: 0, -2: 0 },
+            'failed': []
+        }
+
+    def read_graph(self, num_ready, read_ahead=0):
+        '''Read blocks from the graph until at least ``num_ready`` blocks are
+        ready (plus ``read_ahead`` more blocks), the graph is exhausted, or
+        ``max_pending_blocks`` are pending.
+        '''
+
+        num_read = 0
+
+        while (
+                not self.exhausted and
+                (len(self.ready) < num_ready or num_read < read_ahead) and
+                self.num_pending() < max_pending_blocks):
+
+            if len(self.ready) >= num_ready:
+                num_read += 1
+
+            try:
+                level, (block, upstream_blocks) = next(self.graph)
+            except StopIteration:
+                self.exhausted = True
+                if self.progress is not None:
+                    self.progress.finish_reading()
+                if self.speculation is not None:
+                    self.speculation.finish_reading()
+                break
+
+            self.add_block(block, upstream_blocks, level)
+
+    def add_block(self, block, upstream_blocks, level=0):
+
+        block_id = block.block_id
+        self.downstream[block_id] = []
+
+        if self.report is not None:
+            self.report.add_block(block, upstream_blocks)
+        if self.progress is not None:
+            self.progress.add_block(block, level)
+        if self.speculation is not None:
+            self.speculation.add_block(block, level)
+        if self.cost_model is not None:
+            self.cost_model.add_block(block)
+
+        num_unfinished = 0
+        for upstream_block in upstream_blocks:
+
+            # upstream blocks are read before their downstream blocks, so
+            # they finished already if they are not known anymore
+            upstream_id = upstream_block.block_id
+            if upstream_id not in self.downstream:
+                continue
+
+            self.downstream[upstream_id].append(block_id)
+            num_unfinished += 1
+
+        if num_unfinished == 0:
+            self.add_ready(block)
+        else:
+            self.num_waiting_for[block_id] = num_unfinished
+            self.waiting_blocks[block_id] = block
+
+    def peek_ready(self):
+        '''Get the next block that is ready to run without removing it, or
+        ``None``.'''
+
+        if not self.ready:
+            return None
+
+        if self.priority is not None:
+            return self.ready[0][2]
+
+        return self.ready[0]
+
+    def next_ready(self):
+        '''Get the next block that is ready to run, or ``None``.'''
+
+        if not self.ready:
+            return None
+
+        self.num_running += 1
+
+        if self.priority is not None:
+            return heapq.heappop(self.ready)[2]
+
+        return self.ready.popleft()
+
+    def add_ready(self, block):
+
+        if self.priority is not None:
+            heapq.heappush(
+                self.ready,
+                (-self.priority(block), next(self.counter), block))
+        else:
+            self.ready.append(block)
+
+    def num_ready(self):
+        '''The number of blocks that are ready to run.'''
+
+        return len(self.ready)
+
+    def finish(self, block_id, status, timing=None):
+        '''Mark a running block as finished with the given status and
+        timing (see :func:`daisy.tasks.check_and_run_timed`).'''
+
+        self.num_running -= 1
+
+        if self.report is not None:
+            self.report.finish_block(block_id, status, timing)
+        if self.progress is not None:
+            self.progress.finish_block(block_id, status, timing)
+        if self.speculation is not None:
+            # only durations of processed blocks are representative
+            self.speculation.finish_block(
+                block_id,
+                timing['end'] - timing['start']
+                if timing and status == 1 else None)
+        if self.cost_model is not None:
+            self.cost_model.finish_block(block_id, status, timing)
+
+        self.results['counts'][status] += 1
+        if status < 0:
+            self.results['failed'].append(block_id)
+        if self.callback is not None:
+            self.callback(block_id, status)
+
+        for downstream_id in self.downstream.pop(block_id):
+            self.num_waiting_for[downstream_id] -= 1
+            if self.num_waiting_for[downstream_id] == 0:
+                del self.num_waiting_for[downstream_id]
+                self.add_ready(self.waiting_blocks.pop(downstream_id))
+
+    def requeue(self, block):
+        '''Make a running block ready again, e.g., because its worker was
+        stopped before it finished.'''
+
+        self.num_running -= 1
+        self.add_ready(block)
+
+    def num_pending(self):
+        '''The number of blocks read from the graph that did not finish
+        yet.'''
+
+        return len(self.ready) + len(self.waiting_blocks) + self.num_running
+
+    def done(self):
+        '''Test if all blocks of the graph finished.'''
+
+        return self.exhausted and self.num_pending() == 0
+
+class LocalPool(object):
+    '''A pool of local worker processes or threads, that can run the blocks
+    of several successive dependency graphs (see :func:`run_local`). Workers
+    stay alive between runs, such that their startup cost is only paid once.
+
+    Args:
+
+        num_workers (int, optional):
+
+            The number of workers to use. Defaults to the number of CPUs.
+
+        processes (bool, optional):
+
+            If ``True`` (default), spawns a process per worker, otherwise a
+            thread.
+    '''
+
+    def __init__(self, num_workers=None, processes=True):
+
+        if num_workers is None:
+            num_workers = multiprocessing.cpu_count()
+
+        self.num_workers = num_workers
+        self.processes = processes
+
+        # worker processes send their results through a pipe each, such that
+        # stopping one of them can not corrupt the results of others
+        if processes:
+            self.result_queue = None
+        else:
+            self.result_queue = queue.Queue()
+
+        # the number of workers started so far, to tell the results of a
+        # worker apart from the ones of the worker it replaced
+        self.num_started = 0
+
+        # the ID and the functions of the current run, serialized for worker
+        # processes
+        self.run_id = 0
+        self.functions = None
+
+        self.workers = [ self.start_worker(i) for i in range(num_workers) ]
+
+    def start_worker(self, worker_id):
+
+        self.num_started += 1
+        return LocalWorker(
+            worker_id,
+            self.num_started,
+            self.result_queue,
+            self.processes)
+
+    def start_run(self, functions):
+        '''Send the functions ``(process_function, pre_check, post_check,
+        init_function, teardown_function)`` of a new run to all workers,
+        followed by a flag whether to return the results of
+        ``process_function`` and the ``async_concurrency`` (see
+        :func:`run_local`).
+
+        Results of the workers are tagged with the ID of the run (see
+        ``run_id``), such that late results of a previous run can be told
+        apart.'''
+
+        if self.processes:
+            # allow lambdas and closures, which can't be pickled otherwise
+            functions = cloudpickle.dumps(functions)
+
+        self.run_id += 1
+        self.functions = functions
+        for worker in self.workers:
+            worker.start_run(self.run_id, functions)
+
+    def end_run(self):
+        '''Tell all workers that the current run ended.'''
+
+        for worker in self.workers:
+            worker.end_run()
+        self.functions = None
+
+    def restart_worker(self, worker_id):
+        '''Replace a worker that died (or stop a worker process) with a new
+        one. Blocks that were not started by the old worker yet are
+        discarded.'''
+
+        self.workers[worker_id].discard()
+
+        worker = self.start_worker(worker_id)
+        if self.functions is not None:
+            worker.start_run(self.run_id, self.functions)
+        self.workers[worker_id] = worker
+
+    def get_result(self, timeout):
+        '''Get the next result ``(run_id, worker_id, generation, block_id,
+        status, timing, result)`` of any worker. Raises ``queue.Empty`` if
+        no result arrived within ``timeout`` seconds.'''
+
+        if not self.processes:
+            return self.result_queue.get(timeout=timeout)
+
+        readers = [ w.result_reader for w in self.workers ]
+        for reader in multiprocessing.connection.wait(readers, timeout):
+            try:
+                return reader.recv()
+            except (EOFError, OSError):
+                # the worker died, see LocalWorker.is_alive
+                continue
+
+        raise queue.Empty()
+
+    def stop(self):
+        '''Stop all workers.'''
+
+        for worker in self.workers:
+            worker.stop()
+
+class LocalWorker(object):
+    '''A worker process or thread that runs blocks handed to it by
+    :func:`run_local`. Worker threads report the results to
+    ``result_queue``, worker processes to their own pipe
+    (``result_reader``). Results are tagged with ``generation``, which is
+    unique for each worker started by a pool.'''
+
+    def __init__(self, worker_id, generation, result_queue, processes):
+
+        self.worker_id = worker_id
+        self.generation = generation
+
+        # the blocks handed to this worker that did not finish yet, by ID
+        self.blocks = {}
+
+        # the time the blocks handed to this worker started running, by ID
+        self.started = {}
+        self.concurrent = False
+        self.processes = processes
+
+        if processes:
+            self.result_reader, result_writer = multiprocessing.Pipe(
+                duplex=False)
+            self.task_queue = multiprocessing.Queue()
+            self.worker = multiprocessing.Process(
+                target=worker_loop,
+                args=(
+                    worker_id,
+                    generation,
+                    self.task_queue,
+                    PipeWriter(result_writer)))
+        else:
+            self.result_reader = None
+            self.task_queue = queue.Queue()
+            self.worker = threading.Thread(
+                target=worker_loop,
+                args=(worker_id, generation, self.task_queue, result_queue))
+
+        self.worker.daemon = True
+        self.worker.start()
+
+        if processes:
+            # only the worker writes, such that the reader sees the end of
+            # the pipe once the worker died
+            result_writer.close()
+
+    def start_run(self, run_id, functions):
+
+        self.task_queue.put(('start', (run_id, functions)))
+
+    def end_run(self):
+
+        self.blocks = {}
+        self.started = {}
+        self.task_queue.put(('end', None))
+
+    def run(self, blocks, concurrent=False):
+        '''Hand ``blocks`` to this worker. Unless ``concurrent``, the worker
+        runs them one after the other.'''
+
+        self.concurrent = concurrent
+
+        now = time.time()
+        for block in blocks:
+            if concurrent or not self.blocks:
+                self.started[block.block_id] = now
+            self.blocks[block.block_id] = block
+        self.task_queue.put(('run', blocks))
+
+    def finish(self, block_id):
+        '''Remove a block this worker reported a result for. Returns ``False``
+        if the block was not handed to this worker or was cancelled.'''
+
+        self.started.pop(block_id, None)
+        known = self.blocks.pop(block_id, None) is not None
+
+        # the next block starts once the previous one finished
+        if not self.concurrent and self.blocks:
+            next_id = next(iter(self.blocks))
+            self.started.setdefault(next_id, time.time())
+
+        return known
+
+    def cancel(self, block_id):
+        '''Forget about a block handed to this worker. Its result will be
+        ignored.'''
+
+        self.blocks.pop(block_id, None)
+
+    def running(self):
+        '''Get the IDs of the blocks this worker is currently running, with
+        the time they started.'''
+
+        return [
+            (block_id, started)
+            for block_id, started in self.started.items()
+            if block_id in self.blocks
+        ]
+
+    def is_alive(self):
+
+        return self.worker.is_alive()
+
+    def discard(self):
+        '''Stop this worker without waiting for its blocks. Blocks that were
+        not started yet are removed from the task queue. Worker processes
+        are stopped immediately, worker threads can not be stopped and stop
+        after their current block.'''
+
+        try:
+            while True:
+                self.task_queue.get_nowait()
+        except queue.Empty:
+            pass
+        self.task_queue.put(None)
+
+        if self.processes:
+            if self.is_alive():
+                self.worker.terminate()
+                self.worker.join()
+            self.result_reader.close()
+
+    def stop(self):
+
+        if self.is_alive():
+            self.task_queue.put(None)
+            self.worker.join(timeout=10)
+
+        if self.processes:
+            self.result_reader.close()
+
+class PipeWriter(object):
+    '''Sends results of a worker process through a pipe ``connection``,
+    possibly from several threads.'''
+
+    def __init__(self, connection):
+
+        self.connection = connection
+        self.lock = threading.Lock()
+
+    def put(self, message):
+
+        with self.lock:
+            self.connection.send(message)
+
+    def __getstate__(self):
+
+        return self.connection
+
+    def __setstate__(self, connection):
+
+        self.connection = connection
+        self.lock = threading.Lock()
+
+class WorkerRun(object):
+    '''The functions and the state of the current run of a worker. Results
+    of blocks are sent to ``result_queue``, tagged with ``run_id`` and the
+    ``generation`` of the worker.
+
+    If the run has an ``async_concurrency``, blocks are run as tasks on an
+    event loop in a separate thread, such that the worker keeps receiving
+    blocks while others are running.'''
+
+    def __init__(
+            self,
+            worker_id,
+            generation,
+            run_id,
+            functions,
+            result_queue):
+
+        if isinstance(functions, bytes):
+            functions = cloudpickle.loads(functions)
+
+        (
+            self.process_function,
+            self.pre_check,
+            self.post_check,
+            self.init_function,
+            self.teardown_function,
+            self.return_results,
+            self.async_concurrency
+        ) = functions
+
+        self.worker_id = worker_id
+        self.generation = generation
+        self.run_id = run_id
+        self.result_queue = result_queue
+        self.initialized = True
+
+        if self.init_function is not None:
+
+            try:
+                self.state = self.init_function()
+            except:
+                # fail all blocks handed to this worker, instead of restarting
+                # it over and over
+                logger.error(
+                    "Initializing worker %d failed:\n%s",
+                    worker_id, traceback.format_exc())
+                self.initialized = False
+
+        if self.async_concurrency is not None:
+
+            self.loop = asyncio.new_event_loop()
+            self.loop_thread = threading.Thread(target=self.loop.run_forever)
+            self.loop_thread.daemon = True
+            self.loop_thread.start()
+
+            # futures of the blocks running on the event loop
+            self.futures = set()
+
+    def run(self, blocks):
+
+        if self.async_concurrency is None:
+
+            for block in blocks:
+                self.send_result(block, *self.run_block(block))
+
+        else:
+
+            self.futures = set(f for f in self.futures if not f.done())
+            for block in blocks:
+                self.futures.add(asyncio.run_coroutine_threadsafe(
+                    self.run_block_async(block),
+                    self.loop))
+
+    def run_block(self, block):
+
+        if not self.initialized:
+            return -2, None, None
+
+        return check_and_run_result(
+            block,
+            self.get_process_function(),
+            self.pre_check,
+            self.post_check)
+
+    async def run_block_async(self, block):
+
+        if not self.initialized:
+            self.send_result(block, -2, None, None)
+            return
+
+        self.send_result(block, *await check_and_run_result_async(
+            block,
+            self.get_process_function(),
+            self.pre_check,
+            self.post_check))
+
+    def get_process_function(self):
+
+        if self.init_function is not None:
+            return lambda b: self.process_function(b, self.state)
+
+        return self.process_function
+
+    def send_result(self, block, status, timing, result):
+
+        if not self.return_results:
+            result = None
+
+        self.result_queue.put((
+            self.run_id,
+            self.worker_id,
+            self.generation,
+            block.block_id,
+            status,
+            timing,
+            result))
+
+    def end(self):
+
+        if self.async_concurrency is not None:
+
+            concurrent.futures.wait(self.futures)
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.loop_thread.join()
+            self.loop.close()
+
+        if (
+                self.init_function is None or
+                self.teardown_function is None or
+                not self.initialized):
+            return
+
+        try:
+            self.teardown_function(self.state)
+        except:
+            logger.error(
+                "Tearing down worker %d failed:\n%s",
+                self.worker_id, traceback.format_exc())
+
+def worker_loop(worker_id, generation, task_queue, result_queue):
+
+    current_run = None
+
+    while True:
+
+        message = task_queue.get()
+        if message is None:
+            break
+
+        command, payload = message
+
+        if command == 'start':
+
+            run_id, functions = payload
+            current_run = WorkerRun(
+                worker_id,
+                generation,
+                run_id,
+                functions,
+                result_queue)
+
+        elif command == 'end':
+
+            current_run.end()
+            current_run = None
+
+        elif command == 'run':
+
+            current_run.run(payload)
+
+    if current_run is not None:
+        current_run.end()
@@ -0,0 +1,124 @@
+from __future__ import absolute_import
+from .coordinate import Coordinate
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class MemoryEstimator(object):
+    '''Estimates the memory a block needs as the number of voxels in its read
+    ROI, times the size of the data type, times the number of channels::
+
+        estimator = daisy.MemoryEstimator(
+            dtype=np.float32,
+            num_channels=3,
+            voxel_size=(40, 4, 4))
+
+        daisy.run_blockwise(
+            ...,
+            memory_budget=8*1024**3,
+            memory_estimator=estimator)
+
+    Args:
+
+        dtype (``numpy.dtype``, optional):
+
+            The data type of the data read by each block. Defaults to
+            ``uint8``.
+
+        num_channels (``int``, optional):
+
+            The number of channels of the data read by each block.
+
+        voxel_size (`class:daisy.Coordinate`, optional):
+
+            The voxel size of the data read by each block, to convert the
+            size of the read ROI into voxels. Defaults to 1 in each
+            dimension.
+    '''
+
+    def __init__(self, dtype=np.uint8, num_channels=1, voxel_size=None):
+
+        self.bytes_per_voxel = np.dtype(dtype).itemsize*num_channels
+        self.voxel_size = (
+            Coordinate(voxel_size) if voxel_size is not None else None)
+
+    def __call__(self, block):
+
+        num_voxels = block.read_roi.size()
+        if self.voxel_size is not None:
+            num_voxels //= int(np.prod(self.voxel_size))
+
+        return int(num_voxels*self.bytes_per_voxel)
+
+class MemoryBudget(object):
+    '''Keeps track of the estimated memory of all running blocks, to admit
+    new blocks only while they fit into ``budget`` bytes.
+
+    Args:
+
+        budget (``int``):
+
+            The maximal estimated memory in bytes of all blocks running at the
+            same time.
+
+        estimator (function, optional):
+
+            A function that will be called with a `class:daisy.Block` and
+            returns its estimated memory in bytes. Defaults to
+            `class:MemoryEstimator`.
+    '''
+
+    def __init__(self, budget, estimator=None):
+
+        if estimator is None:
+            estimator = MemoryEstimator()
+
+        self.budget = budget
+        self.estimator = estimator
+
+        # estimated memory of each admitted copy of a block, by block ID
+        self.admitted = {}
+        self.used = 0
+
+    def fits(self, block):
+        '''Test if ``block`` can be admitted. A block that is larger than the
+        budget fits only if no other block is admitted, such that it will
+        eventually run.'''
+
+        if not self.admitted:
+            return True
+
+        return self.used + self.estimator(block) <= self.budget
+
+    def admit(self, block):
+        '''Add the estimated memory of ``block`` to the used memory. A block
+        can be admitted more than once, e.g., to run several copies of it.'''
+
+        memory = self.estimator(block)
+        if memory > self.budget:
+            logger.warning(
+                "Block %d needs an estimated %d bytes, which exceeds the "
+                "memory budget of %d bytes",
+                block.block_id, memory, self.budget)
+
+        self.admitted.setdefault(block.block_id, []).append(memory)
+        self.used += memory
+
+    def release(self, block_id):
+        '''Remove the estimated memory of a finished block (and all of its
+        copies) from the used memory.'''
+
+        self.used -= sum(self.admitted.pop(block_id, []))
+
+    def release_copy(self, block_id):
+        '''Remove the estimated memory of one copy of a block from the used
+        memory, e.g., of a copy that failed while other copies still run.'''
+
+        memories = self.admitted.get(block_id)
+        if not memories:
+            return
+
+        self.used -= memories.pop()
+        if not memories:
+            del self.admitted[block_id]
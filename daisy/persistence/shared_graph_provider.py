@@ -5,6 +5,7 @@ from ..roi import Roi
 from queue import Empty
 import multiprocessing
 import numpy as np
+import threading
 
 class SharedGraphProvider(object):
     '''Interface for shared graph providers that supports slicing to retrieve
@@ -26,7 +27,7 @@ class SharedGraphProvider(object):
         sub_graph.write_edges()
     '''
 
-    def read_blockwise(self, roi, block_size, num_workers):
+    def read_blockwise(self, roi, block_size, num_workers, executor=None):
         '''Read a list of nodes and edges blockwise. This is useful to get a
         representation of very large graphs, where parallel reading of smaller
         blocks might be faster.
@@ -45,6 +46,12 @@ class SharedGraphProvider(object):
 
                 The number of processes to use.
 
+            executor (``daisy.Executor``, optional):
+
+                If given, read the blocks on the workers of this executor
+                instead of starting new ones. ``num_workers`` is ignored in
+                this case.
+
         Returns:
 
             A tuple ``(nodes, edges)`` of dictionaries, each mapping each
@@ -55,9 +62,24 @@ class SharedGraphProvider(object):
         block_queue = manager.Queue()
         blocks_done = manager.Event()
 
-        master = multiprocessing.Process(
-            target=read_blockwise_master,
-            args=(self, roi, block_size, num_workers, block_queue, blocks_done))
+        args = (
+            self,
+            roi,
+            block_size,
+            num_workers,
+            block_queue,
+            blocks_done,
+            executor)
+
+        if executor is None:
+            master = multiprocessing.Process(
+                target=read_blockwise_master,
+                args=args)
+        else:
+            # the executor's workers are owned by this process
+            master = threading.Thread(
+                target=read_blockwise_master,
+                args=args)
         master.start()
 
         nodes = {}
@@ -119,7 +141,14 @@ class SharedSubGraph(Graph):
     def name(self):
         return type(self).__name__
 
-def read_blockwise_master(graph_provider, roi, block_size, num_workers, block_queue, blocks_done):
+def read_blockwise_master(
+        graph_provider,
+        roi,
+        block_size,
+        num_workers,
+        block_queue,
+        blocks_done,
+        executor=None):
 
     run_blockwise(
         roi,
@@ -128,7 +157,8 @@ def read_blockwise_master(graph_provider, roi, block_size, num_workers, block_qu
         process_function=lambda b: read_blockwise_worker(graph_provider, b, block_queue),
         # process_function=lambda b: read_blockwise_worker(graph_provider, b, None),
         fit='shrink',
-        num_workers=num_workers)
+        num_workers=num_workers,
+        executor=executor)
 
     blocks_done.set()
 
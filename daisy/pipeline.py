@@ -0,0 +1,358 @@
+from __future__ import absolute_import
+from .block_grid import BlockGrid
+from .blocks import iterate_dependency_levels
+from .dask_scheduler import (
+    split_check_function,
+    get_async_concurrency,
+    run_levels,
+    log_results)
+from .planner import plan
+import bisect
+import copy
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Pipeline(object):
+    '''A sequence of blockwise stages that run as one combined dependency
+    graph::
+
+        pipeline = daisy.Pipeline()
+        pipeline.add_stage(
+            'predict',
+            total_roi, predict_read_roi, predict_write_roi,
+            predict)
+        pipeline.add_stage(
+            'watershed',
+            total_roi, watershed_read_roi, watershed_write_roi,
+            watershed)
+
+        pipeline.run(num_workers=8)
+
+    A block of a stage depends on its upstream blocks in the same stage (as
+    in :func:`daisy.run_blockwise`), and on all blocks of its upstream stages
+    whose write ROIs intersect its read ROI. Blocks of a stage can therefore
+    start as soon as the data they read was written, without waiting for all
+    blocks of the previous stages to finish.
+
+    The functions of a stage see blocks with the same IDs they would get from
+    :func:`daisy.run_blockwise` for this stage.
+    '''
+
+    def __init__(self):
+
+        self.stages = []
+
+    def add_stage(
+            self,
+            name,
+            total_roi,
+            read_roi,
+            write_roi,
+            process_function,
+            check_function=None,
+            read_write_conflict=True,
+            fit='valid',
+            upstream_stages=None):
+        '''Add a stage to the pipeline.
+
+        Args:
+
+            name (``string``):
+
+                A unique name for the stage.
+
+            total_roi (`class:daisy.Roi`):
+            read_roi (`class:daisy.Roi`):
+            write_roi (`class:daisy.Roi`):
+            process_function (function):
+            check_function (function, optional):
+            read_write_conflict (``bool``, optional):
+            fit (``string``, optional):
+
+                See :func:`daisy.run_blockwise`.
+
+            upstream_stages (list of ``string``, optional):
+
+                The names of the stages this stage reads the output of. Stages
+                have to be added after their upstream stages. Defaults to the
+                previously added stage.
+        '''
+
+        if name in [ s.name for s in self.stages ]:
+            raise RuntimeError("Pipeline already has a stage %s"%name)
+
+        if upstream_stages is None:
+            upstream_stages = [ self.stages[-1].name ] if self.stages else []
+
+        stages = { s.name: s for s in self.stages }
+        for upstream_stage in upstream_stages:
+            if upstream_stage not in stages:
+                raise RuntimeError(
+                    "Upstream stage %s of stage %s has to be added first"%(
+                        upstream_stage, name))
+
+        if self.stages:
+            id_offset = (
+                self.stages[-1].id_offset +
+                self.stages[-1].grid.num_block_ids())
+        else:
+            id_offset = 0
+
+        pre_check, post_check = split_check_function(check_function)
+
+        self.stages.append(Stage(
+            name,
+            total_roi,
+            read_roi,
+            write_roi,
+            process_function,
+            pre_check,
+            post_check,
+            read_write_conflict,
+            fit,
+            [ stages[s] for s in upstream_stages ],
+            id_offset))
+
+    def iterate_levels(self):
+        '''Iterate over the levels of the combined dependency graph of all
+        stages. See :func:`daisy.blocks.iterate_dependency_levels`.
+
+        Block IDs are made unique over all stages by adding an offset per
+        stage.'''
+
+        level = 0
+
+        for stage in self.stages:
+
+            for _, level_blocks in iterate_dependency_levels(
+                    stage.total_roi,
+                    stage.read_roi,
+                    stage.write_roi,
+                    stage.read_write_conflict,
+                    stage.fit):
+
+                yield level, (
+                    (
+                        stage.to_global(block),
+                        [ stage.to_global(b) for b in upstream_blocks ] +
+                        stage.get_upstream_stage_blocks(block)
+                    )
+                    for block, upstream_blocks in level_blocks
+                )
+                level += 1
+
+    def get_stage(self, block_id):
+        '''Get the stage and its local block ID for a block ID of the combined
+        dependency graph.'''
+
+        i = bisect.bisect_right(
+            [ s.id_offset for s in self.stages ],
+            block_id) - 1
+        stage = self.stages[i]
+
+        return stage, block_id - stage.id_offset
+
+    def run(
+            self,
+            num_workers=None,
+            processes=True,
+            client=None,
+            scheduler='dask',
+            executor=None,
+            blocks_per_task=1,
+            report=None,
+            memory_budget=None,
+            memory_estimator=None,
+            reduction=None,
+            async_concurrency=16,
+            progress=None,
+            priority_function=None,
+            speculation_factor=None,
+            speculation_fraction=0.9,
+            block_timeout=None,
+            timeout_retries=0,
+            cost_model=None):
+        '''Run all stages.
+
+        Args:
+
+            num_workers (int, optional):
+            processes (bool, optional):
+            client (optional):
+            scheduler (``string``, optional):
+            executor (`class:daisy.Executor`, optional):
+            blocks_per_task (``int``, optional):
+            report (`class:daisy.RunReport`, optional):
+            memory_budget (``int``, optional):
+            memory_estimator (function, optional):
+            reduction (`class:daisy.Reduction`, optional):
+            async_concurrency (``int``, optional):
+            progress (`class:daisy.Progress`, optional):
+            priority_function (function, optional):
+            speculation_factor (``float``, optional):
+            speculation_fraction (``float``, optional):
+            block_timeout (``float``, optional):
+            timeout_retries (``int``, optional):
+            cost_model (`class:daisy.CostModel`, optional):
+
+                See :func:`daisy.run_blockwise`. Block IDs passed to the
+                ``callback`` of ``reduction`` and to ``priority_function``
+                are the IDs in the combined dependency graph (see
+                :func:`get_stage`), and so are the IDs the durations in
+                ``cost_model`` are stored by.
+
+        Returns:
+
+            True, if all blocks of all stages succeeded.
+        '''
+
+        if report is not None:
+            report.start()
+
+        if progress is not None:
+            expected_blocks = sum(
+                plan(
+                    stage.total_roi,
+                    stage.read_roi,
+                    stage.write_roi,
+                    stage.fit,
+                    stage.read_write_conflict,
+                    suggest=False).num_blocks
+                for stage in self.stages)
+            progress.start(expected_blocks, num_workers)
+
+        results = run_levels(
+            self.iterate_levels(),
+            PipelineFunction(self, 'process_function'),
+            PipelineFunction(self, 'pre_check'),
+            PipelineFunction(self, 'post_check'),
+            scheduler,
+            num_workers,
+            processes,
+            client,
+            executor,
+            blocks_per_task=blocks_per_task,
+            report=report,
+            read_ahead=100,
+            memory_budget=memory_budget,
+            memory_estimator=memory_estimator,
+            reduction=reduction,
+            async_concurrency=get_async_concurrency(
+                [
+                    f
+                    for stage in self.stages
+                    for f in [
+                        stage.process_function,
+                        stage.pre_check,
+                        stage.post_check
+                    ]
+                ],
+                async_concurrency),
+            progress=progress,
+            priority=priority_function,
+            speculation_factor=speculation_factor,
+            speculation_fraction=speculation_fraction,
+            block_timeout=block_timeout,
+            timeout_retries=timeout_retries,
+            cost_model=cost_model)
+
+        if cost_model is not None:
+            cost_model.save()
+
+        for stage in self.stages:
+
+            failed = [
+                b - stage.id_offset
+                for b in results['failed']
+                if self.get_stage(b)[0] is stage
+            ]
+
+            if failed:
+                logger.info(
+                    "Failed blocks of stage %s: %s",
+                    stage.name, " ".join([str(b) for b in failed]))
+
+        return log_results(results, report, progress)
+
+class Stage(object):
+    '''A stage of a `class:Pipeline`.'''
+
+    def __init__(
+            self,
+            name,
+            total_roi,
+            read_roi,
+            write_roi,
+            process_function,
+            pre_check,
+            post_check,
+            read_write_conflict,
+            fit,
+            upstream_stages,
+            id_offset):
+
+        self.name = name
+        self.total_roi = total_roi
+        self.read_roi = read_roi
+        self.write_roi = write_roi
+        self.process_function = process_function
+        self.pre_check = pre_check
+        self.post_check = post_check
+        self.read_write_conflict = read_write_conflict
+        self.fit = fit
+        self.upstream_stages = upstream_stages
+        self.id_offset = id_offset
+
+        self.grid = BlockGrid(
+            total_roi,
+            read_roi,
+            write_roi,
+            read_write_conflict,
+            fit)
+
+    def to_global(self, block):
+        '''Get a copy of a block of this stage with its ID in the combined
+        dependency graph.'''
+
+        block = copy.copy(block)
+        block.block_id += self.id_offset
+        return block
+
+    def to_local(self, block):
+        '''Get a copy of a block of the combined dependency graph with its ID
+        in this stage.'''
+
+        block = copy.copy(block)
+        block.block_id -= self.id_offset
+        return block
+
+    def get_upstream_stage_blocks(self, block):
+        '''Get the blocks of all upstream stages that write to the read ROI of
+        the given block (with their IDs in the combined dependency graph).'''
+
+        upstream_blocks = []
+
+        for stage in self.upstream_stages:
+            block_ids = stage.grid.get_ids_writing_to(block.read_roi)
+            if len(block_ids) > 0:
+                upstream_blocks += [
+                    stage.to_global(b)
+                    for b in stage.grid.get_blocks(block_ids)
+                ]
+
+        return upstream_blocks
+
+class PipelineFunction(object):
+    '''Calls the ``process_function``, ``pre_check``, or ``post_check`` (given
+    by ``name``) of the stage a block belongs to.'''
+
+    def __init__(self, pipeline, name):
+
+        self.pipeline = pipeline
+        self.name = name
+
+    def __call__(self, block):
+
+        stage, _ = self.pipeline.get_stage(block.block_id)
+        return getattr(stage, self.name)(stage.to_local(block))
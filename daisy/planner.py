@@ -0,0 +1,362 @@
+from __future__ import absolute_import
+from .blocks import compute_levels, fit_block_rois
+from .coordinate import Coordinate
+from .roi import Roi
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class Plan(object):
+    '''Statistics of the blocks of a dependency graph, as computed by
+    :func:`plan`.
+
+    Attributes:
+
+        num_levels (``int``):
+
+            The number of levels, as produced by
+            :func:`daisy.blocks.compute_levels`.
+
+        blocks_per_level (list of ``int``):
+
+            The number of blocks in each level. Blocks of the same level are
+            independent, this is also the maximal parallelism per level.
+
+        num_blocks (``int``):
+
+            The total number of blocks.
+
+        max_parallelism (``int``):
+
+            The maximal number of blocks that can run in parallel.
+
+        critical_path_length (``int``):
+
+            The number of blocks in the longest chain of dependent blocks.
+            This is the number of non-empty levels, i.e., an upper bound that
+            is reached if the volume is large compared to the blocks.
+
+        voxels_read (``int``):
+        voxels_written (``int``):
+
+            The total number of voxels in the read and write ROIs of all
+            blocks.
+
+        bytes_read (``int``):
+
+            ``voxels_read`` times ``bytes_per_voxel``.
+
+        read_amplification (``float``):
+
+            The ratio of voxels read to voxels written. Values larger than 1
+            are caused by the context of the read ROI.
+
+        suggestions (list of ``dict``):
+
+            Alternative write (and read) ROIs with the same context that
+            reduce the number of levels or the read amplification, each with
+            their ``write_roi``, ``read_roi``, ``num_levels``,
+            ``read_amplification``, and ``max_parallelism``.
+    '''
+
+    def __init__(
+            self,
+            blocks_per_level,
+            voxels_read,
+            voxels_written,
+            bytes_per_voxel,
+            read_write_conflict):
+
+        self.num_levels = len(blocks_per_level)
+        self.blocks_per_level = blocks_per_level
+        self.num_blocks = sum(blocks_per_level)
+        self.max_parallelism = max(blocks_per_level + [0])
+        if read_write_conflict:
+            self.critical_path_length = len(
+                [n for n in blocks_per_level if n > 0])
+        else:
+            self.critical_path_length = 1 if self.num_blocks > 0 else 0
+        self.voxels_read = voxels_read
+        self.voxels_written = voxels_written
+        self.bytes_read = voxels_read*bytes_per_voxel
+        if voxels_written > 0:
+            self.read_amplification = float(voxels_read)/voxels_written
+        else:
+            self.read_amplification = 0.0
+        self.suggestions = []
+
+    def __repr__(self):
+
+        lines = [
+            "%d blocks in %d levels (%s blocks per level)"%(
+                self.num_blocks,
+                self.num_levels,
+                ", ".join(str(n) for n in self.blocks_per_level)),
+            "max parallelism: %d, critical path: %d blocks"%(
+                self.max_parallelism,
+                self.critical_path_length),
+            "read %d voxels (%d bytes) to write %d voxels, read "
+            "amplification %.2f"%(
+                self.voxels_read,
+                self.bytes_read,
+                self.voxels_written,
+                self.read_amplification)
+        ]
+
+        for s in self.suggestions:
+            lines.append(
+                "suggested write ROI %s (read ROI %s): %d levels, read "
+                "amplification %.2f, max parallelism %d"%(
+                    s['write_roi'], s['read_roi'], s['num_levels'],
+                    s['read_amplification'], s['max_parallelism']))
+
+        return "\n".join(lines)
+
+def plan(
+        total_roi,
+        read_roi,
+        write_roi,
+        fit='valid',
+        read_write_conflict=True,
+        voxel_size=None,
+        bytes_per_voxel=1,
+        suggest=True,
+        level_strategy='stride'):
+    '''Compute statistics of a blockwise job without creating any blocks.
+
+    Block inclusion and fitting are separable over dimensions, so all
+    statistics are computed from one-dimensional block grids, in time linear
+    in the number of blocks along each dimension.
+
+    Args:
+
+        total_roi (`class:daisy.Roi`):
+        read_roi (`class:daisy.Roi`):
+        write_roi (`class:daisy.Roi`):
+        fit (``string``, optional):
+        read_write_conflict (``bool``, optional):
+
+            See :func:`daisy.run_blockwise`.
+
+        voxel_size (`class:daisy.Coordinate`, optional):
+
+            The voxel size of the data to read, to convert ROI sizes into
+            voxels. Defaults to 1 in each dimension.
+
+        bytes_per_voxel (``int``, optional):
+
+            The number of bytes per voxel, to compute ``bytes_read``.
+
+        suggest (``bool``, optional):
+
+            Whether to compute suggestions for write ROIs that reduce the
+            number of levels or the read amplification.
+
+        level_strategy (``string``, optional):
+
+            How blocks are assigned to levels, see
+            :func:`daisy.run_blockwise`.
+
+    Returns:
+
+        A `class:Plan`.
+    '''
+
+    dims = total_roi.dims()
+    if voxel_size is None:
+        voxel_size = Coordinate((1,)*dims)
+    voxel_size = Coordinate(voxel_size)
+
+    result = compute_plan(
+        total_roi,
+        read_roi,
+        write_roi,
+        fit,
+        read_write_conflict,
+        voxel_size,
+        bytes_per_voxel,
+        level_strategy)
+
+    if suggest:
+        result.suggestions = suggest_write_rois(
+            total_roi,
+            read_roi,
+            write_roi,
+            fit,
+            read_write_conflict,
+            voxel_size,
+            result,
+            level_strategy)
+
+    return result
+
+def compute_plan(
+        total_roi,
+        read_roi,
+        write_roi,
+        fit,
+        read_write_conflict,
+        voxel_size,
+        bytes_per_voxel,
+        level_strategy='stride'):
+
+    dims = total_roi.dims()
+    write_shape = write_roi.get_shape()
+
+    level_stride, levels = compute_levels(
+        read_roi,
+        write_roi,
+        read_write_conflict,
+        level_strategy)
+    global_offset = total_roi.get_begin() - read_roi.get_begin()
+
+    # for each dimension and level offset in this dimension (in grid units),
+    # the number of included blocks and the sum of their read and write
+    # lengths in voxels
+    dim_stats = []
+
+    for d in range(dims):
+
+        grid_size = -(-total_roi.get_shape()[d]//write_shape[d])
+        level_grid_stride = level_stride[d]//write_shape[d]
+
+        blocks, included = fit_block_rois(
+            Roi((total_roi.get_begin()[d],), (total_roi.get_shape()[d],)),
+            Roi((read_roi.get_begin()[d],), (read_roi.get_shape()[d],)),
+            Roi((write_roi.get_begin()[d],), (write_roi.get_shape()[d],)),
+            (
+                global_offset[d] +
+                np.arange(grid_size, dtype=np.int64)*write_shape[d]
+            ).reshape((-1, 1)),
+            fit)
+
+        residues = np.arange(grid_size)%level_grid_stride
+        read_lengths = (blocks.read_end - blocks.read_begin)[:, 0]
+        write_lengths = (blocks.write_end - blocks.write_begin)[:, 0]
+
+        dim_stats.append([
+            (
+                int(np.sum(included[residues == r])),
+                int(np.sum(read_lengths[included & (residues == r)])),
+                int(np.sum(write_lengths[included & (residues == r)]))
+            )
+            for r in range(level_grid_stride)
+        ])
+
+    blocks_per_level = []
+    voxels_read = 0
+    voxels_written = 0
+
+    # a level contains the blocks of one or more offsets, each of which
+    # selects a level offset in each dimension
+    for level in levels:
+
+        num_level_blocks = 0
+
+        for level_offset, _ in level:
+
+            num_blocks = 1
+            read_length = 1
+            write_length = 1
+            for d in range(dims):
+                n, r, w = dim_stats[d][level_offset[d]//write_shape[d]]
+                num_blocks *= n
+                read_length *= r
+                write_length *= w
+
+            num_level_blocks += num_blocks
+            voxels_read += read_length
+            voxels_written += write_length
+
+        blocks_per_level.append(num_level_blocks)
+
+    voxel_volume = int(np.prod(voxel_size))
+
+    return Plan(
+        blocks_per_level,
+        voxels_read//voxel_volume,
+        voxels_written//voxel_volume,
+        bytes_per_voxel,
+        read_write_conflict)
+
+def suggest_write_rois(
+        total_roi,
+        read_roi,
+        write_roi,
+        fit,
+        read_write_conflict,
+        voxel_size,
+        current,
+        level_strategy='stride'):
+    '''Get write ROIs that keep the context of ``read_roi``, but need fewer
+    levels or read less data than the ``current`` plan.'''
+
+    context_begin = write_roi.get_begin() - read_roi.get_begin()
+    context_end = read_roi.get_end() - write_roi.get_end()
+    max_context = Coordinate(
+        max(b, e) for b, e in zip(context_begin, context_end))
+
+    write_shape = write_roi.get_shape()
+
+    # write shapes that are at least as large as the context need only two
+    # levels per dimension (or one, without context)
+    candidates = [
+        Coordinate(max(w, c) for w, c in zip(write_shape, max_context))
+    ]
+    for factor in [2, 4]:
+        candidates.append(write_shape*factor)
+        candidates.append(candidates[0]*factor)
+
+    suggestions = []
+    seen = set([write_shape])
+
+    for shape in candidates:
+
+        # round up to multiples of the voxel size
+        shape = Coordinate(
+            -(-s//v)*v
+            for s, v in zip(shape, voxel_size))
+
+        if shape in seen:
+            continue
+        seen.add(shape)
+
+        candidate_write_roi = Roi(write_roi.get_begin(), shape)
+        candidate_read_roi = Roi(
+            read_roi.get_begin(),
+            shape + context_begin + context_end)
+
+        if not total_roi.contains(
+                Roi(total_roi.get_begin(), candidate_read_roi.get_shape())):
+            continue
+
+        candidate = compute_plan(
+            total_roi,
+            candidate_read_roi,
+            candidate_write_roi,
+            fit,
+            read_write_conflict,
+            voxel_size,
+            1,
+            level_strategy)
+
+        if candidate.num_blocks == 0:
+            continue
+
+        if (
+                candidate.num_levels < current.num_levels or
+                candidate.read_amplification < current.read_amplification):
+
+            suggestions.append({
+                'write_roi': candidate_write_roi,
+                'read_roi': candidate_read_roi,
+                'num_levels': candidate.num_levels,
+                'read_amplification': candidate.read_amplification,
+                'max_parallelism': candidate.max_parallelism
+            })
+
+    suggestions.sort(
+        key=lambda s: (s['num_levels'], s['read_amplification']))
+
+    return suggestions
@@ -0,0 +1,65 @@
+from __future__ import absolute_import
+from .array import Array
+from .region import SummedVolumeTable
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class Priority(object):
+    '''The priority of blocks, used by the schedulers to decide which of the
+    ready blocks to run first. Blocks with a higher priority run first, blocks
+    of equal priority in the order they became ready. Priorities never
+    override dependencies: a block still only runs after all of its upstream
+    blocks finished.
+
+    Args:
+
+        priority (function, ``dict``, or `class:Array`):
+
+            Either a function that will be called with a `class:Block` and
+            returns its priority, a dictionary from block IDs to priorities
+            (blocks not in the dictionary have priority 0), or a (typically
+            low-resolution) cost map as an `class:Array`. For a cost map, the
+            priority of a block is the sum of the values of the map that
+            overlap with its write ROI, e.g., to start dense blocks early::
+
+                # a density map at a voxel size of (400, 400, 400)
+                density = daisy.open_ds('volume.zarr', 'density')
+
+                daisy.run_blockwise(..., priority_function=density)
+
+            or to process blocks close to a region of interest first::
+
+                daisy.run_blockwise(
+                    ...,
+                    priority_function=lambda b: -distance(b.write_roi, roi))
+    '''
+
+    def __init__(self, priority):
+
+        if isinstance(priority, Priority):
+            priority = priority.priority
+
+        self.priority = priority
+
+        if isinstance(priority, Array):
+
+            self.costs = SummedVolumeTable(priority)
+
+            logger.debug(
+                "cost map sums to %s",
+                self.costs.total)
+
+    def __call__(self, block):
+
+        if isinstance(self.priority, Array):
+
+            begin = np.array([block.write_roi.get_begin()], dtype=np.int64)
+            end = np.array([block.write_roi.get_end()], dtype=np.int64)
+            return self.costs.sum(begin, end)[0].item()
+
+        if isinstance(self.priority, dict):
+            return self.priority.get(block.block_id, 0)
+
+        return self.priority(block)
@@ -0,0 +1,318 @@
+from __future__ import absolute_import
+from collections import deque
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class Progress(object):
+    '''Live progress of a run of :func:`daisy.run_blockwise`::
+
+        def show(progress):
+            print(progress)
+            if progress.elapsed() > 600 and progress.throughput() < 1.0:
+                progress.cancel()
+
+        progress = daisy.Progress(show, interval=10)
+        daisy.run_blockwise(..., progress=progress)
+
+    All updates happen in the driver, with constant work per block. The
+    ``callback`` is called at most every ``interval`` seconds (and once at
+    the end of the run), such that it can be used to update dashboards or to
+    cancel runs that are too slow.
+
+    Args:
+
+        callback (function, optional):
+
+            A function that will be called with this `class:Progress` at
+            most every ``interval`` seconds while blocks finish, and once at
+            the end of the run.
+
+        interval (``float``, optional):
+
+            The minimal time in seconds between two calls of ``callback``.
+
+        block_callback (function, optional):
+
+            A function that will be called with an event dictionary for every
+            block. Events have a ``type`` and the ``block_id``:
+
+            "added": The block was read from the dependency graph. Also
+            contains the ``level`` of the block.
+
+            "submitted": The block was handed to a worker (with the "local"
+            scheduler) or submitted to the dask scheduler (where it might
+            still wait for its upstream blocks).
+
+            "finished": The block finished. Also contains the ``status`` and
+            the ``timing`` (see :func:`daisy.tasks.check_and_run_timed`),
+            which includes the actual start of the block.
+
+        window (``float``, optional):
+
+            The time in seconds over which the rolling throughput (and the
+            number of busy workers, see :func:`eta`) is measured.
+    '''
+
+    def __init__(
+            self,
+            callback=None,
+            interval=1.0,
+            block_callback=None,
+            window=60.0):
+
+        self.callback = callback
+        self.interval = interval
+        self.block_callback = block_callback
+        self.window = window
+
+        self.start_time = None
+        self.end_time = None
+        self.last_callback = None
+        self.cancelled = False
+
+        self.expected_blocks = None
+        self.num_workers = None
+        self.num_added = 0
+        self.exhausted = False
+        self.counts = { 1: 0, 0: 0, -1: 0, -2: 0 }
+        self.total_duration = 0.0
+        self.num_timed = 0
+
+        # the finish times and durations of blocks in the rolling window
+        self.finish_times = deque()
+
+        # levels of unfinished blocks by block ID, and the number of added
+        # and finished blocks per level
+        self.block_levels = {}
+        self.levels = []
+
+    def start(self, expected_blocks=None, num_workers=None):
+        '''Mark the start of the run. ``expected_blocks`` is an estimate of
+        the number of blocks, used for the ETA until all blocks were read
+        from the dependency graph. ``num_workers`` is the number of workers
+        that run blocks, if known.'''
+
+        self.start_time = time.time()
+        self.last_callback = self.start_time
+        self.expected_blocks = expected_blocks
+        self.num_workers = num_workers
+
+    def set_num_workers(self, num_workers):
+        '''Set the number of workers that run blocks, once it is known.'''
+
+        self.num_workers = num_workers
+
+    def stop(self):
+        '''Mark the end of the run, and call ``callback`` a last time.'''
+
+        self.end_time = time.time()
+        self.exhausted = True
+
+        if self.callback is not None:
+            self.callback(self)
+
+    def cancel(self):
+        '''Stop the run: no new blocks will be started, and the run returns
+        ``False`` once the running blocks finished (or, with the "dask"
+        scheduler, as soon as all waiting tasks were cancelled).'''
+
+        logger.info("Cancelling run")
+        self.cancelled = True
+
+    def add_block(self, block, level):
+        '''Add a block of the given level that was read from the dependency
+        graph.'''
+
+        while len(self.levels) <= level:
+            self.levels.append([0, 0])
+
+        self.levels[level][0] += 1
+        self.block_levels[block.block_id] = level
+        self.num_added += 1
+
+        if self.block_callback is not None:
+            self.block_callback({
+                'type': 'added',
+                'block_id': block.block_id,
+                'level': level
+            })
+
+    def submit_block(self, block_id):
+        '''Mark a block as handed to a worker or the dask scheduler.'''
+
+        if self.block_callback is not None:
+            self.block_callback({
+                'type': 'submitted',
+                'block_id': block_id
+            })
+
+    def finish_block(self, block_id, status, timing=None):
+        '''Mark a block as finished with the given ``status`` and ``timing``
+        (``None`` for blocks that were lost with their worker).'''
+
+        now = time.time()
+
+        self.counts[status] += 1
+        self.levels[self.block_levels.pop(block_id)][1] += 1
+
+        if timing is not None:
+            duration = timing['end'] - timing['start']
+            self.total_duration += duration
+            self.num_timed += 1
+        else:
+            duration = 0.0
+
+        self.finish_times.append((now, duration))
+        self.__drop_old_finish_times(now)
+
+        if self.block_callback is not None:
+            self.block_callback({
+                'type': 'finished',
+                'block_id': block_id,
+                'status': status,
+                'timing': timing
+            })
+
+        if (
+                self.callback is not None and
+                now - self.last_callback >= self.interval):
+            self.last_callback = now
+            self.callback(self)
+
+    def finish_reading(self):
+        '''Mark that all blocks were read from the dependency graph.'''
+
+        self.exhausted = True
+
+    def elapsed(self):
+        '''The time in seconds since the start of the run.'''
+
+        if self.start_time is None:
+            return 0.0
+
+        end_time = self.end_time if self.end_time is not None else time.time()
+        return end_time - self.start_time
+
+    def num_finished(self, status=None):
+        '''The number of finished blocks, or the number of finished blocks
+        with the given status.'''
+
+        if status is None:
+            return sum(self.counts.values())
+
+        return self.counts[status]
+
+    def num_blocks(self):
+        '''The number of blocks of the run. This is an estimate until all
+        blocks were read from the dependency graph (see ``exhausted``), and
+        ``None`` if no estimate was given.'''
+
+        if self.exhausted or self.expected_blocks is None:
+            return self.num_added
+
+        return max(self.expected_blocks, self.num_added)
+
+    def throughput(self):
+        '''The number of blocks per second that finished within the last
+        ``window`` seconds.'''
+
+        window = min(self.window, self.elapsed())
+        if window <= 0:
+            return 0.0
+
+        self.__drop_old_finish_times(time.time())
+
+        return len(self.finish_times)/window
+
+    def num_busy_workers(self):
+        '''The mean number of blocks that ran at the same time within the
+        last ``window`` seconds, measured from the durations of the blocks
+        that finished in the window.'''
+
+        window = min(self.window, self.elapsed())
+        if window <= 0:
+            return 0.0
+
+        self.__drop_old_finish_times(time.time())
+
+        return sum(duration for _, duration in self.finish_times)/window
+
+    def mean_duration(self):
+        '''The mean time in seconds the finished blocks took to run. Blocks
+        that were lost with their worker are not counted.'''
+
+        if self.num_timed == 0:
+            return 0.0
+
+        return self.total_duration/self.num_timed
+
+    def eta(self):
+        '''The estimated time in seconds until all blocks finished, or
+        ``None`` if it can't be estimated yet.
+
+        The ETA is the mean duration of the finished blocks times the number
+        of remaining blocks, divided by the number of workers (or by the
+        number of busy workers, see :func:`num_busy_workers`, if the number
+        of workers is not known). Unlike the throughput, this does not
+        depend on how many blocks happened to finish recently, e.g., while
+        workers wait for the blocks of the next level.'''
+
+        remaining = max(0, self.num_blocks() - self.num_finished())
+        if remaining == 0:
+            return 0.0
+
+        if self.num_timed == 0:
+            return None
+
+        if self.num_workers is not None:
+            num_workers = self.num_workers
+        else:
+            num_workers = self.num_busy_workers()
+        if num_workers <= 0:
+            return None
+
+        # at most one block runs on each worker
+        num_workers = min(num_workers, remaining)
+
+        return self.mean_duration()*remaining/num_workers
+
+    def level_progress(self):
+        '''Get a list with a tuple ``(num_finished, num_blocks, complete)``
+        for each level read so far. ``complete`` is ``True`` if all blocks of
+        the level were read and finished.'''
+
+        return [
+            (
+                finished,
+                added,
+                finished == added and (
+                    self.exhausted or level < len(self.levels) - 1)
+            )
+            for level, (added, finished) in enumerate(self.levels)
+        ]
+
+    def __repr__(self):
+
+        eta = self.eta()
+        num_levels_complete = sum(
+            1 for _, _, complete in self.level_progress() if complete)
+
+        return (
+            "%d/%d blocks finished (%d failed), %d/%d levels complete, "
+            "%.2f blocks/s, ETA %s"%(
+                self.num_finished(),
+                self.num_blocks(),
+                self.counts[-1] + self.counts[-2],
+                num_levels_complete,
+                len(self.levels),
+                self.throughput(),
+                "%.0fs"%eta if eta is not None else "unknown"))
+
+    def __drop_old_finish_times(self, now):
+
+        while (
+                self.finish_times and
+                self.finish_times[0][0] < now - self.window):
+            self.finish_times.popleft()
@@ -0,0 +1,122 @@
+from __future__ import absolute_import
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Reduction(object):
+    '''Collects the return values of ``process_function`` in
+    :func:`daisy.run_blockwise`, and optionally folds them with a
+    ``reduce_function``::
+
+        reduction = daisy.Reduction(lambda a, b: a + b)
+        daisy.run_blockwise(..., reduction=reduction)
+
+        print(reduction.value)
+
+    Only blocks that were processed successfully (status 1, see
+    :func:`daisy.tasks.check_and_run`) contribute results, i.e., blocks that
+    were skipped because they were already processed do not.
+
+    Results are folded as soon as they are available, first on the worker
+    that ran a task of several blocks (see ``blocks_per_task``), then into a
+    single value: with the dask scheduler in a tree of tasks on the workers,
+    with the local scheduler in the driver. The results of all blocks are
+    therefore never held in memory at once.
+
+    Args:
+
+        reduce_function (function, optional):
+
+            An associative function that will be called as::
+
+                reduce_function(a, b)
+
+            with two results (or partial reductions of results), and returns
+            their reduction. The order of the results is not defined.
+
+        callback (function, optional):
+
+            A function that will be called with ``(block_id, result)`` for
+            every successful block, as soon as it finished. Only used if no
+            ``reduce_function`` is given.
+
+    If neither ``reduce_function`` nor ``callback`` is given, the results are
+    stored in the dictionary ``results`` by block ID.
+
+    Attributes:
+
+        value:
+
+            The reduction of all results, or ``None`` if there were none.
+
+        results (``dict``):
+
+            The results by block ID, if neither ``reduce_function`` nor
+            ``callback`` was given.
+    '''
+
+    def __init__(self, reduce_function=None, callback=None):
+
+        self.reduce_function = reduce_function
+        self.callback = callback
+        self.value = None
+        self.results = {}
+        self.has_value = False
+
+    def add(self, results):
+        '''Add a list of ``(block_id, result)`` as returned by
+        :func:`reduce_results`.'''
+
+        for block_id, result in results:
+
+            if self.reduce_function is not None:
+
+                if self.has_value:
+                    self.value = self.reduce_function(self.value, result)
+                else:
+                    self.value = result
+                    self.has_value = True
+
+            elif self.callback is not None:
+
+                self.callback(block_id, result)
+
+            else:
+
+                self.results[block_id] = result
+
+def reduce_results(results, reduce_function):
+    '''Fold a list of ``(block_id, result)`` with ``reduce_function``. Returns
+    a list with a single element ``(None, value)``, or an empty list if
+    there are no results. If ``reduce_function`` is ``None``, ``results`` are
+    returned unchanged.'''
+
+    if reduce_function is None or not results:
+        return results
+
+    value = results[0][1]
+    for _, result in results[1:]:
+        value = reduce_function(value, result)
+
+    return [(None, value)]
+
+def reduce_partial_results(reduce_function, *partial_results):
+    '''Fold several lists of ``(block_id, result)`` (e.g., partial reductions
+    of tasks) with ``reduce_function`` into one, see
+    :func:`reduce_results`.'''
+
+    return reduce_results(
+        [ result for results in partial_results for result in results ],
+        reduce_function)
+
+def get_task_statuses(task_result):
+    '''Get the statuses of a result ``(statuses, results)`` of
+    :func:`daisy.tasks.check_and_run_blocks_reduce`.'''
+
+    return task_result[0]
+
+def get_task_results(task_result):
+    '''Get the results of a result ``(statuses, results)`` of
+    :func:`daisy.tasks.check_and_run_blocks_reduce`.'''
+
+    return task_result[1]
@@ -0,0 +1,118 @@
+from __future__ import absolute_import
+from .array import Array
+from .roi import Roi
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class Region(object):
+    '''A sparse region of a volume, given as a list of ROIs or as a boolean
+    mask. Used to restrict the blocks of a dependency graph to the blocks
+    whose write ROIs intersect the region (see
+    :func:`daisy.create_dependency_graph`).
+
+    Args:
+
+        region (list of `class:Roi` or `class:Array`):
+
+            Either a list of ROIs, or a (typically low-resolution) boolean
+            `class:Array`, which is ``True`` where the region is. A block
+            intersects a mask if any voxel of the mask that overlaps with the
+            block's write ROI is ``True``.
+    '''
+
+    def __init__(self, region):
+
+        if isinstance(region, Region):
+            region = region.region
+        if isinstance(region, Roi):
+            region = [region]
+
+        self.region = region
+
+        if isinstance(region, Array):
+
+            self.mask = SummedVolumeTable(region)
+
+            logger.debug(
+                "region mask covers %d of %d voxels",
+                self.mask.total, np.prod(region.shape))
+
+    def intersects(self, blocks):
+        '''Test which write ROIs of the blocks in the `class:BlockTable`
+        ``blocks`` intersect this region. Returns a boolean array.'''
+
+        if isinstance(self.region, Array):
+            return self.mask.sum(blocks.write_begin, blocks.write_end) > 0
+
+        intersects = np.zeros((len(blocks),), dtype=bool)
+        for roi in self.region:
+            intersects |= np.all(
+                (blocks.write_begin < np.array(roi.get_end())) &
+                (blocks.write_end > np.array(roi.get_begin())),
+                axis=1)
+
+        return intersects
+
+    def skip_outside(self, blocks):
+        '''Test which blocks in the `class:BlockTable` ``blocks`` do not
+        intersect this region. Can be used as ``skip_function`` for
+        :func:`daisy.blocks.iterate_dependency_levels`.'''
+
+        return ~self.intersects(blocks)
+
+class SummedVolumeTable(object):
+    '''A summed volume table of a (typically low-resolution) `class:Array`
+    without channel dimensions, to sum the values of the array in any box in
+    world units with ``2^dims`` lookups. Boolean arrays are summed as
+    integers.'''
+
+    def __init__(self, array):
+
+        assert array.n_channel_dims == 0, (
+            "array must not have channel dimensions")
+
+        data = array.to_ndarray()
+        if data.dtype == bool or np.issubdtype(data.dtype, np.integer):
+            data = np.asarray(data, dtype=np.int64)
+        else:
+            data = np.asarray(data, dtype=np.float64)
+
+        # with a leading zero in each dimension
+        self.table = np.pad(data, [(1, 0)]*data.ndim, mode='constant')
+        for d in range(data.ndim):
+            self.table = np.cumsum(self.table, axis=d)
+
+        self.total = self.table[(-1,)*data.ndim]
+        self.begin = np.array(array.roi.get_begin(), dtype=np.int64)
+        self.shape = np.array(data.shape, dtype=np.int64)
+        self.voxel_size = np.array(array.voxel_size, dtype=np.int64)
+
+    def sum(self, begin, end):
+        '''Sum the values of all voxels that overlap with the boxes from
+        ``begin`` to ``end`` (integer arrays of shape ``(n, dims)`` in world
+        units). Returns an array of ``n`` sums.'''
+
+        dims = len(self.shape)
+
+        # voxels of the array overlapping with each box
+        begin = np.clip(
+            (begin - self.begin)//self.voxel_size,
+            0, self.shape)
+        end = np.clip(
+            -(-(end - self.begin)//self.voxel_size),
+            0, self.shape)
+        end = np.maximum(begin, end)
+
+        # inclusion-exclusion over the corners of each box
+        total = np.zeros((begin.shape[0],), dtype=self.table.dtype)
+        for corner in range(2**dims):
+            upper = [ (corner >> d) & 1 for d in range(dims) ]
+            index = tuple(
+                end[:, d] if upper[d] else begin[:, d]
+                for d in range(dims))
+            sign = (-1)**(dims - sum(upper))
+            total += sign*self.table[index]
+
+        return total
@@ -1,7 +1,6 @@
 from __future__ import absolute_import
 from .coordinate import Coordinate
 from .freezable import Freezable
-import copy
 import numbers
 import numpy as np
 
@@ -317,7 +316,9 @@ class Roi(Freezable):
 
     def copy(self):
         '''Create a copy of this ROI.'''
-        return copy.deepcopy(self)
+
+        # offset and shape are immutable, no need to copy them
+        return Roi(self.__offset, self.__shape)
 
     def __left_min(self, x, y):
 
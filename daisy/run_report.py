@@ -0,0 +1,310 @@
+from __future__ import absolute_import
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class RunReport(object):
+    '''Collects per-block telemetry of a run of
+    :func:`daisy.run_blockwise`::
+
+        report = daisy.RunReport()
+        daisy.run_blockwise(..., report=report)
+
+        print(report.throughput())
+        report.to_json('report.json')
+        report.to_chrome_trace('trace.json')
+
+    The Chrome trace can be opened in ``chrome://tracing`` or
+    https://ui.perfetto.dev, and shows one row per worker.
+
+    For each block, the report stores the worker that ran it, the start and
+    end timestamps, the time spent in ``pre_check``, ``process``, and
+    ``post_check``, the status (see :func:`daisy.tasks.check_and_run`), and
+    the queue wait, i.e., the time between the block being ready (all
+    upstream blocks finished) and its start.
+    '''
+
+    def __init__(self):
+
+        self.start_time = None
+        self.end_time = None
+
+        # per block ID
+        self.blocks = {}
+
+        # block IDs in the order they were read from the dependency graph,
+        # upstream blocks are always read before their downstream blocks
+        self.order = []
+
+    def start(self):
+        '''Mark the start of the run.'''
+
+        self.start_time = time.time()
+
+    def stop(self):
+        '''Mark the end of the run.'''
+
+        self.end_time = time.time()
+
+    def add_block(self, block, upstream_blocks):
+        '''Add a block that was read from the dependency graph.'''
+
+        block_id = int(block.block_id)
+
+        self.blocks[block_id] = {
+            'block_id': block_id,
+            'write_roi': [
+                [ int(c) for c in block.write_roi.get_begin() ],
+                [ int(c) for c in block.write_roi.get_shape() ]
+            ],
+            'num_voxels': int(block.write_roi.size()),
+            'upstream': [ int(b.block_id) for b in upstream_blocks ],
+            'read': time.time(),
+            'status': None,
+            'worker': None,
+            'start': None,
+            'end': None,
+            'pre_check': None,
+            'process': None,
+            'post_check': None,
+            'queue_wait': None
+        }
+        self.order.append(block_id)
+
+    def finish_block(self, block_id, status, timing=None):
+        '''Record the ``status`` and ``timing`` (as returned by
+        :func:`daisy.tasks.check_and_run_timed`) of a finished block.
+        ``timing`` is ``None`` for blocks that were lost with their worker.'''
+
+        record = self.blocks[block_id]
+        record['status'] = status
+
+        if timing is None:
+            return
+
+        record.update(timing)
+
+        ready = max(
+            [record['read']] +
+            [
+                self.blocks[b]['end']
+                for b in record['upstream']
+                if self.blocks[b]['end'] is not None
+            ])
+        record['queue_wait'] = max(0.0, record['start'] - ready)
+
+    def records(self):
+        '''Get a list of the records of all blocks, in the order they were
+        read from the dependency graph.'''
+
+        return [ self.blocks[b] for b in self.order ]
+
+    def duration(self):
+        '''The wall-clock duration of the run in seconds.'''
+
+        if self.start_time is None:
+            return 0.0
+
+        end_time = self.end_time if self.end_time is not None else time.time()
+        return end_time - self.start_time
+
+    def num_blocks(self, status=None):
+        '''The number of finished blocks, or the number of blocks with the
+        given status.'''
+
+        return sum(
+            1
+            for r in self.blocks.values()
+            if r['status'] is not None and (
+                status is None or r['status'] == status))
+
+    def throughput(self):
+        '''The number of finished blocks per second.'''
+
+        duration = self.duration()
+        return self.num_blocks()/duration if duration > 0 else 0.0
+
+    def voxel_throughput(self):
+        '''The number of voxels in the write ROIs of successfully processed
+        blocks per second.'''
+
+        duration = self.duration()
+        if duration <= 0:
+            return 0.0
+
+        num_voxels = sum(
+            r['num_voxels']
+            for r in self.blocks.values()
+            if r['status'] == 1)
+
+        return num_voxels/duration
+
+    def critical_path(self):
+        '''Get the longest chain of dependent blocks, measured in the time the
+        blocks took to run.
+
+        Returns a tuple ``(length, block_ids)`` of the length of the path in
+        seconds and the IDs of the blocks on it, from first to last.
+        '''
+
+        lengths = {}
+        predecessors = {}
+
+        for block_id in self.order:
+
+            record = self.blocks[block_id]
+            if record['start'] is None:
+                continue
+
+            longest = None
+            for upstream_id in record['upstream']:
+                if upstream_id not in lengths:
+                    continue
+                if longest is None or lengths[upstream_id] > lengths[longest]:
+                    longest = upstream_id
+
+            lengths[block_id] = record['end'] - record['start']
+            if longest is not None:
+                lengths[block_id] += lengths[longest]
+            predecessors[block_id] = longest
+
+        if not lengths:
+            return 0.0, []
+
+        last = max(lengths, key=lambda b: lengths[b])
+        length = lengths[last]
+
+        path = []
+        while last is not None:
+            path.append(last)
+            last = predecessors[last]
+
+        return length, list(reversed(path))
+
+    def worker_utilization(self):
+        '''Get a dictionary from worker names to the fraction of the run
+        duration the worker spent running blocks.'''
+
+        duration = self.duration()
+        busy = {}
+
+        for record in self.blocks.values():
+            if record['start'] is None:
+                continue
+            busy[record['worker']] = (
+                busy.get(record['worker'], 0.0) +
+                record['end'] - record['start'])
+
+        return {
+            worker: b/duration if duration > 0 else 0.0
+            for worker, b in busy.items()
+        }
+
+    def summary(self):
+        '''Get a dictionary with the aggregate statistics of the run.'''
+
+        critical_path_length, critical_path = self.critical_path()
+
+        return {
+            'start': self.start_time,
+            'end': self.end_time,
+            'duration': self.duration(),
+            'num_blocks': self.num_blocks(),
+            'num_succeeded': self.num_blocks(1),
+            'num_skipped': self.num_blocks(0),
+            'num_failed': self.num_blocks(-1),
+            'num_errored': self.num_blocks(-2),
+            'throughput': self.throughput(),
+            'voxel_throughput': self.voxel_throughput(),
+            'critical_path_length': critical_path_length,
+            'critical_path': critical_path,
+            'worker_utilization': self.worker_utilization()
+        }
+
+    def to_json(self, filename=None):
+        '''Get the summary and all block records as a JSON string, or write
+        them to ``filename``.'''
+
+        data = json.dumps({
+            'summary': self.summary(),
+            'blocks': self.records()
+        })
+
+        if filename is None:
+            return data
+
+        with open(filename, 'w') as f:
+            f.write(data)
+
+    def to_chrome_trace(self, filename=None):
+        '''Get the run as a list of Chrome trace events, or write them as JSON
+        to ``filename``. Every block is a slice on the row of its worker,
+        with nested slices for ``pre_check``, ``process``, and
+        ``post_check``.'''
+
+        origin = self.start_time
+        if origin is None:
+            origin = min(
+                [r['start'] for r in self.blocks.values() if r['start']] or
+                [0.0])
+
+        def us(t):
+            return int((t - origin)*1e6)
+
+        workers = {}
+        events = []
+
+        for record in self.records():
+
+            if record['start'] is None:
+                continue
+
+            worker = record['worker']
+            if worker not in workers:
+                workers[worker] = len(workers)
+                events.append({
+                    'name': 'thread_name',
+                    'ph': 'M',
+                    'pid': 0,
+                    'tid': workers[worker],
+                    'args': { 'name': worker }
+                })
+            tid = workers[worker]
+
+            events.append({
+                'name': 'block %d'%record['block_id'],
+                'cat': 'block',
+                'ph': 'X',
+                'pid': 0,
+                'tid': tid,
+                'ts': us(record['start']),
+                'dur': us(record['end']) - us(record['start']),
+                'args': {
+                    'block_id': record['block_id'],
+                    'status': record['status'],
+                    'queue_wait': record['queue_wait'],
+                    'write_roi': record['write_roi']
+                }
+            })
+
+            start = record['start']
+            for step in ['pre_check', 'process', 'post_check']:
+                if record[step] > 0:
+                    events.append({
+                        'name': step,
+                        'cat': 'step',
+                        'ph': 'X',
+                        'pid': 0,
+                        'tid': tid,
+                        'ts': us(start),
+                        'dur': us(start + record[step]) - us(start)
+                    })
+                start += record[step]
+
+        if filename is None:
+            return events
+
+        with open(filename, 'w') as f:
+            json.dump({ 'traceEvents': events }, f)
@@ -0,0 +1,106 @@
+from __future__ import absolute_import
+from collections import deque
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# the number of most recent block durations per level to compute the median
+# from
+max_durations = 1000
+
+# the minimal number of finished blocks of a level before any of its blocks is
+# considered slow
+min_durations = 3
+
+class Speculation(object):
+    '''Decides which running blocks are slow enough to start a speculative
+    copy of them, given the durations of the finished blocks of the same
+    level.
+
+    A block is slow if at least ``fraction`` of the blocks of its level
+    finished, and it is running for longer than ``factor`` times the median
+    duration of the finished blocks of its level. Only levels that were read
+    completely from the dependency graph are considered, since the number of
+    their blocks is not known before.
+
+    Args:
+
+        factor (``float``):
+
+            How many times longer than the median a block has to run to be
+            considered slow.
+
+        fraction (``float``, optional):
+
+            The fraction of blocks of a level that have to be finished before
+            any of its blocks is considered slow.
+    '''
+
+    def __init__(self, factor, fraction=0.9):
+
+        self.factor = factor
+        self.fraction = fraction
+
+        # the level of each unfinished block, by block ID
+        self.levels = {}
+
+        # number of read and finished blocks, and the most recent durations,
+        # by level
+        self.num_blocks = {}
+        self.num_finished = {}
+        self.durations = {}
+        self.medians = {}
+
+        self.last_level = None
+        self.exhausted = False
+
+    def add_block(self, block, level):
+
+        self.levels[block.block_id] = level
+        self.num_blocks[level] = self.num_blocks.get(level, 0) + 1
+        if level not in self.durations:
+            self.num_finished[level] = 0
+            self.durations[level] = deque(maxlen=max_durations)
+        self.last_level = level
+
+    def finish_reading(self):
+
+        self.exhausted = True
+
+    def finish_block(self, block_id, duration=None):
+        '''Mark a block as finished, and record its duration in seconds if it
+        was processed.'''
+
+        level = self.levels.pop(block_id, None)
+        if level is None:
+            return
+
+        self.num_finished[level] += 1
+        if duration is not None:
+            self.durations[level].append(duration)
+            self.medians.pop(level, None)
+
+    def is_slow(self, block_id, running_time):
+        '''Test if a block that is running for ``running_time`` seconds is
+        slow.'''
+
+        level = self.levels.get(block_id)
+        if level is None:
+            return False
+
+        # more blocks of this level might be read later
+        if level == self.last_level and not self.exhausted:
+            return False
+
+        if self.num_finished[level] < self.fraction*self.num_blocks[level]:
+            return False
+
+        durations = self.durations[level]
+        if len(durations) < min_durations:
+            return False
+
+        if level not in self.medians:
+            self.medians[level] = float(np.median(durations))
+
+        return running_time > self.factor*self.medians[level]
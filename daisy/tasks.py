@@ -0,0 +1,312 @@
+from __future__ import absolute_import
+from .reduction import reduce_results
+import asyncio
+import inspect
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+
+logger = logging.getLogger(__name__)
+
+# states returned by init functions, by run token and thread ID
+worker_states = {}
+worker_states_lock = threading.Lock()
+
+def check_and_run(block, process_function, pre_check, post_check, *args):
+    '''Run ``process_function`` on ``block``, unless ``pre_check`` says it was
+    already processed. Additional ``args`` are ignored (they are used by the
+    dask scheduler to express dependencies).
+
+    Returns 1 if the block succeeded, 0 if it was skipped, -1 if
+    ``post_check`` failed, and -2 if ``process_function`` or one of the check
+    functions raised an exception.
+    '''
+
+    status, _ = check_and_run_timed(
+        block,
+        process_function,
+        pre_check,
+        post_check)
+
+    return status
+
+def check_and_run_timed(block, process_function, pre_check, post_check):
+    '''Like :func:`check_and_run`, but also measures how long each step
+    took.
+
+    Returns a tuple ``(status, timing)``, where ``timing`` is a dictionary
+    with the name of the ``worker`` that ran the block, the ``start`` and
+    ``end`` timestamps, and the time spent in ``pre_check``,
+    ``process``, and ``post_check`` (in seconds).
+    '''
+
+    status, timing, _ = check_and_run_result(
+        block,
+        process_function,
+        pre_check,
+        post_check)
+
+    return status, timing
+
+def check_and_run_result(block, process_function, pre_check, post_check):
+    '''Like :func:`check_and_run_timed`, but also returns the return value
+    of ``process_function``.
+
+    Returns a tuple ``(status, timing, result)``. ``result`` is ``None``
+    unless the block succeeded (status 1).
+    '''
+
+    # the steps never suspend if the functions are called synchronously
+    steps = run_steps(block, process_function, pre_check, post_check, call)
+    try:
+        steps.send(None)
+    except StopIteration as e:
+        return e.value
+
+    raise RuntimeError("Block %s did not finish synchronously"%block)
+
+async def check_and_run_result_async(
+        block,
+        process_function,
+        pre_check,
+        post_check):
+    '''Like :func:`check_and_run_result`, but awaits the return values of
+    ``process_function`` and the check functions if they are awaitable, such
+    that ``async def`` functions can be used.'''
+
+    return await run_steps(
+        block,
+        process_function,
+        pre_check,
+        post_check,
+        call_async)
+
+async def call(function, block):
+
+    return function(block)
+
+async def call_async(function, block):
+
+    result = function(block)
+    if inspect.isawaitable(result):
+        result = await result
+
+    return result
+
+async def run_steps(block, process_function, pre_check, post_check, call):
+
+    timing = {
+        'worker': get_worker_name(),
+        'start': time.time(),
+        'pre_check': 0.0,
+        'process': 0.0,
+        'post_check': 0.0
+    }
+
+    async def step(name, function):
+        start = time.time()
+        try:
+            return await call(function, block)
+        finally:
+            timing[name] = time.time() - start
+
+    result = None
+
+    try:
+
+        if await step('pre_check', pre_check):
+            logger.info(
+                "Skipping task for block %s; already processed.",
+                block)
+            status = 0
+
+        else:
+
+            try:
+                result = await step('process', process_function)
+            except:
+                logger.error(
+                    "Task for block %s failed:\n%s",
+                    block, traceback.format_exc())
+                status = -2
+            else:
+                if await step('post_check', post_check):
+                    status = 1
+                else:
+                    result = None
+                    logger.error(
+                        "Completion check failed for task for block %s.",
+                        block)
+                    status = -1
+
+    except:
+        logger.error(
+            "Checking block %s failed:\n%s",
+            block, traceback.format_exc())
+        status = -2
+        result = None
+
+    timing['end'] = time.time()
+
+    return status, timing, result
+
+def run_blocks(
+        blocks,
+        process_function,
+        pre_check,
+        post_check,
+        async_concurrency=None):
+    '''Run :func:`check_and_run_result` on each of the given ``blocks`` in
+    turn, or, if ``async_concurrency`` is given, run up to
+    ``async_concurrency`` blocks concurrently with
+    :func:`check_and_run_result_async` on a new event loop.
+
+    Returns a list of ``(status, timing, result)`` for each block.
+    '''
+
+    if async_concurrency is None:
+        return [
+            check_and_run_result(
+                block,
+                process_function,
+                pre_check,
+                post_check)
+            for block in blocks
+        ]
+
+    async def run_all():
+
+        semaphore = asyncio.Semaphore(async_concurrency)
+
+        async def run(block):
+            async with semaphore:
+                return await check_and_run_result_async(
+                    block,
+                    process_function,
+                    pre_check,
+                    post_check)
+
+        return await asyncio.gather(*[ run(block) for block in blocks ])
+
+    return asyncio.run(run_all())
+
+def check_and_run_blocks(
+        blocks,
+        process_function,
+        pre_check,
+        post_check,
+        *args,
+        async_concurrency=None):
+    '''Run :func:`check_and_run_timed` on each of the given ``blocks`` (see
+    :func:`run_blocks` for ``async_concurrency``). Additional ``args`` are
+    ignored.
+
+    Returns a list of ``(status, timing)`` for each block.
+    '''
+
+    return [
+        (status, timing)
+        for status, timing, _ in run_blocks(
+            blocks,
+            process_function,
+            pre_check,
+            post_check,
+            async_concurrency)
+    ]
+
+def check_and_run_blocks_reduce(
+        blocks,
+        process_function,
+        pre_check,
+        post_check,
+        reduce_function,
+        *args,
+        async_concurrency=None):
+    '''Like :func:`check_and_run_blocks`, but also collects the results of
+    successful blocks, folded with ``reduce_function`` (see
+    :func:`daisy.reduction.reduce_results`).
+
+    Returns a tuple ``(statuses, results)`` of a list of ``(status,
+    timing)`` for each block, and a list of ``(block_id, result)``.
+    '''
+
+    statuses = []
+    results = []
+
+    for block, (status, timing, result) in zip(
+            blocks,
+            run_blocks(
+                blocks,
+                process_function,
+                pre_check,
+                post_check,
+                async_concurrency)):
+
+        statuses.append((status, timing))
+        if status == 1:
+            results.append((block.block_id, result))
+
+    return statuses, reduce_results(results, reduce_function)
+
+def is_coroutine_function(function):
+    '''Test if ``function`` (or its ``__call__`` method) is an ``async def``
+    function.'''
+
+    return (
+        inspect.iscoroutinefunction(function) or
+        inspect.iscoroutinefunction(getattr(function, '__call__', None)))
+
+def get_worker_name():
+    '''Get a name for the current thread that is unique across hosts and
+    processes.'''
+
+    return '%s/%d/%s'%(
+        socket.gethostname(),
+        os.getpid(),
+        threading.current_thread().name)
+
+class ProcessWithState(object):
+    '''Wraps a ``process_function(block, state)`` into a function of a block
+    only. ``state`` is the return value of ``init_function()``, which is
+    called once per thread on the first block and cached under ``token``
+    until :func:`teardown_worker_states` is called.
+
+    Used to keep a per-worker state on dask workers, which do not expose
+    their life cycle to the tasks they run.'''
+
+    def __init__(self, process_function, init_function, token):
+
+        self.process_function = process_function
+        self.init_function = init_function
+        self.token = token
+
+    def __call__(self, block):
+
+        key = (self.token, threading.current_thread().ident)
+
+        with worker_states_lock:
+            initialized = key in worker_states
+            state = worker_states.get(key)
+
+        if not initialized:
+            logger.info("Initializing worker state for run %s", self.token)
+            state = self.init_function()
+            with worker_states_lock:
+                worker_states[key] = state
+
+        return self.process_function(block, state)
+
+def teardown_worker_states(token, teardown_function=None):
+    '''Remove all worker states cached under ``token`` in this process, and
+    call ``teardown_function`` on each of them.'''
+
+    with worker_states_lock:
+        keys = [ k for k in worker_states if k[0] == token ]
+        states = [ worker_states.pop(k) for k in keys ]
+
+    if teardown_function is not None:
+        for state in states:
+            teardown_function(state)
@@ -0,0 +1,119 @@
+import asyncio
+import daisy
+import logging
+import time
+
+logging.basicConfig(level=logging.INFO)
+
+total_roi = daisy.Roi((0, 0), (100, 100))
+read_roi = daisy.Roi((0, 0), (20, 20))
+write_roi = daisy.Roi((5, 5), (10, 10))
+
+intervals = {}
+
+async def process_async(block):
+
+    start = time.time()
+    await asyncio.sleep(0.05)
+    intervals[block.block_id] = (start, time.time())
+
+async def check_async(block):
+
+    await asyncio.sleep(0)
+    return block.block_id in intervals
+
+def max_concurrent():
+
+    events = sorted(
+        [ (start, 1) for start, _ in intervals.values() ] +
+        [ (end, -1) for _, end in intervals.values() ])
+
+    running = 0
+    max_running = 0
+    for _, change in events:
+        running += change
+        max_running = max(max_running, running)
+
+    return max_running
+
+def test_async_concurrency():
+
+    intervals.clear()
+
+    assert daisy.run_blockwise(
+        total_roi,
+        read_roi,
+        write_roi,
+        process_async,
+        check_function=(lambda b: False, check_async),
+        read_write_conflict=False,
+        num_workers=2,
+        processes=False,
+        scheduler='local',
+        async_concurrency=8)
+
+    graph = daisy.create_dependency_graph(
+        total_roi,
+        read_roi,
+        write_roi,
+        read_write_conflict=False)
+    assert len(intervals) == len(graph)
+
+    # more blocks than workers ran at the same time, but not more than the
+    # limit
+    assert 2 < max_concurrent() <= 2*8
+
+def test_async_dependencies():
+
+    intervals.clear()
+
+    assert daisy.run_blockwise(
+        total_roi,
+        read_roi,
+        write_roi,
+        process_async,
+        num_workers=2,
+        processes=False,
+        scheduler='local',
+        async_concurrency=8)
+
+    graph = daisy.create_dependency_graph(total_roi, read_roi, write_roi)
+    assert len(intervals) == len(graph)
+
+    # no block started before its upstream blocks finished
+    for block, upstream_blocks in graph:
+        for upstream_block in upstream_blocks:
+            assert (
+                intervals[upstream_block.block_id][1] <=
+                intervals[block.block_id][0])
+
+def test_async_processes():
+
+    async def process(block):
+        await asyncio.sleep(0.01)
+        if block.block_id == 0:
+            raise RuntimeError("block 0 fails")
+        return 1
+
+    num_blocks = len(daisy.create_dependency_graph(
+        total_roi,
+        read_roi,
+        write_roi))
+    reduction = daisy.Reduction(lambda a, b: a + b)
+
+    assert not daisy.run_blockwise(
+        total_roi,
+        read_roi,
+        write_roi,
+        process,
+        num_workers=2,
+        scheduler='local',
+        reduction=reduction,
+        async_concurrency=4)
+
+    assert reduction.value == num_blocks - 1
+
+if __name__ == "__main__":
+    test_async_concurrency()
+    test_async_dependencies()
+    test_async_processes()
@@ -0,0 +1,81 @@
+from itertools import product
+import daisy
+import numpy as np
+
+configs = [
+    ((0,), (100,), (0,), (20,), (5,), (15,)),
+    ((100,), (90,), (0,), (10,), (3,), (2,)),
+    ((-52,), (696,), (-52,), (144,), (0,), (92,)),
+    ((0, 0), (37, 41), (0, 0), (9, 10), (2, 3), (4, 5)),
+    ((-5, 3), (37, 41), (-1, -2), (9, 10), (1, 0), (4, 5)),
+    ((0, 0, 0), (30, 20, 25), (0, 0, 0), (10, 5, 7), (2, 1, 2), (6, 1, 2)),
+]
+
+def test_block_grid():
+
+    for config in configs:
+
+        total_roi = daisy.Roi(config[0], config[1])
+        read_roi = daisy.Roi(config[2], config[3])
+        write_roi = daisy.Roi(config[4], config[5])
+
+        for fit, read_write_conflict, level_strategy in product(
+                ['valid', 'overhang', 'shrink'],
+                [True, False],
+                ['stride', 'coloring']):
+
+            graph = daisy.create_dependency_graph(
+                total_roi,
+                read_roi,
+                write_roi,
+                read_write_conflict,
+                fit,
+                level_strategy=level_strategy)
+
+            grid = daisy.BlockGrid(
+                total_roi,
+                read_roi,
+                write_roi,
+                read_write_conflict,
+                fit,
+                level_strategy)
+
+            block_ids = [block.block_id for block, _ in graph]
+            assert len(set(block_ids)) == len(block_ids)
+            assert grid.exists(block_ids).all()
+
+            downstream = {}
+            for block, upstream in graph:
+
+                upstream_ids = set(b.block_id for b in upstream)
+                assert upstream_ids == set(
+                    grid.get_upstream_ids(block.block_id))
+
+                for u in upstream_ids:
+                    downstream.setdefault(u, set()).add(block.block_id)
+
+                b = grid.get_block(block.block_id)
+                assert b.read_roi == block.read_roi
+                assert b.write_roi == block.write_roi
+
+            for block_id in block_ids:
+                assert downstream.get(block_id, set()) == set(
+                    grid.get_downstream_ids(block_id))
+
+            block = graph[-1][0]
+            b = daisy.Block.from_id(
+                total_roi,
+                read_roi,
+                write_roi,
+                fit,
+                block.block_id)
+            assert b.write_roi == block.write_roi
+            assert b.requested_write_roi == block.requested_write_roi
+
+            # all other IDs do not exist
+            num_ids = int(np.prod(grid.grid_shape))
+            others = np.setdiff1d(np.arange(num_ids), block_ids)
+            assert not grid.exists(others).any()
+
+if __name__ == "__main__":
+    test_block_grid()
@@ -0,0 +1,73 @@
+import daisy
+import logging
+import numpy as np
+from daisy.block_order import hilbert_keys, morton_keys
+
+logging.basicConfig(level=logging.INFO)
+
+def test_curves():
+
+    for shape in [(16, 16), (8, 8, 8), (5, 7)]:
+
+        positions = np.stack(
+            np.unravel_index(np.arange(np.prod(shape)), shape),
+            axis=1)
+
+        for keys in [hilbert_keys, morton_keys]:
+            k = keys(positions)
+            assert len(set(k)) == len(positions)
+
+        # consecutive blocks on a full Hilbert curve are direct neighbours
+        if shape != (5, 7):
+            ordered = positions[np.argsort(hilbert_keys(positions))]
+            assert np.abs(np.diff(ordered, axis=0)).sum(axis=1).max() == 1
+
+def test_block_order():
+
+    total_roi = daisy.Roi((0, 0), (100, 100))
+    read_roi = daisy.Roi((0, 0), (20, 20))
+    write_roi = daisy.Roi((5, 5), (10, 10))
+
+    for fit in ['valid', 'overhang', 'shrink']:
+
+        graph = daisy.create_dependency_graph(
+            total_roi,
+            read_roi,
+            write_roi,
+            fit=fit)
+        dependencies = {
+            block.block_id: set(b.block_id for b in upstream)
+            for block, upstream in graph
+        }
+
+        for block_order in ['morton', 'hilbert', lambda p: -p[:, 0]]:
+
+            ordered_graph = daisy.create_dependency_graph(
+                total_roi,
+                read_roi,
+                write_roi,
+                fit=fit,
+                block_order=block_order)
+
+            # same blocks and dependencies, upstream blocks still first
+            seen = set()
+            for block, upstream in ordered_graph:
+                upstream_ids = set(b.block_id for b in upstream)
+                assert upstream_ids == dependencies[block.block_id]
+                assert upstream_ids <= seen
+                seen.add(block.block_id)
+            assert seen == set(dependencies.keys())
+
+            table = daisy.create_block_table(
+                total_roi,
+                read_roi,
+                write_roi,
+                fit=fit,
+                block_order=block_order)
+            assert (
+                list(table.block_ids) ==
+                [block.block_id for block, _ in ordered_graph])
+
+if __name__ == "__main__":
+    test_curves()
+    test_block_order()
@@ -0,0 +1,51 @@
+import daisy
+import numpy as np
+
+def test_block_table():
+
+    total_roi = daisy.Roi((-5, 3), (37, 41))
+    read_roi = daisy.Roi((-1, -2), (9, 10))
+    write_roi = daisy.Roi((1, 0), (4, 5))
+
+    for fit in ['valid', 'overhang', 'shrink']:
+
+        graph = daisy.create_dependency_graph(
+            total_roi,
+            read_roi,
+            write_roi,
+            fit=fit)
+        blocks = [block for block, _ in graph]
+
+        table = daisy.create_block_table(
+            total_roi,
+            read_roi,
+            write_roi,
+            fit=fit)
+
+        assert len(table) == len(blocks)
+
+        for block, table_block in zip(blocks, table):
+            assert block.block_id == table_block.block_id
+            assert block.read_roi == table_block.read_roi
+            assert block.write_roi == table_block.write_roi
+            assert (
+                block.requested_write_roi ==
+                table_block.requested_write_roi)
+
+        # round trip
+        other = daisy.BlockTable.from_blocks(total_roi, blocks)
+        assert np.array_equal(table.data, other.data)
+
+        # slicing and filtering
+        assert len(table[2:5]) == 3
+        assert table[2:5][0].block_id == blocks[2].block_id
+
+        mask = table.block_ids%2 == 0
+        even = table[mask]
+        assert all(b.block_id%2 == 0 for b in even)
+        assert len(even) == sum(1 for b in blocks if b.block_id%2 == 0)
+
+        assert table.write_begin.shape == (len(table), 2)
+
+if __name__ == "__main__":
+    test_block_table()
@@ -0,0 +1,83 @@
+import daisy
+import logging
+import numpy as np
+from daisy.chunk_cache import CachedDataset
+
+logging.basicConfig(level=logging.INFO)
+
+class ChunkedData(object):
+    '''A chunked ndarray-like that counts how often it was read.'''
+
+    def __init__(self, data, chunks):
+
+        self.array = data
+        self.shape = data.shape
+        self.dtype = data.dtype
+        self.chunks = chunks
+        self.num_reads = 0
+
+    def __getitem__(self, key):
+
+        self.num_reads += 1
+        return self.array[key].copy()
+
+    def __setitem__(self, key, value):
+
+        self.array[key] = value
+
+def test_cached_reads():
+
+    cache = daisy.get_chunk_cache()
+    cache.clear()
+
+    data = np.arange(2*40*40).reshape((2, 40, 40))
+    chunked = ChunkedData(data, (2, 10, 10))
+    array = daisy.Array(
+        CachedDataset(chunked, 'test_cached_reads'),
+        daisy.Roi((0, 0), (40, 40)),
+        (1, 1))
+
+    # overlapping reads of neighbouring blocks
+    roi_a = daisy.Roi((5, 5), (20, 20))
+    roi_b = daisy.Roi((15, 5), (20, 20))
+
+    assert np.array_equal(array.to_ndarray(roi_a), data[:, 5:25, 5:25])
+    assert chunked.num_reads == 9
+    assert cache.misses == 9
+
+    assert np.array_equal(array.to_ndarray(roi_b), data[:, 15:35, 5:25])
+    assert chunked.num_reads == 12
+    assert cache.hits == 6
+
+    # fully cached reads do not touch the data, also for other views
+    view = array[daisy.Roi((10, 10), (10, 10))]
+    assert np.array_equal(view.to_ndarray(), data[:, 10:20, 10:20])
+    assert chunked.num_reads == 12
+
+    # writes remove overlapping chunks from the cache
+    array[daisy.Roi((10, 10), (5, 5))] = 0
+    assert np.all(view.to_ndarray()[:, :5, :5] == 0)
+    assert chunked.num_reads == 13
+
+def test_eviction():
+
+    cache = daisy.ChunkCache(max_bytes=100)
+
+    cache.put('a', np.zeros((40,), dtype=np.uint8))
+    cache.put('b', np.zeros((40,), dtype=np.uint8))
+    assert cache.get('a') is not None
+
+    # evicts the least recently used chunk
+    cache.put('c', np.zeros((40,), dtype=np.uint8))
+    assert cache.get('b') is None
+    assert cache.get('a') is not None
+    assert cache.get('c') is not None
+
+    assert cache.num_bytes == 80
+    assert cache.evictions == 1
+    assert cache.hits == 3
+    assert cache.misses == 1
+
+if __name__ == "__main__":
+    test_cached_reads()
+    test_eviction()
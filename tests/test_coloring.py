@@ -0,0 +1,128 @@
+from daisy.blocks import iterate_dependency_levels
+import daisy
+import numpy as np
+
+def conflict(a, b):
+
+    return (
+        a.read_roi.intersects(b.write_roi) or
+        b.read_roi.intersects(a.write_roi) or
+        a.write_roi.intersects(b.write_roi))
+
+def get_levels(total_roi, read_roi, write_roi, level_strategy, skip=None):
+
+    return [
+        list(level_blocks)
+        for _, level_blocks in iterate_dependency_levels(
+            total_roi,
+            read_roi,
+            write_roi,
+            skip_function=skip,
+            level_strategy=level_strategy)
+    ]
+
+def test_coloring_levels():
+
+    configs = [
+        # context only at the end
+        ((0, 0), (100, 100), (0, 0), (15, 15), (0, 0), (10, 10), 3),
+        # symmetric context
+        ((0, 0), (100, 100), (0, 0), (20, 20), (5, 5), (10, 10), 4),
+        # context only at the end, 3D
+        ((0,)*3, (40,)*3, (0,)*3, (12,)*3, (0,)*3, (10,)*3, 4),
+    ]
+
+    for config in configs:
+
+        total_roi = daisy.Roi(config[0], config[1])
+        read_roi = daisy.Roi(config[2], config[3])
+        write_roi = daisy.Roi(config[4], config[5])
+        num_colors = config[6]
+
+        stride_levels = get_levels(total_roi, read_roi, write_roi, 'stride')
+        levels = get_levels(total_roi, read_roi, write_roi, 'coloring')
+
+        assert len(levels) == num_colors
+        assert len(levels) <= len(stride_levels)
+
+        # same blocks in both
+        assert sorted(
+            b.block_id for level in levels for b, _ in level) == sorted(
+            b.block_id for level in stride_levels for b, _ in level)
+
+        # blocks of a level do not conflict, and all conflicting blocks of
+        # previous levels are upstream
+        previous = []
+        for level in levels:
+            blocks = [ b for b, _ in level ]
+            for i, (block, upstream) in enumerate(level):
+                for other in blocks[i + 1:]:
+                    assert not conflict(block, other)
+                upstream_ids = set(b.block_id for b in upstream)
+                expected = set(
+                    b.block_id for b in previous if conflict(block, b))
+                assert upstream_ids == expected
+            previous += blocks
+
+def test_coloring_skip():
+
+    total_roi = daisy.Roi((0, 0), (100, 100))
+    read_roi = daisy.Roi((0, 0), (15, 15))
+    write_roi = daisy.Roi((0, 0), (10, 10))
+
+    all_blocks = [
+        b
+        for level in get_levels(total_roi, read_roi, write_roi, 'coloring')
+        for b, _ in level
+    ]
+    skipped_ids = set(b.block_id for b in all_blocks[::3])
+
+    def skip(blocks):
+        return np.isin(blocks.block_ids, list(skipped_ids))
+
+    levels = get_levels(total_roi, read_roi, write_roi, 'coloring', skip)
+    graph = [ (b, u) for level in levels for b, u in level ]
+
+    assert set(b.block_id for b, _ in graph) == set(
+        b.block_id for b in all_blocks) - skipped_ids
+
+    # every upstream block was yielded before and is not skipped
+    seen = set()
+    for block, upstream in graph:
+        for b in upstream:
+            assert b.block_id in seen
+        seen.add(block.block_id)
+
+    # conflicting blocks that were not skipped are still ordered
+    position = { b.block_id: i for i, (b, _) in enumerate(graph) }
+    ancestors = {}
+    for block, upstream in graph:
+        ancestors[block.block_id] = set()
+        for b in upstream:
+            ancestors[block.block_id] |= ancestors[b.block_id] | {b.block_id}
+    for block, _ in graph:
+        for other, _ in graph:
+            if position[other.block_id] < position[block.block_id] and \
+                    conflict(block, other):
+                assert other.block_id in ancestors[block.block_id]
+
+def test_unknown_level_strategy():
+
+    total_roi = daisy.Roi((0,), (100,))
+    read_roi = daisy.Roi((0,), (20,))
+    write_roi = daisy.Roi((5,), (10,))
+
+    try:
+        daisy.create_dependency_graph(
+            total_roi,
+            read_roi,
+            write_roi,
+            level_strategy='unknown')
+        assert False, "unknown level strategy did not raise"
+    except RuntimeError:
+        pass
+
+if __name__ == "__main__":
+    test_coloring_levels()
+    test_coloring_skip()
+    test_unknown_level_strategy()
@@ -0,0 +1,177 @@
+import daisy
+import logging
+import os
+import random
+import shutil
+import tempfile
+from daisy.blocks import iterate_dependency_levels
+from daisy.dask_scheduler import get_num_check_threads
+
+logging.basicConfig(level=logging.INFO)
+
+total_roi = daisy.Roi((0, 0), (100, 100))
+read_roi = daisy.Roi((0, 0), (10, 10))
+write_roi = daisy.Roi((3, 3), (2, 2))
+
+def get_ancestors(graph):
+
+    ancestors = {}
+    for block, upstream_blocks in graph:
+        a = set()
+        for b in upstream_blocks:
+            a.add(b.block_id)
+            a |= ancestors[b.block_id]
+        ancestors[block.block_id] = a
+
+    return ancestors
+
+def test_skip_function():
+
+    random.seed(42)
+
+    graph = daisy.create_dependency_graph(total_roi, read_roi, write_roi)
+    ancestors = get_ancestors(graph)
+
+    skipped_ids = set(
+        block.block_id
+        for block, _ in graph
+        if random.random() < 0.5)
+
+    def skip_function(blocks):
+        return [ i in skipped_ids for i in blocks.block_ids ]
+
+    pruned_graph = [
+        block
+        for _, level_blocks in iterate_dependency_levels(
+            total_roi,
+            read_roi,
+            write_roi,
+            skip_function=skip_function)
+        for block in level_blocks
+    ]
+    pruned_ancestors = get_ancestors(pruned_graph)
+
+    assert set(pruned_ancestors.keys()) == (
+        set(ancestors.keys()) - skipped_ids)
+
+    # all dependencies between not skipped blocks are preserved
+    for block_id, a in pruned_ancestors.items():
+        assert a == ancestors[block_id] - skipped_ids
+
+def process_mark_done(block):
+
+    with open(os.path.join(test_dir, '%d'%block.block_id), 'a') as f:
+        f.write('x')
+
+def process_fail_some(block):
+
+    if block.block_id%3 == 0:
+        raise RuntimeError("Failing on purpose")
+    process_mark_done(block)
+
+test_dir = None
+
+def test_completion_file():
+
+    global test_dir
+    test_dir = tempfile.mkdtemp()
+    completion_file = os.path.join(test_dir, 'completed.bitmap')
+
+    try:
+
+        assert not daisy.run_blockwise(
+            total_roi,
+            read_roi,
+            write_roi,
+            process_fail_some,
+            num_workers=2,
+            scheduler='local',
+            completion_file=completion_file)
+
+        assert daisy.run_blockwise(
+            total_roi,
+            read_roi,
+            write_roi,
+            process_mark_done,
+            num_workers=2,
+            scheduler='local',
+            completion_file=completion_file)
+
+        graph = daisy.create_dependency_graph(total_roi, read_roi, write_roi)
+
+        # every block was processed exactly once
+        for block, _ in graph:
+            with open(os.path.join(test_dir, '%d'%block.block_id)) as f:
+                assert f.read() == 'x'
+
+        bitmap = daisy.CompletionBitmap(
+            completion_file,
+            daisy.BlockGrid(total_roi, read_roi, write_roi).num_block_ids())
+        assert bitmap.num_completed() == len(graph)
+
+    finally:
+        shutil.rmtree(test_dir)
+
+def test_batch_check_function():
+
+    global test_dir
+    test_dir = tempfile.mkdtemp()
+
+    graph = daisy.create_dependency_graph(total_roi, read_roi, write_roi)
+    done_ids = set(b.block_id for b, _ in graph if b.block_id%2 == 0)
+
+    checked_batches = []
+
+    def batch_check(blocks):
+        assert len(blocks) <= 10
+        checked_batches.append(len(blocks))
+        return [ i in done_ids for i in blocks.block_ids ]
+
+    try:
+
+        assert daisy.run_blockwise(
+            total_roi,
+            read_roi,
+            write_roi,
+            process_mark_done,
+            num_workers=2,
+            scheduler='local',
+            processes=False,
+            batch_check_function=batch_check,
+            batch_size=10)
+
+        assert sum(checked_batches) == len(graph)
+
+        # only blocks that were not done were processed
+        for block, _ in graph:
+            processed = os.path.exists(
+                os.path.join(test_dir, '%d'%block.block_id))
+            assert processed == (block.block_id not in done_ids)
+
+    finally:
+        shutil.rmtree(test_dir)
+
+class ThreadsClient(object):
+
+    def nthreads(self):
+        return { 'worker-0': 2, 'worker-1': 4 }
+
+def test_num_check_threads():
+
+    assert get_num_check_threads(3) == 3
+    assert get_num_check_threads(None) == (os.cpu_count() or 1)
+
+    # the size of the executor or the client, if no number of workers is
+    # given
+    executor = daisy.Executor(scheduler='local', num_workers=5)
+    assert get_num_check_threads(None, executor=executor) == 5
+    assert get_num_check_threads(None, client=ThreadsClient()) == 6
+    assert get_num_check_threads(
+        None,
+        executor=daisy.Executor(client=ThreadsClient())) == 6
+
+if __name__ == "__main__":
+    test_skip_function()
+    test_completion_file()
+    test_batch_check_function()
+    test_num_check_threads()
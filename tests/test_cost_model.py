@@ -0,0 +1,112 @@
+import daisy
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from daisy.cost_model import pack_tasks
+
+logging.basicConfig(level=logging.INFO)
+
+total_roi = daisy.Roi((0, 0), (100, 100))
+read_roi = daisy.Roi((0, 0), (20, 20))
+write_roi = daisy.Roi((5, 5), (10, 10))
+
+lock = threading.Lock()
+order = []
+
+def process(block):
+
+    # blocks take 0, 50, or 100ms
+    time.sleep((block.block_id%3)*0.05)
+    with lock:
+        order.append(block.block_id)
+
+def test_cost_model_run():
+
+    test_dir = tempfile.mkdtemp()
+    filename = os.path.join(test_dir, 'costs.npz')
+
+    try:
+
+        for _ in range(2):
+
+            order.clear()
+
+            # the durations recorded in the previous run
+            costs = daisy.CostModel(filename)
+
+            assert daisy.run_blockwise(
+                daisy.Roi((0, 0), (50, 50)),
+                read_roi,
+                write_roi,
+                process,
+                read_write_conflict=False,
+                num_workers=1,
+                processes=False,
+                scheduler='local',
+                cost_model=daisy.CostModel(filename))
+
+        # the second run started the slowest blocks of the first run first
+        durations = [ costs.get_duration(block_id) for block_id in order ]
+        assert durations == sorted(durations, reverse=True)
+
+        cost_model = daisy.CostModel(filename)
+        assert len(cost_model.block_ids) == len(order)
+
+    finally:
+        shutil.rmtree(test_dir)
+
+def test_proxy():
+
+    cost_model = daisy.CostModel()
+
+    small = daisy.Block(
+        total_roi,
+        daisy.Roi((0, 0), (10, 10)),
+        daisy.Roi((0, 0), (10, 10)),
+        block_id=0)
+    large = daisy.Block(
+        total_roi,
+        daisy.Roi((0, 0), (20, 20)),
+        daisy.Roi((0, 0), (20, 20)),
+        block_id=1)
+    assert cost_model(small) == 100
+    assert cost_model(large) == 400
+
+    # proxy costs are scaled by the recorded durations
+    cost_model.add_block(small)
+    cost_model.finish_block(
+        small.block_id,
+        1,
+        { 'start': 0.0, 'end': 2.0 })
+    assert cost_model(small) == 2.0
+    assert cost_model(large) == 8.0
+
+def test_pack_tasks():
+
+    costs = { i: float(i) for i in range(20) }
+    blocks = [
+        (daisy.Block(total_roi, read_roi, write_roi, block_id=i), [])
+        for i in range(20)
+    ]
+
+    tasks = list(pack_tasks(
+        blocks,
+        3,
+        lambda block: costs[block.block_id]))
+
+    assert len(tasks) == 7
+    assert sorted(b.block_id for task in tasks for b, _ in task) == list(
+        range(20))
+    assert all(len(task) <= 3 for task in tasks)
+
+    task_costs = [ sum(costs[b.block_id] for b, _ in task) for task in tasks ]
+    assert task_costs == sorted(task_costs, reverse=True)
+    assert max(task_costs) - min(task_costs) <= max(costs.values())
+
+if __name__ == "__main__":
+    test_cost_model_run()
+    test_proxy()
+    test_pack_tasks()
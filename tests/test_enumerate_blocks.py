@@ -0,0 +1,224 @@
+import daisy
+import logging
+import numpy as np
+from daisy.blocks import (
+    compute_level_offsets,
+    compute_level_stride,
+    enumerate_blocks,
+    fit_block_rois,
+    get_conflict_offsets)
+from itertools import product
+
+logging.basicConfig(level=logging.INFO)
+
+def baseline_fit(total_roi, block, fit):
+    '''Scalar inclusion and fitting of a single block, as done before block
+    enumeration was vectorized. Returns the fitted block, or ``None``.'''
+
+    if fit == 'valid':
+        if not total_roi.contains(block.read_roi):
+            return None
+        return block
+
+    if not total_roi.contains(block.write_roi.get_begin()):
+        return None
+
+    if fit == 'overhang':
+        return block
+
+    r = total_roi.intersect(block.read_roi)
+    w = block.write_roi.grow(
+        block.read_roi.get_begin() - r.get_begin(),
+        r.get_end() - block.read_roi.get_end())
+    if not all(s > 0 for s in w.get_shape()):
+        return None
+
+    block.read_roi = r
+    block.write_roi = w
+    return block
+
+def baseline_graph(total_roi, read_roi, write_roi, fit):
+    '''The dependency graph as enumerated block by block before block
+    enumeration was vectorized.'''
+
+    level_stride = compute_level_stride(read_roi, write_roi)
+    level_offsets = compute_level_offsets(write_roi, level_stride)
+    global_offset = total_roi.get_begin() - read_roi.get_begin()
+
+    graph = []
+    prev_level_offset = None
+
+    for level_offset in level_offsets:
+
+        if prev_level_offset is not None:
+            conflict_offsets = get_conflict_offsets(
+                level_offset,
+                prev_level_offset,
+                level_stride)
+        else:
+            conflict_offsets = []
+        prev_level_offset = level_offset
+
+        for o in product(*[
+                range(lo, e, s)
+                for lo, e, s in zip(
+                    level_offset,
+                    total_roi.get_shape(),
+                    level_stride)]):
+
+            offset = daisy.Coordinate(o) + global_offset
+            block = baseline_fit(
+                total_roi,
+                daisy.Block(total_roi, read_roi + offset, write_roi + offset),
+                fit)
+            if block is None:
+                continue
+
+            conflicts = []
+            for conflict_offset in conflict_offsets:
+                conflict = baseline_fit(
+                    total_roi,
+                    daisy.Block(
+                        total_roi,
+                        read_roi + offset + conflict_offset,
+                        write_roi + offset + conflict_offset),
+                    fit)
+                if conflict is not None:
+                    conflicts.append(conflict)
+
+            graph.append((block, conflicts))
+
+    return graph
+
+def as_dict(graph):
+
+    return {
+        block.block_id: (
+            block.read_roi,
+            block.write_roi,
+            sorted(
+                (b.block_id, b.read_roi, b.write_roi)
+                for b in upstream))
+        for block, upstream in graph
+    }
+
+def test_enumerate_blocks():
+
+    # total ROIs with non-zero offsets, that are not tiled by the write ROI
+    for total_roi, read_roi, write_roi in [
+            (
+                daisy.Roi((7,), (53,)),
+                daisy.Roi((0,), (10,)),
+                daisy.Roi((2,), (6,))),
+            (
+                daisy.Roi((-13, 4), (97, 61)),
+                daisy.Roi((0, 0), (20, 20)),
+                daisy.Roi((5, 5), (10, 10))),
+            (
+                daisy.Roi((3, -5, 11), (40, 33, 29)),
+                daisy.Roi((0, 0, 0), (12, 10, 8)),
+                daisy.Roi((3, 2, 1), (5, 4, 6)))]:
+
+        for fit in ['valid', 'overhang', 'shrink']:
+
+            graph = daisy.create_dependency_graph(
+                total_roi,
+                read_roi,
+                write_roi,
+                fit=fit)
+
+            assert len(graph) > 0
+            assert as_dict(graph) == as_dict(
+                baseline_graph(total_roi, read_roi, write_roi, fit))
+
+def test_fit_block_rois():
+
+    total_roi = daisy.Roi((7, -3), (53, 41))
+    read_roi = daisy.Roi((0, 0), (10, 10))
+    write_roi = daisy.Roi((2, 2), (6, 6))
+
+    # offsets on the block grid, including blocks before and after the total
+    # ROI
+    global_offset = total_roi.get_begin() - read_roi.get_begin()
+    block_offsets = np.array([
+        global_offset + daisy.Coordinate((i*6, j*6))
+        for i in range(-2, 11)
+        for j in range(-2, 9)
+    ], dtype=np.int64)
+
+    for fit in ['valid', 'overhang', 'shrink']:
+
+        blocks, included = fit_block_rois(
+            total_roi,
+            read_roi,
+            write_roi,
+            block_offsets,
+            fit)
+
+        for i, offset in enumerate(block_offsets):
+
+            offset = daisy.Coordinate(offset)
+            block = daisy.Block(
+                total_roi,
+                read_roi + offset,
+                write_roi + offset)
+            requested_id = block.block_id
+            expected = baseline_fit(total_roi, block, fit)
+
+            # blocks starting before the total ROI are not part of the grid
+            if any(o < 0 for o in offset - global_offset):
+                assert not included[i]
+                continue
+
+            assert included[i] == (expected is not None), (fit, offset)
+            if expected is None:
+                continue
+
+            assert blocks.block_ids[i] == requested_id
+            assert blocks[i].read_roi == expected.read_roi
+            assert blocks[i].write_roi == expected.write_roi
+
+def test_shrink_edge():
+
+    read_roi = daisy.Roi((0,), (10,))
+    write_roi = daisy.Roi((3,), (4,))
+    block_offsets = [ (o,) for o in range(5, 29, 4) ]
+
+    # the write ROI of the last block starts inside the total ROI, but is
+    # empty after shrinking (by more than its size, or by exactly its size)
+    for total_roi, last_write_roi in [
+            (daisy.Roi((5,), (24,)), daisy.Roi((24,), (2,))),
+            (daisy.Roi((5,), (26,)), daisy.Roi((24,), (4,)))]:
+
+        graph = list(enumerate_blocks(
+            total_roi,
+            read_roi,
+            write_roi,
+            [],
+            block_offsets,
+            'shrink'))
+
+        expected = [
+            baseline_fit(
+                total_roi,
+                daisy.Block(
+                    total_roi,
+                    read_roi + daisy.Coordinate(o),
+                    write_roi + daisy.Coordinate(o)),
+                'shrink')
+            for o in block_offsets
+        ]
+        expected = [ b for b in expected if b is not None ]
+
+        assert len(expected) == len(block_offsets) - 1
+        assert [
+            (b.block_id, b.read_roi, b.write_roi) for b, _ in graph
+        ] == [
+            (b.block_id, b.read_roi, b.write_roi) for b in expected
+        ]
+        assert graph[-1][0].write_roi == last_write_roi
+
+if __name__ == "__main__":
+    test_enumerate_blocks()
+    test_fit_block_rois()
+    test_shrink_edge()
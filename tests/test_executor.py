@@ -0,0 +1,95 @@
+import daisy
+import logging
+import os
+import threading
+
+logging.basicConfig(level=logging.INFO)
+
+total_roi = daisy.Roi((0, 0), (100, 100))
+read_roi = daisy.Roi((0, 0), (20, 20))
+write_roi = daisy.Roi((5, 5), (10, 10))
+
+lock = threading.Lock()
+
+def test_local_executor_threads():
+
+    workers = set()
+
+    def process(block):
+        with lock:
+            workers.add(threading.current_thread().ident)
+
+    with daisy.Executor(
+            scheduler='local',
+            num_workers=2,
+            processes=False) as executor:
+
+        for _ in range(3):
+            assert daisy.run_blockwise(
+                total_roi,
+                read_roi,
+                write_roi,
+                process,
+                executor=executor)
+
+    # the same two workers were used for all runs
+    assert len(workers) == 2
+
+def test_local_executor_processes():
+
+    pids = set()
+
+    with daisy.Executor(scheduler='local', num_workers=2) as executor:
+
+        for _ in range(2):
+
+            # closures are sent to the worker processes, and the state is
+            # created by the process running the blocks
+            assert daisy.run_blockwise(
+                total_roi,
+                read_roi,
+                write_roi,
+                lambda block, pid: 1/int(pid == os.getpid()),
+                executor=executor,
+                init_function=lambda: os.getpid())
+
+            pids |= set(w.worker.pid for w in executor.pool.workers)
+
+    # the same two worker processes were used for all runs
+    assert len(pids) == 2
+
+def test_local_executor_late_results():
+
+    graph = daisy.create_dependency_graph(total_roi, read_roi, write_roi)
+    block_id = graph[0][0].block_id
+
+    with daisy.Executor(
+            scheduler='local',
+            num_workers=2,
+            processes=False) as executor:
+
+        assert daisy.run_blockwise(
+            total_roi,
+            read_roi,
+            write_roi,
+            lambda b: None,
+            executor=executor)
+
+        # a late failure of the previous run is not credited to the same
+        # block of the next run
+        pool = executor.pool
+        pool.result_queue.put((
+            pool.run_id, 0, pool.workers[0].generation, block_id, -2, None,
+            None))
+
+        assert daisy.run_blockwise(
+            total_roi,
+            read_roi,
+            write_roi,
+            lambda b: None,
+            executor=executor)
+
+if __name__ == "__main__":
+    test_local_executor_threads()
+    test_local_executor_processes()
+    test_local_executor_late_results()
@@ -0,0 +1,45 @@
+import daisy
+import logging
+
+logging.basicConfig(level=logging.INFO)
+
+def test_lazy():
+
+    total_roi = daisy.Roi((0, 0), (100, 100))
+    read_roi = daisy.Roi((0, 0), (20, 20))
+    write_roi = daisy.Roi((5, 5), (10, 10))
+
+    for fit in ['valid', 'overhang', 'shrink']:
+
+        graph = daisy.create_dependency_graph(
+            total_roi,
+            read_roi,
+            write_roi,
+            fit=fit)
+
+        lazy_graph = daisy.create_dependency_graph(
+            total_roi,
+            read_roi,
+            write_roi,
+            fit=fit,
+            lazy=True)
+
+        seen = set()
+        for (block, upstream), (lazy_block, lazy_upstream) in zip(
+                graph, lazy_graph):
+
+            assert block.block_id == lazy_block.block_id
+            assert block.write_roi == lazy_block.write_roi
+            assert (
+                [b.block_id for b in upstream] ==
+                [b.block_id for b in lazy_upstream])
+
+            # upstream blocks are yielded before their downstream blocks
+            for b in lazy_upstream:
+                assert b.block_id in seen
+            seen.add(lazy_block.block_id)
+
+        assert len(seen) == len(graph)
+
+if __name__ == "__main__":
+    test_lazy()
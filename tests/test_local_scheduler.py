@@ -0,0 +1,378 @@
+import daisy
+import logging
+import os
+import pytest
+import random
+import shutil
+import tempfile
+import threading
+import time
+
+logging.basicConfig(level=logging.INFO)
+
+total_roi = daisy.Roi((0, 0), (100, 100))
+read_roi = daisy.Roi((0, 0), (20, 20))
+write_roi = daisy.Roi((5, 5), (10, 10))
+
+lock = threading.Lock()
+intervals = {}
+
+def process_threaded(block):
+
+    start = time.time()
+    time.sleep(random.random()*0.01)
+    with lock:
+        intervals[block.block_id] = (start, time.time())
+
+def test_local_threads():
+
+    check_local_threads(blocks_per_task=1)
+
+def test_local_threads_fused():
+
+    check_local_threads(blocks_per_task=3)
+
+def check_local_threads(blocks_per_task):
+
+    intervals.clear()
+
+    assert daisy.run_blockwise(
+        total_roi,
+        read_roi,
+        write_roi,
+        process_threaded,
+        num_workers=4,
+        processes=False,
+        scheduler='local',
+        blocks_per_task=blocks_per_task)
+
+    graph = daisy.create_dependency_graph(total_roi, read_roi, write_roi)
+    assert len(intervals) == len(graph)
+
+    # no block started before its upstream blocks finished
+    for block, upstream_blocks in graph:
+        for upstream_block in upstream_blocks:
+            assert (
+                intervals[upstream_block.block_id][1] <=
+                intervals[block.block_id][0])
+
+def process_mark_done(block):
+
+    with open(os.path.join(test_dir, '%d'%block.block_id), 'w'):
+        pass
+
+def process_fail_even(block):
+
+    if block.block_id%2 == 0:
+        raise RuntimeError("Failing on purpose")
+    process_mark_done(block)
+
+def check_done(block):
+
+    return os.path.exists(os.path.join(test_dir, '%d'%block.block_id))
+
+test_dir = None
+
+def test_local_processes():
+
+    global test_dir
+    test_dir = tempfile.mkdtemp()
+
+    try:
+
+        # half of the blocks fail
+        assert not daisy.run_blockwise(
+            total_roi,
+            read_roi,
+            write_roi,
+            process_fail_even,
+            check_done,
+            num_workers=2,
+            scheduler='local')
+
+        num_done = len(os.listdir(test_dir))
+        assert num_done > 0
+
+        # the second run only processes the failed blocks
+        assert daisy.run_blockwise(
+            total_roi,
+            read_roi,
+            write_roi,
+            process_mark_done,
+            check_done,
+            num_workers=2,
+            scheduler='local')
+
+        graph = daisy.create_dependency_graph(total_roi, read_roi, write_roi)
+        assert len(os.listdir(test_dir)) == len(graph)
+
+    finally:
+        shutil.rmtree(test_dir)
+
+def test_local_init_function():
+
+    states = []
+    torn_down = []
+    processed = {}
+
+    def init():
+        state = { 'id': len(states) }
+        with lock:
+            states.append(state)
+        return state
+
+    def teardown(state):
+        with lock:
+            torn_down.append(state['id'])
+
+    def process(block, state):
+        with lock:
+            processed[block.block_id] = state['id']
+
+    assert daisy.run_blockwise(
+        total_roi,
+        read_roi,
+        write_roi,
+        process,
+        num_workers=3,
+        processes=False,
+        scheduler='local',
+        init_function=init,
+        teardown_function=teardown)
+
+    graph = daisy.create_dependency_graph(total_roi, read_roi, write_roi)
+
+    # one state per worker, passed to every block, torn down at the end
+    assert len(states) == 3
+    assert len(processed) == len(graph)
+    assert set(processed.values()) <= set(range(3))
+    assert sorted(torn_down) == [0, 1, 2]
+
+def test_local_memory_budget():
+
+    # read_write_conflict=False, such that all blocks could run in parallel
+    for budget, max_expected in [(2*400*4, 2), (100, 1)]:
+
+        intervals.clear()
+
+        assert daisy.run_blockwise(
+            total_roi,
+            read_roi,
+            write_roi,
+            process_threaded,
+            read_write_conflict=False,
+            num_workers=4,
+            processes=False,
+            scheduler='local',
+            memory_budget=budget,
+            memory_estimator=daisy.MemoryEstimator(dtype='float32'))
+
+        graph = daisy.create_dependency_graph(
+            total_roi,
+            read_roi,
+            write_roi,
+            read_write_conflict=False)
+        assert len(intervals) == len(graph)
+
+        # at no time more than max_expected blocks ran in parallel
+        events = sorted(
+            [ (start, 1) for start, _ in intervals.values() ] +
+            [ (end, -1) for _, end in intervals.values() ])
+        running = 0
+        for _, change in events:
+            running += change
+            assert running <= max_expected
+
+def process_hang_once(block):
+
+    started = os.path.join(test_dir, 'started_%d'%block.block_id)
+
+    # the first attempt of block 0 hangs
+    if block.block_id == 0 and not os.path.exists(started):
+        open(started, 'w').close()
+        time.sleep(60)
+
+    process_mark_done(block)
+
+def process_hang(block):
+
+    if block.block_id == 0:
+        time.sleep(60)
+
+    process_mark_done(block)
+
+def test_local_timeout():
+
+    global test_dir
+
+    graph = daisy.create_dependency_graph(total_roi, read_roi, write_roi)
+
+    for process, timeout_retries, expected_failed in [
+            (process_hang_once, 1, []),
+            (process_hang, 0, [0])]:
+
+        test_dir = tempfile.mkdtemp()
+
+        try:
+
+            start = time.time()
+
+            report = daisy.RunReport()
+            result = daisy.run_blockwise(
+                total_roi,
+                read_roi,
+                write_roi,
+                process,
+                check_done,
+                num_workers=2,
+                scheduler='local',
+                report=report,
+                block_timeout=1,
+                timeout_retries=timeout_retries)
+
+            # the hanging worker was killed
+            assert time.time() - start < 30
+            assert result == (len(expected_failed) == 0)
+            assert report.num_blocks(-2) == len(expected_failed)
+
+            # all other blocks were processed
+            for block, _ in graph:
+                assert check_done(block) == (
+                    block.block_id not in expected_failed)
+
+        finally:
+            shutil.rmtree(test_dir)
+
+race_block_id = None
+
+def process_slow_retry(block):
+
+    attempt = len([
+        f for f in os.listdir(test_dir)
+        if f.startswith('started_%d_'%block.block_id)
+    ])
+    with open(
+            os.path.join(test_dir, 'started_%d_%d'%(block.block_id, attempt)),
+            'w') as f:
+        f.write(repr(time.time()))
+
+    # the first attempt of the block times out and would finish before its
+    # retry, the retry times out as well
+    if block.block_id == race_block_id:
+        time.sleep(1.5 if attempt == 0 else 3)
+
+    process_mark_done(block)
+
+def test_local_timeout_race():
+
+    global test_dir
+    global race_block_id
+
+    total_roi = daisy.Roi((0,), (40,))
+    read_roi = daisy.Roi((0,), (20,))
+    write_roi = daisy.Roi((5,), (10,))
+
+    graph = daisy.create_dependency_graph(total_roi, read_roi, write_roi)
+    race_block_id = next(
+        upstream[0].block_id for _, upstream in graph if upstream)
+    downstream = [
+        block.block_id
+        for block, upstream in graph
+        if race_block_id in [ b.block_id for b in upstream ]
+    ]
+
+    test_dir = tempfile.mkdtemp()
+
+    try:
+
+        report = daisy.RunReport()
+        assert not daisy.run_blockwise(
+            total_roi,
+            read_roi,
+            write_roi,
+            process_slow_retry,
+            check_done,
+            num_workers=2,
+            scheduler='local',
+            report=report,
+            block_timeout=1.0,
+            timeout_retries=1)
+
+        def started(block_id, attempt):
+            with open(os.path.join(
+                    test_dir,
+                    'started_%d_%d'%(block_id, attempt))) as f:
+                return float(f.read())
+
+        # the late result of the first attempt was not taken for the one of
+        # the retry, downstream blocks started after the retry timed out
+        assert report.num_blocks(-2) == 1
+        retry_timeout = started(race_block_id, 1) + 1.0
+        for block_id in downstream:
+            assert started(block_id, 0) >= retry_timeout
+
+    finally:
+        shutil.rmtree(test_dir)
+
+    # worker threads can not be stopped
+    with pytest.raises(RuntimeError):
+        daisy.run_blockwise(
+            total_roi,
+            read_roi,
+            write_roi,
+            process_slow_retry,
+            processes=False,
+            scheduler='local',
+            block_timeout=1.0)
+
+exit_block_id = None
+
+def process_exit_once(block):
+
+    if block.block_id == exit_block_id:
+        os._exit(1)
+    time.sleep(0.05)
+
+def test_local_dead_worker():
+
+    global exit_block_id
+
+    graph = daisy.create_dependency_graph(
+        total_roi,
+        read_roi,
+        write_roi,
+        read_write_conflict=False)
+    exit_block_id = graph[0][0].block_id
+
+    finished = {}
+
+    def record(event):
+        if event['type'] == 'finished':
+            finished[event['block_id']] = (time.time(), event['status'])
+
+    assert not daisy.run_blockwise(
+        total_roi,
+        read_roi,
+        write_roi,
+        process_exit_once,
+        read_write_conflict=False,
+        num_workers=2,
+        scheduler='local',
+        progress=daisy.Progress(block_callback=record))
+
+    assert len(finished) == len(graph)
+    assert finished[exit_block_id][1] == -2
+
+    # the dead worker was noticed while the other worker kept reporting
+    last_finished = max(t for t, _ in finished.values())
+    assert finished[exit_block_id][0] < last_finished - 1
+
+if __name__ == "__main__":
+    test_local_threads()
+    test_local_threads_fused()
+    test_local_processes()
+    test_local_init_function()
+    test_local_memory_budget()
+    test_local_timeout()
+    test_local_timeout_race()
+    test_local_dead_worker()
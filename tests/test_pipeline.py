@@ -0,0 +1,89 @@
+import daisy
+import logging
+import threading
+import time
+
+logging.basicConfig(level=logging.INFO)
+
+total_roi = daisy.Roi((0, 0), (100, 100))
+
+lock = threading.Lock()
+intervals = {}
+
+def record(stage):
+
+    def process(block):
+        start = time.time()
+        # a straggler in each stage
+        time.sleep(0.5 if block.block_id == 0 else 0.005)
+        with lock:
+            intervals[(stage, block.block_id)] = (start, time.time())
+
+    return process
+
+def test_pipeline():
+
+    intervals.clear()
+
+    stages = [
+        ('a', daisy.Roi((0, 0), (10, 10)), daisy.Roi((0, 0), (10, 10))),
+        ('b', daisy.Roi((0, 0), (20, 20)), daisy.Roi((5, 5), (10, 10))),
+        ('c', daisy.Roi((0, 0), (30, 30)), daisy.Roi((10, 10), (10, 10)))
+    ]
+
+    pipeline = daisy.Pipeline()
+    for name, read_roi, write_roi in stages:
+        pipeline.add_stage(
+            name,
+            total_roi,
+            read_roi,
+            write_roi,
+            record(name),
+            read_write_conflict=(name != 'a'))
+
+    assert pipeline.run(
+        num_workers=4,
+        processes=False,
+        scheduler='local')
+
+    graphs = {
+        name: daisy.create_dependency_graph(
+            total_roi,
+            read_roi,
+            write_roi,
+            read_write_conflict=(name != 'a'))
+        for name, read_roi, write_roi in stages
+    }
+
+    for name, graph in graphs.items():
+        assert len([k for k in intervals if k[0] == name]) == len(graph)
+
+    for (name, _, _), (upstream_name, _, _) in [
+            (stages[1], stages[0]),
+            (stages[2], stages[1])]:
+
+        for block, upstream_blocks in graphs[name]:
+
+            start = intervals[(name, block.block_id)][0]
+
+            # dependencies within the stage
+            for b in upstream_blocks:
+                assert intervals[(name, b.block_id)][1] <= start
+
+            # dependencies to the upstream stage
+            for b, _ in graphs[upstream_name]:
+                if b.write_roi.intersects(block.read_roi):
+                    assert intervals[(upstream_name, b.block_id)][1] <= start
+
+        # no barrier between stages, blocks of the next stage don't wait for
+        # the straggler
+        first_start = min(
+            intervals[(name, b.block_id)][0]
+            for b, _ in graphs[name])
+        last_upstream_end = max(
+            intervals[(upstream_name, b.block_id)][1]
+            for b, _ in graphs[upstream_name])
+        assert first_start < last_upstream_end
+
+if __name__ == "__main__":
+    test_pipeline()
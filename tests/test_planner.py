@@ -0,0 +1,92 @@
+import daisy
+import logging
+from daisy.blocks import iterate_dependency_levels
+
+logging.basicConfig(level=logging.INFO)
+
+def check_plan(total_roi, read_roi, write_roi, level_strategy):
+
+    for fit in ['valid', 'overhang', 'shrink']:
+        for read_write_conflict in [True, False]:
+
+            plan = daisy.plan(
+                total_roi,
+                read_roi,
+                write_roi,
+                fit,
+                read_write_conflict,
+                bytes_per_voxel=4,
+                level_strategy=level_strategy)
+
+            blocks_per_level = []
+            voxels_read = 0
+            voxels_written = 0
+            for _, level_blocks in iterate_dependency_levels(
+                    total_roi,
+                    read_roi,
+                    write_roi,
+                    read_write_conflict,
+                    fit,
+                    level_strategy=level_strategy):
+                level_blocks = list(level_blocks)
+                blocks_per_level.append(len(level_blocks))
+                for block, _ in level_blocks:
+                    voxels_read += block.read_roi.size()
+                    voxels_written += block.write_roi.size()
+
+            assert plan.blocks_per_level == blocks_per_level
+            assert plan.num_blocks == sum(blocks_per_level)
+            assert plan.max_parallelism == max(blocks_per_level)
+            assert plan.voxels_read == voxels_read
+            assert plan.voxels_written == voxels_written
+            assert plan.bytes_read == 4*voxels_read
+
+            for suggestion in plan.suggestions:
+                assert (
+                    suggestion['num_levels'] < plan.num_levels or
+                    suggestion['read_amplification'] <
+                    plan.read_amplification)
+
+cases = [
+    (
+        daisy.Roi((3, 0), (97, 103)),
+        daisy.Roi((0, 0), (20, 20)),
+        daisy.Roi((5, 5), (10, 10))
+    ),
+    (
+        daisy.Roi((0, 0, 0), (50, 60, 70)),
+        daisy.Roi((-2, 0, 0), (12, 14, 9)),
+        daisy.Roi((0, 2, 1), (6, 7, 5))
+    ),
+    # context only at the end of the write ROI
+    (
+        daisy.Roi((0, 0), (61, 47)),
+        daisy.Roi((0, 0), (12, 12)),
+        daisy.Roi((0, 0), (10, 10))
+    )
+]
+
+def test_plan():
+
+    for total_roi, read_roi, write_roi in cases:
+        check_plan(total_roi, read_roi, write_roi, 'stride')
+
+def test_plan_coloring():
+
+    for total_roi, read_roi, write_roi in cases:
+        check_plan(total_roi, read_roi, write_roi, 'coloring')
+
+    # the coloring needs fewer levels for asymmetric contexts
+    total_roi, read_roi, write_roi = cases[-1]
+    assert daisy.plan(
+        total_roi,
+        read_roi,
+        write_roi,
+        level_strategy='coloring').num_levels < daisy.plan(
+            total_roi,
+            read_roi,
+            write_roi).num_levels
+
+if __name__ == "__main__":
+    test_plan()
+    test_plan_coloring()
@@ -0,0 +1,103 @@
+import daisy
+import logging
+import numpy as np
+import threading
+
+logging.basicConfig(level=logging.INFO)
+
+total_roi = daisy.Roi((0, 0), (100, 100))
+read_roi = daisy.Roi((0, 0), (20, 20))
+write_roi = daisy.Roi((5, 5), (10, 10))
+
+lock = threading.Lock()
+order = []
+
+def process(block):
+
+    with lock:
+        order.append(block.block_id)
+
+def test_priority_independent():
+
+    order.clear()
+
+    # a single worker, such that blocks run in the order they are handed out
+    assert daisy.run_blockwise(
+        total_roi,
+        read_roi,
+        write_roi,
+        process,
+        read_write_conflict=False,
+        num_workers=1,
+        processes=False,
+        scheduler='local',
+        priority_function=lambda b: b.block_id)
+
+    assert order == sorted(order, reverse=True)
+
+def test_priority_dependencies():
+
+    order.clear()
+
+    assert daisy.run_blockwise(
+        total_roi,
+        read_roi,
+        write_roi,
+        process,
+        num_workers=1,
+        processes=False,
+        scheduler='local',
+        priority_function=lambda b: -b.block_id)
+
+    graph = daisy.create_dependency_graph(total_roi, read_roi, write_roi)
+    assert sorted(order) == sorted(b.block_id for b, _ in graph)
+
+    # no block ran before its upstream blocks
+    position = { block_id: i for i, block_id in enumerate(order) }
+    for block, upstream_blocks in graph:
+        for upstream_block in upstream_blocks:
+            assert position[upstream_block.block_id] < position[block.block_id]
+
+def test_priority_dict():
+
+    order.clear()
+
+    assert daisy.run_blockwise(
+        total_roi,
+        read_roi,
+        write_roi,
+        process,
+        read_write_conflict=False,
+        num_workers=1,
+        processes=False,
+        scheduler='local',
+        priority_function={ 7: 2, 3: 1 })
+
+    assert order[:2] == [7, 3]
+
+def test_cost_map():
+
+    costs = np.zeros((10, 10), dtype=np.float32)
+    costs[2, 3] = 1.5
+    costs[2, 4] = 2.0
+    costs = daisy.Array(costs, total_roi, (10, 10))
+
+    priority = daisy.Priority(costs)
+
+    block = daisy.Block(
+        total_roi,
+        daisy.Roi((20, 30), (20, 20)),
+        daisy.Roi((25, 35), (10, 10)))
+    assert priority(block) == 3.5
+
+    block = daisy.Block(
+        total_roi,
+        daisy.Roi((50, 50), (20, 20)),
+        daisy.Roi((55, 55), (10, 10)))
+    assert priority(block) == 0
+
+if __name__ == "__main__":
+    test_priority_independent()
+    test_priority_dependencies()
+    test_priority_dict()
+    test_cost_map()
@@ -0,0 +1,198 @@
+import daisy
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+logging.basicConfig(level=logging.INFO)
+
+total_roi = daisy.Roi((0, 0), (100, 100))
+read_roi = daisy.Roi((0, 0), (20, 20))
+write_roi = daisy.Roi((5, 5), (10, 10))
+
+def process(block):
+
+    time.sleep(0.001)
+
+def test_progress():
+
+    graph = daisy.create_dependency_graph(total_roi, read_roi, write_roi)
+
+    events = []
+    snapshots = []
+    progress = daisy.Progress(
+        lambda p: snapshots.append(p.num_finished()),
+        interval=0,
+        block_callback=events.append)
+
+    assert daisy.run_blockwise(
+        total_roi,
+        read_roi,
+        write_roi,
+        process,
+        num_workers=2,
+        processes=False,
+        scheduler='local',
+        progress=progress)
+
+    assert progress.num_blocks() == len(graph)
+    assert progress.num_finished() == len(graph)
+    assert progress.num_finished(1) == len(graph)
+    assert progress.mean_duration() > 0
+    assert progress.eta() == 0
+
+    # one call per finished block, and one at the end
+    assert snapshots == list(range(1, len(graph) + 1)) + [len(graph)]
+
+    for event_type in ['added', 'submitted', 'finished']:
+        assert sorted(
+            e['block_id'] for e in events if e['type'] == event_type
+        ) == sorted(b.block_id for b, _ in graph)
+
+    # every block was added before it was submitted, and submitted before it
+    # finished
+    order = { (e['type'], e['block_id']): i for i, e in enumerate(events) }
+    for block, _ in graph:
+        assert (
+            order[('added', block.block_id)] <
+            order[('submitted', block.block_id)] <
+            order[('finished', block.block_id)])
+
+    levels = progress.level_progress()
+    assert len(levels) == 4
+    assert sum(n for n, _, _ in levels) == len(graph)
+    assert all(complete for _, _, complete in levels)
+
+def test_progress_cancel():
+
+    graph = daisy.create_dependency_graph(total_roi, read_roi, write_roi)
+
+    def cancel_early(progress):
+        if progress.num_finished() >= 10:
+            progress.cancel()
+
+    progress = daisy.Progress(cancel_early, interval=0)
+
+    assert not daisy.run_blockwise(
+        total_roi,
+        read_roi,
+        write_roi,
+        process,
+        num_workers=2,
+        processes=False,
+        scheduler='local',
+        progress=progress)
+
+    assert progress.cancelled
+    assert 10 <= progress.num_finished() < len(graph)
+
+def test_progress_eta():
+
+    blocks = [
+        daisy.Block(total_roi, read_roi, write_roi, block_id=i)
+        for i in range(10)
+    ]
+
+    for num_workers, expected_eta in [(2, 8.0), (None, 16.0)]:
+
+        progress = daisy.Progress()
+        progress.start(len(blocks), num_workers)
+        for block in blocks:
+            progress.add_block(block, 0)
+        assert progress.eta() is None
+
+        # blocks took 2s on average, one worker was busy over the last 4s
+        progress.start_time -= 4.0
+        progress.finish_block(0, 1, { 'start': 0.0, 'end': 1.0 })
+        progress.finish_block(1, 1, { 'start': 0.0, 'end': 3.0 })
+
+        assert progress.mean_duration() == 2.0
+        assert abs(progress.eta() - expected_eta) < 0.1
+
+    # fewer blocks remain than there are workers
+    progress = daisy.Progress()
+    progress.start(len(blocks), 8)
+    for block in blocks:
+        progress.add_block(block, 0)
+    for block in blocks[:8]:
+        progress.finish_block(
+            block.block_id,
+            1,
+            { 'start': 0.0, 'end': 2.0 })
+    assert progress.eta() == 2.0
+
+def test_progress_skipped_blocks():
+
+    large_roi = daisy.Roi((0, 0), (400, 400))
+    region = [daisy.Roi((0, 0), (40, 40))]
+
+    graph = daisy.create_dependency_graph(
+        large_roi,
+        read_roi,
+        write_roi,
+        region=region)
+
+    test_dir = tempfile.mkdtemp()
+    completion_file = os.path.join(test_dir, 'completed.bitmap')
+
+    try:
+
+        # only blocks in the region are expected, from the first block on
+        expected = []
+        etas = []
+
+        def record(progress):
+            expected.append(progress.num_blocks())
+            etas.append(progress.eta())
+
+        def fail_odd(block):
+            time.sleep(0.001)
+            if block.block_id%2 == 1:
+                raise RuntimeError("odd block")
+
+        progress = daisy.Progress(record, interval=0)
+        assert not daisy.run_blockwise(
+            large_roi,
+            read_roi,
+            write_roi,
+            fail_odd,
+            num_workers=2,
+            processes=False,
+            scheduler='local',
+            region=region,
+            completion_file=completion_file,
+            progress=progress)
+
+        assert expected == [len(graph)]*(len(graph) + 1)
+        assert all(eta < 1.0 for eta in etas)
+
+        # blocks completed in the previous run are not expected on resume
+        num_failed = progress.num_finished(-2)
+        assert 0 < num_failed < len(graph)
+
+        expected = []
+        etas = []
+        progress = daisy.Progress(record, interval=0)
+        assert daisy.run_blockwise(
+            large_roi,
+            read_roi,
+            write_roi,
+            process,
+            num_workers=2,
+            processes=False,
+            scheduler='local',
+            region=region,
+            completion_file=completion_file,
+            progress=progress)
+
+        assert expected == [num_failed]*(num_failed + 1)
+
+    finally:
+        shutil.rmtree(test_dir)
+
+if __name__ == "__main__":
+    test_progress()
+    test_progress_cancel()
+    test_progress_eta()
+    test_progress_skipped_blocks()
@@ -0,0 +1,116 @@
+import daisy
+import logging
+
+logging.basicConfig(level=logging.INFO)
+
+total_roi = daisy.Roi((0, 0), (100, 100))
+read_roi = daisy.Roi((0, 0), (20, 20))
+write_roi = daisy.Roi((5, 5), (10, 10))
+
+def process(block):
+
+    return block.write_roi.size()
+
+def process_fail_odd(block):
+
+    if block.block_id%2 == 1:
+        raise RuntimeError("odd block")
+    return 1
+
+def test_reduction_local():
+
+    num_blocks = len(daisy.create_dependency_graph(
+        total_roi,
+        read_roi,
+        write_roi))
+
+    for processes in [False, True]:
+
+        reduction = daisy.Reduction(lambda a, b: a + b)
+        assert daisy.run_blockwise(
+            total_roi,
+            read_roi,
+            write_roi,
+            process,
+            num_workers=2,
+            processes=processes,
+            scheduler='local',
+            reduction=reduction)
+
+        assert reduction.value == num_blocks*100
+
+def test_reduction_failed_blocks():
+
+    graph = daisy.create_dependency_graph(total_roi, read_roi, write_roi)
+    num_even = len([ b for b, _ in graph if b.block_id%2 == 0 ])
+
+    reduction = daisy.Reduction(lambda a, b: a + b)
+    assert not daisy.run_blockwise(
+        total_roi,
+        read_roi,
+        write_roi,
+        process_fail_odd,
+        num_workers=2,
+        processes=False,
+        scheduler='local',
+        reduction=reduction)
+
+    assert reduction.value == num_even
+
+def test_collect_results():
+
+    graph = daisy.create_dependency_graph(total_roi, read_roi, write_roi)
+
+    reduction = daisy.Reduction()
+    assert daisy.run_blockwise(
+        total_roi,
+        read_roi,
+        write_roi,
+        lambda b: b.write_roi,
+        num_workers=2,
+        processes=False,
+        scheduler='local',
+        reduction=reduction)
+
+    assert reduction.results == { b.block_id: b.write_roi for b, _ in graph }
+
+    # with callback, results are not stored
+    results = []
+    reduction = daisy.Reduction(
+        callback=lambda block_id, result: results.append(block_id))
+    assert daisy.run_blockwise(
+        total_roi,
+        read_roi,
+        write_roi,
+        lambda b: b.write_roi,
+        num_workers=2,
+        processes=False,
+        scheduler='local',
+        reduction=reduction)
+
+    assert sorted(results) == sorted(b.block_id for b, _ in graph)
+    assert reduction.results == {}
+
+def test_reduce_results():
+
+    results = [ (i, i) for i in range(10) ]
+    assert daisy.reduction.reduce_results(results, None) == results
+    assert daisy.reduction.reduce_results(
+        results,
+        lambda a, b: a + b) == [(None, 45)]
+    assert daisy.reduction.reduce_results([], max) == []
+
+def test_reduce_partial_results():
+
+    partial_results = [ [(None, i)] for i in range(10) ] + [[]]
+    assert daisy.reduction.reduce_partial_results(
+        lambda a, b: a + b,
+        *partial_results) == [(None, 45)]
+    assert daisy.reduction.reduce_partial_results(max, [], []) == []
+
+if __name__ == "__main__":
+    test_reduction_local()
+    test_reduction_failed_blocks()
+    test_collect_results()
+    test_reduce_results()
+    test_reduce_partial_results()
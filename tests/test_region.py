@@ -0,0 +1,121 @@
+import daisy
+import logging
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+
+total_roi = daisy.Roi((0, 0), (100, 100))
+read_roi = daisy.Roi((0, 0), (10, 10))
+write_roi = daisy.Roi((3, 3), (4, 4))
+
+def get_ancestors(graph):
+
+    ancestors = {}
+    for block, upstream_blocks in graph:
+        a = set()
+        for b in upstream_blocks:
+            a.add(b.block_id)
+            a |= ancestors[b.block_id]
+        ancestors[block.block_id] = a
+
+    return ancestors
+
+def check_region(region, in_region):
+
+    graph = daisy.create_dependency_graph(total_roi, read_roi, write_roi)
+    ancestors = get_ancestors(graph)
+
+    included = set(
+        block.block_id
+        for block, _ in graph
+        if in_region(block.write_roi))
+    assert 0 < len(included) < len(graph)
+
+    sparse_graph = daisy.create_dependency_graph(
+        total_roi,
+        read_roi,
+        write_roi,
+        region=region)
+    sparse_ancestors = get_ancestors(sparse_graph)
+
+    assert set(sparse_ancestors.keys()) == included
+    for block_id, a in sparse_ancestors.items():
+        assert a == ancestors[block_id] & included
+
+def test_roi_region():
+
+    rois = [
+        daisy.Roi((10, 10), (20, 5)),
+        daisy.Roi((50, 0), (7, 100))
+    ]
+
+    check_region(
+        rois,
+        lambda roi: any(roi.intersects(r) for r in rois))
+
+def test_mask_region():
+
+    voxel_size = daisy.Coordinate((5, 10))
+    mask = np.zeros((20, 10), dtype=bool)
+    mask[3:8, 2] = True
+    mask[15, 7:] = True
+    mask = daisy.Array(mask, total_roi, voxel_size)
+
+    def in_mask(roi):
+        roi = roi.snap_to_grid(voxel_size, mode='grow').intersect(total_roi)
+        return mask.to_ndarray(roi).any()
+
+    check_region(mask, in_mask)
+
+def test_run_region():
+
+    processed = []
+
+    assert daisy.run_blockwise(
+        total_roi,
+        read_roi,
+        write_roi,
+        lambda b: processed.append(b.block_id),
+        num_workers=2,
+        processes=False,
+        scheduler='local',
+        region=[daisy.Roi((10, 10), (20, 5))])
+
+    graph = daisy.create_dependency_graph(total_roi, read_roi, write_roi)
+    assert sorted(processed) == sorted(
+        b.block_id
+        for b, _ in graph
+        if b.write_roi.intersects(daisy.Roi((10, 10), (20, 5))))
+
+def test_batch_check_region():
+
+    region = [daisy.Roi((10, 10), (20, 5))]
+    checked = []
+
+    def batch_check(blocks):
+        checked.extend(blocks.block_ids.tolist())
+        return np.zeros((len(blocks),), dtype=bool)
+
+    assert daisy.run_blockwise(
+        total_roi,
+        read_roi,
+        write_roi,
+        lambda b: None,
+        num_workers=2,
+        processes=False,
+        scheduler='local',
+        region=region,
+        batch_check_function=batch_check)
+
+    # only blocks in the region were checked
+    graph = daisy.create_dependency_graph(total_roi, read_roi, write_roi)
+    assert sorted(checked) == sorted(
+        b.block_id
+        for b, _ in graph
+        if b.write_roi.intersects(region[0]))
+
+if __name__ == "__main__":
+    test_roi_region()
+    test_mask_region()
+    test_run_region()
+    test_batch_check_region()
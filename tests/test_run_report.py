@@ -0,0 +1,75 @@
+import daisy
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+logging.basicConfig(level=logging.INFO)
+
+total_roi = daisy.Roi((0, 0), (100, 100))
+read_roi = daisy.Roi((0, 0), (20, 20))
+write_roi = daisy.Roi((5, 5), (10, 10))
+
+def process(block):
+
+    time.sleep(0.01)
+    if block.block_id%7 == 0:
+        raise RuntimeError("Failing on purpose")
+
+def test_run_report():
+
+    report = daisy.RunReport()
+
+    assert not daisy.run_blockwise(
+        total_roi,
+        read_roi,
+        write_roi,
+        process,
+        num_workers=2,
+        processes=False,
+        scheduler='local',
+        report=report)
+
+    graph = daisy.create_dependency_graph(total_roi, read_roi, write_roi)
+    num_errored = sum(1 for b, _ in graph if b.block_id%7 == 0)
+
+    assert report.num_blocks() == len(graph)
+    assert report.num_blocks(-2) == num_errored
+    assert report.num_blocks(1) == len(graph) - num_errored
+
+    for record in report.records():
+        assert record['start'] <= record['end']
+        assert record['process'] >= 0.01
+        assert record['queue_wait'] >= 0
+        for upstream_id in record['upstream']:
+            assert report.blocks[upstream_id]['end'] <= record['start']
+
+    # the critical path is a chain of dependent blocks
+    length, path = report.critical_path()
+    assert length > 0
+    assert length <= report.duration()
+    for a, b in zip(path[:-1], path[1:]):
+        assert a in report.blocks[b]['upstream']
+
+    utilization = report.worker_utilization()
+    assert len(utilization) == 2
+    assert all(0 < u <= 1 for u in utilization.values())
+
+    data = json.loads(report.to_json())
+    assert data['summary']['num_blocks'] == len(graph)
+    assert len(data['blocks']) == len(graph)
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        trace_file = os.path.join(tmp_dir, 'trace.json')
+        report.to_chrome_trace(trace_file)
+        with open(trace_file) as f:
+            events = json.load(f)['traceEvents']
+        assert len([e for e in events if e.get('cat') == 'block']) == len(graph)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+if __name__ == "__main__":
+    test_run_report()
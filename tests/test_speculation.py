@@ -0,0 +1,156 @@
+import daisy
+import logging
+import os
+import pytest
+import shutil
+import tempfile
+import time
+from daisy.local_scheduler import DependencyScheduler
+from daisy.memory import MemoryBudget
+from daisy.speculation import Speculation
+
+logging.basicConfig(level=logging.INFO)
+
+total_roi = daisy.Roi((0, 0), (100, 100))
+read_roi = daisy.Roi((0, 0), (20, 20))
+write_roi = daisy.Roi((5, 5), (10, 10))
+
+test_dir = None
+
+def process_straggler(block):
+
+    started = os.path.join(test_dir, 'started_%d'%block.block_id)
+
+    # the first attempt of block 0 hangs
+    if block.block_id == 0 and not os.path.exists(started):
+        open(started, 'w').close()
+        time.sleep(60)
+
+    time.sleep(0.05)
+    open(os.path.join(test_dir, '%d'%block.block_id), 'w').close()
+
+def check_done(block):
+
+    return os.path.exists(os.path.join(test_dir, '%d'%block.block_id))
+
+def test_speculation():
+
+    global test_dir
+    test_dir = tempfile.mkdtemp()
+
+    try:
+
+        start = time.time()
+
+        assert daisy.run_blockwise(
+            total_roi,
+            read_roi,
+            write_roi,
+            process_straggler,
+            check_done,
+            read_write_conflict=False,
+            num_workers=4,
+            scheduler='local',
+            speculation_factor=5,
+            speculation_fraction=0.5)
+
+        # the hanging copy was cancelled
+        assert time.time() - start < 30
+
+        graph = daisy.create_dependency_graph(
+            total_roi,
+            read_roi,
+            write_roi,
+            read_write_conflict=False)
+        assert all(check_done(block) for block, _ in graph)
+
+    finally:
+        shutil.rmtree(test_dir)
+
+def test_slow_blocks():
+
+    speculation = Speculation(3, fraction=0.5)
+
+    blocks = [
+        daisy.Block(total_roi, read_roi, write_roi, block_id=i)
+        for i in range(6)
+    ]
+    for block in blocks:
+        speculation.add_block(block, 0)
+
+    # the level might have more blocks
+    for block in blocks[:3]:
+        speculation.finish_block(block.block_id, 1.0)
+    assert not speculation.is_slow(5, 10.0)
+
+    speculation.finish_reading()
+    assert speculation.is_slow(5, 10.0)
+    assert not speculation.is_slow(5, 2.0)
+
+    # not enough blocks of the level finished
+    speculation = Speculation(3, fraction=0.9)
+    for block in blocks:
+        speculation.add_block(block, 0)
+    for block in blocks[:3]:
+        speculation.finish_block(block.block_id, 1.0)
+    speculation.finish_reading()
+    assert not speculation.is_slow(5, 10.0)
+
+def test_failed_durations():
+
+    speculation = Speculation(3, fraction=0.5)
+
+    blocks = [
+        (daisy.Block(total_roi, read_roi, write_roi, block_id=i), [])
+        for i in range(7)
+    ]
+    scheduler = DependencyScheduler([(0, blocks)], speculation=speculation)
+    scheduler.read_graph(len(blocks) + 1)
+
+    # blocks that failed quickly do not lower the median duration
+    for status, duration in [(-2, 0.1)]*3 + [(1, 2.0)]*3:
+        block = scheduler.next_ready()
+        scheduler.finish(
+            block.block_id,
+            status,
+            { 'start': 0.0, 'end': duration })
+    assert not speculation.is_slow(6, 5.0)
+    assert speculation.is_slow(6, 7.0)
+
+def test_speculation_threads():
+
+    # cancelled copies can not be stopped in worker threads
+    with pytest.raises(RuntimeError):
+        daisy.run_blockwise(
+            total_roi,
+            read_roi,
+            write_roi,
+            lambda b: None,
+            processes=False,
+            scheduler='local',
+            speculation_factor=5)
+
+def test_copy_budget():
+
+    budget = MemoryBudget(100, lambda block: 40)
+    block = daisy.Block(total_roi, read_roi, write_roi, block_id=0)
+
+    budget.admit(block)
+    budget.admit(block)
+    assert budget.used == 80
+
+    # a failed copy releases its memory, the other copy keeps it
+    budget.release_copy(block.block_id)
+    assert budget.used == 40
+    assert budget.fits(block)
+
+    budget.release(block.block_id)
+    assert budget.used == 0
+    assert not budget.admitted
+
+if __name__ == "__main__":
+    test_speculation()
+    test_slow_blocks()
+    test_failed_durations()
+    test_speculation_threads()
+    test_copy_budget()